@@ -0,0 +1,3 @@
+"""
+Throughput and latency benchmarks of the evaluation engines, see ``python -m benchmarks --help``
+"""
@@ -0,0 +1,94 @@
+"""
+Benchmark runner, ``python -m benchmarks --help``
+
+Runs the cases of ``benchmarks.cases``, prints a table, writes the results and the import times as JSON and
+compares the throughput of every case with a stored baseline. Exits with status 1 when a case is slower than the
+baseline by more than the threshold.
+"""
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import click
+
+from .cases import IMPORTS, all_cases, import_time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    :return: (name, baseline, current) hands/sec of the cases that regressed by more than `threshold` (a fraction)
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current['hands_per_sec'] < previous['hands_per_sec'] * (1 - threshold):
+            regressions.append((name, previous['hands_per_sec'], current['hands_per_sec']))
+    return regressions
+
+
+@click.command()
+@click.option('-k', 'patterns', multiple=True, help="only run cases matching this glob, e.g. 'evaluate/lut/*'")
+@click.option('--hands', type=int, default=20000, show_default=True, help="hands per evaluator case")
+@click.option('--repeat', type=int, default=3, show_default=True, help="passes per case, the fastest one counts")
+@click.option('--seed', type=int, default=2024, show_default=True, help="seed of the generated inputs")
+@click.option('-o', 'output', default=None, help="write the results as JSON to this file")
+@click.option('--baseline', default=DEFAULT_BASELINE, show_default=True, help="baseline results to compare with")
+@click.option('--threshold', type=float, default=0.2, show_default=True,
+              help="fail when hands/sec drops below (1 - THRESHOLD) times the baseline")
+@click.option('--save-baseline', is_flag=True, help="store these results as the new baseline")
+@click.option('--no-imports', is_flag=True, help="skip measuring the import times")
+def main(patterns, hands, repeat, seed, output, baseline, threshold, save_baseline, no_imports):
+    """Measure hands/sec and latency percentiles of the evaluation engines."""
+    cases = [case for case in all_cases() if not patterns or any(fnmatch.fnmatch(case.name, p) for p in patterns)]
+    results = {}
+    print(f'{"case":<40} {"hands/s":>12} {"p50 us":>10} {"p90 us":>10} {"p99 us":>10}')
+    for case in cases:
+        summary = case.run(seed, hands, repeat).summary()
+        results[case.name] = summary
+        print(f'{case.name:<40} {summary["hands_per_sec"]:>12.0f} {summary["p50_us"]:>10.1f} '
+              f'{summary["p90_us"]:>10.1f} {summary["p99_us"]:>10.1f}')
+
+    imports = {}
+    if not no_imports:
+        print(f'\n{"import":<40} {"ms":>12}')
+        for module in IMPORTS:
+            try:
+                imports[module] = import_time(module, repeat)
+            except subprocess.CalledProcessError:
+                # an engine whose dependency is not installed
+                continue
+            print(f'{module:<40} {imports[module] * 1e3:>12.1f}')
+
+    report = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                       'machine': platform.machine(), 'cpus': os.cpu_count(), 'seed': seed, 'hands': hands,
+                       'repeat': repeat},
+              'results': results, 'imports': imports}
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if save_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline saved to {baseline}')
+        return
+    if not os.path.exists(baseline):
+        print(f'no baseline at {baseline}, run with --save-baseline to store one')
+        return
+    with open(baseline) as f:
+        regressions = compare(results, json.load(f)['results'], threshold)
+    for name, previous, current in regressions:
+        print(f'REGRESSION {name}: {current:.0f} hands/s, baseline {previous:.0f} hands/s')
+    if regressions:
+        sys.exit(1)
+    print(f'no regression beyond {threshold:.0%} against {baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark cases
+
+An evaluator case times one engine on a fixed-seed list of 7-card hands of one kind. A histogram case times a whole
+``histogram`` query in one mode. Every case returns a ``Measurement``: how many hands (or boards) one pass
+evaluates, the time of the fastest of the repeated passes, and the latency of every timed call.
+
+``import_time`` measures how long a module takes to import in a fresh interpreter, for the command line and every
+engine of ``holdem.engines``.
+"""
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+import numpy as np
+
+from holdem.card import RANKS, SUITS, TexasCard
+from holdem.deck import Deck
+from holdem.engines import ENGINES
+
+# the latencies of at most this many calls are recorded per evaluator case
+LATENCY_CALLS = 2000
+BATCH_ROWS = 1024
+
+
+@dataclass
+class Measurement:
+    units: int
+    seconds: float
+    latencies: List[float] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        latencies = np.array(self.latencies) * 1e6
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) if len(latencies) else (0., 0., 0.)
+        return {'hands_per_sec': self.units / self.seconds, 'units': self.units, 'seconds': self.seconds,
+                'p50_us': float(p50), 'p90_us': float(p90), 'p99_us': float(p99)}
+
+
+@dataclass
+class Case:
+    name: str
+    # (seed, hands, repeat) -> Measurement, evaluator cases time `hands` hands, histogram cases `repeat` queries
+    run: Callable[[int, int, int], Measurement]
+
+
+def _hand(kind: str, rng: random.Random) -> List[TexasCard]:
+    deck = Deck.gen_poker()
+    if kind == 'pairs':
+        rank = rng.choice(RANKS)
+        fixed = [TexasCard(s, rank) for s in rng.sample(SUITS, 2)]
+    elif kind == 'suited_connectors':
+        low = rng.randrange(len(RANKS) - 1)
+        suit = rng.choice(SUITS)
+        fixed = [TexasCard(suit, RANKS[low]), TexasCard(suit, RANKS[low + 1])]
+    elif kind == 'flush_heavy':
+        # five cards of one suit, two random
+        suit = rng.choice(SUITS)
+        fixed = [c for c in rng.sample(deck, 52) if c.suit == suit][:5]
+    else:
+        fixed = []
+    rest = [c for c in deck if c not in fixed]
+    return fixed + rng.sample(rest, 7 - len(fixed))
+
+
+def hands(kind: str, n: int, seed: int) -> List[List[TexasCard]]:
+    """
+    :param kind: random, pairs, suited_connectors or flush_heavy
+    :return: n 7-card hands, the same for the same seed
+    """
+    rng = random.Random(f'{kind}-{seed}')
+    return [_hand(kind, rng) for _ in range(n)]
+
+
+def _evaluator_case(evaluate: Callable, hand_list: List[List[TexasCard]], repeat: int) -> Measurement:
+    passes = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for cards in hand_list:
+            evaluate(cards)
+        passes.append(time.perf_counter() - start)
+    latencies = []
+    for cards in hand_list[:LATENCY_CALLS]:
+        t = time.perf_counter()
+        evaluate(cards)
+        latencies.append(time.perf_counter() - t)
+    return Measurement(units=len(hand_list), seconds=min(passes), latencies=latencies)
+
+
+def _batch_case(hand_list: List[List[TexasCard]], repeat: int) -> Measurement:
+    from holdem.batch import evaluate_batch
+
+    codes = np.array([[c.code for c in cards] for cards in hand_list], dtype=np.int64)
+    passes, latencies = [], []
+    for _ in range(repeat):
+        elapsed = 0.
+        for i in range(0, len(codes), BATCH_ROWS):
+            t = time.perf_counter()
+            evaluate_batch(codes[i:i + BATCH_ROWS])
+            latencies.append(time.perf_counter() - t)
+            elapsed += latencies[-1]
+        passes.append(elapsed)
+    return Measurement(units=len(codes), seconds=min(passes), latencies=latencies)
+
+
+def _evaluators():
+    from holdem import detect, eval7_api, lut
+
+    return {'detect': detect.decide_showdown, 'eval7': eval7_api.decide_showdown, 'lut': lut.evaluate}
+
+
+def evaluator_cases() -> List[Case]:
+    cases = []
+    for kind in ('random', 'pairs', 'suited_connectors', 'flush_heavy'):
+        for engine in ('detect', 'eval7', 'lut'):
+            cases.append(Case(f'evaluate/{engine}/{kind}', lambda seed, n, repeat, engine=engine, kind=kind:
+                              _evaluator_case(_evaluators()[engine], hands(kind, n, seed), repeat)))
+        # batches need more rows to say anything
+        cases.append(Case(f'evaluate/batch/{kind}',
+                          lambda seed, n, repeat, kind=kind: _batch_case(hands(kind, n * 10, seed), repeat)))
+    return cases
+
+
+# hole cards of the histogram cases, the pool is the rest of the deck minus EXCLUDED cards chosen by the seed
+HISTOGRAM_HOLES = {'pair': ('As', 'Ac'), 'suited_connector': ('8h', '9h')}
+EXCLUDED = 20
+HISTOGRAM_MODES = ('serial', 'streaming', 'parallel', 'isomorphic', 'eval7', 'lut', 'numpy', 'analytic', 'flop')
+
+
+def _query(hole: str, mode: str, seed: int):
+    """
+    :return: (hole cards, pool, board) of a histogram case
+    """
+    hole_cards = tuple(TexasCard.from_str(s) for s in HISTOGRAM_HOLES[hole])
+    rest = Deck().pop(*hole_cards).pool
+    excluded = random.Random(f'{hole}-{seed}').sample(rest, EXCLUDED)
+    if mode == 'flop':
+        # a flop from the excluded cards, the rest of the deck is drawn
+        return hole_cards, Deck().pop(*hole_cards, *excluded[:3]).pool, tuple(excluded[:3])
+    return hole_cards, Deck().pop(*hole_cards, *excluded).pool, ()
+
+
+def _histogram_query(mode: str) -> Callable:
+    from holdem import detect, engines, eval7_api, lut
+
+    return {
+        'serial': lambda hole, pool, board: detect.histogram(hole, pool, use_table=False, engine='detect'),
+        'streaming': lambda hole, pool, board: detect.histogram(hole, pool, use_table=False, batch_size=1 << 14),
+        'parallel': lambda hole, pool, board: detect.histogram(hole, pool, use_table=False, batch_size=1 << 14,
+                                                               workers=2),
+        'isomorphic': lambda hole, pool, board: detect.histogram(hole, pool, use_table=False, batch_size=1 << 14,
+                                                                 isomorphic=True),
+        'eval7': lambda hole, pool, board: eval7_api.histogram(hole, pool),
+        'lut': lambda hole, pool, board: lut.histogram(hole, pool),
+        'numpy': lambda hole, pool, board: engines.histogram(hole, pool, engine='numpy', use_table=False),
+        'analytic': lambda hole, pool, board: engines.histogram(hole, pool, engine='analytic', use_table=False),
+        'flop': lambda hole, pool, board: detect.histogram(hole, pool, board=board),
+    }[mode]
+
+
+def _histogram_case(mode: str, hole: str, seed: int, repeat: int) -> Measurement:
+    from holdem.boards import count_boards
+
+    hole_cards, pool, board = _query(hole, mode, seed)
+    query = _histogram_query(mode)
+    latencies = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        query(hole_cards, pool, board)
+        latencies.append(time.perf_counter() - t)
+    return Measurement(units=count_boards(len(pool), 5 - len(board)), seconds=min(latencies), latencies=latencies)
+
+
+def histogram_cases() -> List[Case]:
+    return [Case(f'histogram/{mode}/{hole}', lambda seed, n, repeat, mode=mode, hole=hole:
+                 _histogram_case(mode, hole, seed, repeat))
+            for hole in HISTOGRAM_HOLES for mode in HISTOGRAM_MODES]
+
+
+# modules whose import time is measured
+IMPORTS = ('holdem.cli', *ENGINES.values())
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module: str, repeat=3) -> float:
+    """
+    :return: seconds the import of `module` takes in a fresh interpreter, the fastest of `repeat` runs, as reported
+        by ``python -X importtime`` (interpreter startup excluded)
+    """
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, (ROOT, os.environ.get('PYTHONPATH'))))}
+    times = []
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], env=env,
+                                capture_output=True, text=True, check=True).stderr
+        for line in stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == module:
+                times.append(int(fields[1]) / 1e6)
+    return min(times)
+
+
+def all_cases() -> List[Case]:
+    return evaluator_cases() + histogram_cases()
@@ -0,0 +1,141 @@
+"""
+Exact histograms counted by rank multisets instead of enumerating the boards
+
+Outside of flushes the category of a hand only depends on the multiset of its ranks: every board drawing k_r of
+the a_r pool cards of rank r gives the same category, and there are prod C(a_r, k_r) such boards. ``count_draws``
+walks the rank multisets of the drawn cards, at most a few thousand, instead of the C(50, 5) boards.
+
+Seven cards hold five of a suit in at most one suit, and a flush rules out four of a kind and a full house, so a
+hand holding a flush is a flush, straight flush or royal flush whatever its other ranks. The boards completing a
+flush in a suit are counted apart: every set of drawn cards of that suit that completes the flush, times the rank
+multisets of the drawn cards of the other suits. They move from the category of their rank multiset to the
+category of the suit's ranks. A query takes some tens of thousands of such states, with any pool.
+"""
+import itertools
+from math import comb
+from typing import Dict, List, Sequence, Tuple
+
+from . import metrics
+from .showdown import Power
+
+_STRAIGHTS = [0x1F << low for low in range(9)] + [0x100F]
+_ROYAL = 0x1F00
+# packed rank counts (3 bits per rank, like the rank part of ``holdem.lut`` keys) -> category, filled lazily
+_CATEGORY: Dict[int, int] = {}
+
+
+def _is_straight(ranks: int) -> bool:
+    return any(ranks & straight == straight for straight in _STRAIGHTS)
+
+
+def rank_category(key: int) -> int:
+    """
+    :param key: packed rank counts of the hand, 3 bits per rank
+    :return: ``Power`` value of the hand, ignoring flushes
+    """
+    category = _CATEGORY.get(key)
+    if category is not None:
+        return category
+    counts = [key >> 3 * rank & 7 for rank in range(13)]
+    pairs, trips = counts.count(2), counts.count(3)
+    if 4 in counts:
+        category = Power.FOUR_OF_A_KIND
+    elif trips > 1 or trips and pairs:
+        category = Power.FULL_HOUSE
+    elif _is_straight(sum(1 << rank for rank, n in enumerate(counts) if n)):
+        category = Power.STRAIGHT
+    elif trips:
+        category = Power.THREE_OF_A_KIND
+    elif pairs > 1:
+        category = Power.TWO_PAIR
+    elif pairs:
+        category = Power.PAIR
+    else:
+        category = Power.HIGH_CARD
+    category = _CATEGORY[key] = category.value
+    return category
+
+
+def flush_category(ranks: int) -> int:
+    """
+    :param ranks: 13-bit rank mask of a suit holding five cards or more
+    :return: ``Power`` value of the flush
+    """
+    if ranks & _ROYAL == _ROYAL:
+        return Power.ROYAL_FLUSH.value
+    if _is_straight(ranks):
+        return Power.STRAIGHT_FLUSH.value
+    return Power.FLUSH.value
+
+
+def rank_draws(available: Sequence[int], k: int) -> List[Tuple[int, int]]:
+    """
+    :param available: number of cards of every rank that may be drawn
+    :param k: cards drawn
+    :return: (packed rank counts, number of card sets) of every rank multiset of k cards drawn from `available`
+    """
+    draws = []
+    # cards left at this rank and above
+    left = list(itertools.accumulate(reversed(available)))[::-1] + [0]
+
+    def walk(rank, k, key, weight):
+        if not k:
+            draws.append((key, weight))
+            return
+        if left[rank] < k:
+            return
+        a = available[rank]
+        for n in range(min(k, a) + 1):
+            walk(rank + 1, k - n, key + (n << 3 * rank), weight * comb(a, n))
+
+    walk(0, k, 0, 1)
+    return draws
+
+
+def count_draws(known_codes: Sequence[int], pool_codes: Sequence[int], k: int) -> list:
+    """
+    :param known_codes: codes of the hole cards and the known community cards
+    :param pool_codes: codes of the cards the missing community cards are drawn from, disjoint from `known_codes`
+    :param k: community cards drawn, so that the hands hold seven cards
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    if len(known_codes) + k != 7:
+        raise ValueError('The known and the drawn cards make a seven-card hand')
+    counts = [0] * (len(Power) + 1)
+    base = sum(1 << 3 * (code % 13) for code in known_codes)
+    available = [0] * 13
+    for code in pool_codes:
+        available[code % 13] += 1
+    draws = rank_draws(available, k)
+    for key, weight in draws:
+        counts[rank_category(base + key)] += weight
+    states = len(draws)
+
+    known = _CATEGORY
+    for suit in range(4):
+        held = sum(1 << code % 13 for code in known_codes if code // 13 == suit)
+        suited = [code % 13 for code in pool_codes if code // 13 == suit]
+        others = available.copy()
+        for rank in suited:
+            others[rank] -= 1
+        for j in range(max(0, 5 - held.bit_count()), min(k, len(suited)) + 1):
+            rest = rank_draws(others, k - j)
+            boards = comb(sum(others), k - j)
+            for ranks in itertools.combinations(suited, j):
+                suited_key = base + sum(1 << 3 * rank for rank in ranks)
+                for key, weight in rest:
+                    key += suited_key
+                    category = known.get(key)
+                    counts[rank_category(key) if category is None else category] -= weight
+                counts[flush_category(held | sum(1 << rank for rank in ranks))] += boards
+                states += len(rest)
+    metrics.count('rank_states', states)
+    metrics.count('hands', comb(len(pool_codes), k))
+    return counts
+
+
+def count_all(hole_codes: Sequence[int], pool_codes: Sequence[int]) -> list:
+    """
+    The analytic engine, see ``holdem.engines``: counts every board of five cards from the pool at once
+    """
+    return count_draws(hole_codes, pool_codes, 5)
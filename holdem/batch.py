@@ -0,0 +1,133 @@
+"""
+NumPy batch evaluator, the vectorized counterpart of ``holdem.lut``
+
+Rank-count and suit-count histograms are accumulated column by column over an (N, k) array of card codes, packed
+into one int64 per hand exactly like the keys of ``holdem.lut``. The rank histogram is resolved with
+``np.searchsorted`` against the sorted rank table, rows whose suit histogram holds five of a suit go through the
+flush table. No Python loop runs per hand.
+"""
+import itertools
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+from . import boards, lut, metrics
+from .showdown import Power
+
+# boards per chunk of the numpy engine
+CHUNK = 1 << 16
+
+_KEYS = np.array(lut.KEYS, dtype=np.int64)
+_SUIT_SHIFTS = np.array([lut.SUIT_SHIFT + 4 * s for s in range(4)], dtype=np.int64)
+_RANK_KEYS = np.array(sorted(lut.RANK_STRENGTH), dtype=np.int64)
+_RANK_STRENGTH = np.array([lut.RANK_STRENGTH[k] for k in _RANK_KEYS.tolist()], dtype=np.int64)
+_FLUSH_STRENGTH = np.array(lut.FLUSH_STRENGTH, dtype=np.int64)
+
+
+def evaluate_batch(codes) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param codes: int array of card codes, shape (N, k) with 5 <= k <= 7, no duplicated card within a row
+    :return: (categories, strengths), both int64 arrays of shape (N,), categories are ``Power`` values and
+        strengths compare like ``holdem.lut`` strengths
+    """
+    codes = np.asarray(codes)
+    if codes.ndim != 2 or not 5 <= codes.shape[1] <= 7:
+        raise ValueError(f'Expected an (N, 5..7) array of card codes, got shape {codes.shape}')
+    keys = np.full(len(codes), lut.FLUSH_BIAS, dtype=np.int64)
+    masks = np.zeros(len(codes), dtype=np.int64)
+    for col in range(codes.shape[1]):
+        keys += _KEYS[codes[:, col]]
+        masks |= np.left_shift(1, codes[:, col], dtype=np.int64)
+    return evaluate_keys(keys, masks)
+
+
+def evaluate_keys(keys: np.ndarray, masks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param keys: packed ``holdem.lut`` keys of hands of 5 to 7 cards, FLUSH_BIAS included
+    :param masks: 52-bit card masks of the same hands
+    :return: (categories, strengths) like ``evaluate_batch``
+    """
+    strengths = _RANK_STRENGTH[np.searchsorted(_RANK_KEYS, keys & lut.RANK_BITS)]
+    flush_rows = np.flatnonzero(keys & lut.FLUSH_BITS)
+    if len(flush_rows):
+        suit_counts = keys[flush_rows, None] >> _SUIT_SHIFTS & 0xF
+        flush_suit = suit_counts.argmax(axis=1)
+        flush_ranks = masks[flush_rows] >> 13 * flush_suit & 0x1FFF
+        strengths[flush_rows] = _FLUSH_STRENGTH[flush_ranks]
+    return strengths >> lut.CATEGORY_SHIFT, strengths
+
+
+def iter_chunks(boards: Iterable[Tuple[int, ...]], size: int, k=5) -> Iterator[np.ndarray]:
+    """
+    :param boards: iterable of k-card code tuples
+    :param size: number of boards per chunk
+    :return: (size, k) int arrays, the last one may be shorter
+    """
+    boards = iter(boards)
+    while True:
+        flat = np.fromiter(itertools.chain.from_iterable(itertools.islice(boards, size)), dtype=np.int64)
+        if not len(flat):
+            return
+        yield flat.reshape(-1, k)
+
+
+def count_categories(hole_codes, chunks: Iterable[np.ndarray], callback=None) -> list:
+    """
+    :param hole_codes: codes of the hole cards
+    :param chunks: arrays of community card codes, shape (N, 5)
+    :param callback: called with the size of every chunk once it is counted
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    counts = np.zeros(len(Power) + 1, dtype=np.int64)
+    hole = np.asarray(hole_codes, dtype=np.int64)
+    for chunk in chunks:
+        hands = np.hstack([np.broadcast_to(hole, (len(chunk), len(hole))), chunk])
+        categories, _ = evaluate_batch(hands)
+        counts += np.bincount(categories, minlength=len(counts))
+        metrics.count('hands', len(chunk))
+        if callback is not None:
+            callback(len(chunk))
+    return counts.tolist()
+
+
+def count_codes(hole_codes, pool_codes, start, stop, callback=None) -> list:
+    """
+    The numpy engine, see ``holdem.engines``
+    """
+    combos = boards.iter_boards(list(pool_codes), 5, start, stop)
+    return count_categories(hole_codes, metrics.timed('enumerate', iter_chunks(combos, CHUNK)), callback=callback)
+
+
+def masks_to_codes(masks, k: int) -> np.ndarray:
+    """
+    :param masks: card set bitmasks holding k cards each
+    :return: (N, k) array of the card codes of every mask, ascending
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    bits = np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    return np.nonzero(bits)[1].reshape(-1, k)
+
+
+def count_weighted(hole_codes, boards: Iterable[Tuple[int, int]], size: int, callback=None) -> list:
+    """
+    :param hole_codes: codes of the hole cards
+    :param boards: (five-card board mask, weight) pairs
+    :param size: number of boards evaluated per chunk
+    :param callback: called with the total weight of every chunk once it is counted
+    :return: total weight of the boards per category, indexed by ``Power`` value
+    """
+    counts = [0] * (len(Power) + 1)
+    hole = np.asarray(hole_codes, dtype=np.int64)
+    boards = iter(boards)
+    while True:
+        chunk = list(itertools.islice(boards, size))
+        if not chunk:
+            return counts
+        masks, weights = zip(*chunk)
+        codes = masks_to_codes(masks, 5)
+        categories, _ = evaluate_batch(np.hstack([np.broadcast_to(hole, (len(codes), len(hole))), codes]))
+        for category, weight in enumerate(np.bincount(categories, weights=weights).tolist()):
+            counts[category] += int(weight)
+        metrics.count('hands', len(codes))
+        if callback is not None:
+            callback(sum(weights))
@@ -0,0 +1,88 @@
+"""
+Streaming enumeration of k-card boards drawn from a pool
+
+Boards are indexed in ``itertools.combinations`` order (lexicographic on pool positions). ``unrank`` maps an index
+to its board through the combinatorial number system, so any index range [start, stop) can be produced lazily
+without walking or storing the boards before it.
+"""
+import itertools
+from math import comb
+from typing import Iterator, Sequence, Tuple
+
+
+def count_boards(n: int, k=5) -> int:
+    """
+    :return: number of k-card boards from a pool of n cards
+    """
+    return comb(n, k)
+
+
+def unrank(index: int, n: int, k=5) -> Tuple[int, ...]:
+    """
+    :param index: board index in [0, C(n, k))
+    :return: pool positions of the board, ascending
+    """
+    if not 0 <= index < comb(n, k):
+        raise IndexError(f'Board index {index} out of range for C({n}, {k})')
+    positions = []
+    x = 0
+    for remaining in range(k, 0, -1):
+        # boards whose next position is x: C(n - x - 1, remaining - 1)
+        while True:
+            block = comb(n - x - 1, remaining - 1)
+            if index < block:
+                break
+            index -= block
+            x += 1
+        positions.append(x)
+        x += 1
+    return tuple(positions)
+
+
+def rank(positions: Sequence[int], n: int) -> int:
+    """
+    Inverse of ``unrank``
+    :param positions: ascending pool positions of a board
+    """
+    k = len(positions)
+    index = 0
+    x = 0
+    for i, p in enumerate(positions):
+        index += sum(comb(n - y - 1, k - i - 1) for y in range(x, p))
+        x = p + 1
+    return index
+
+
+def iter_boards(pool: Sequence, k=5, start=0, stop=None) -> Iterator[tuple]:
+    """
+    :param pool: cards (or card codes) to draw from
+    :param k: board size
+    :param start: index of the first board
+    :param stop: index after the last board, defaults to all boards
+    :return: lazy iterator of the boards with index in [start, stop), as tuples of pool items
+    """
+    pool = tuple(pool)
+    n = len(pool)
+    total = comb(n, k)
+    stop = total if stop is None else min(stop, total)
+    if start >= stop:
+        return iter(())
+    if start == 0:
+        return itertools.islice(itertools.combinations(pool, k), stop)
+    return itertools.islice(_boards_from(pool, unrank(start, n, k)), stop - start)
+
+
+def _boards_from(pool: tuple, positions: Tuple[int, ...]) -> Iterator[tuple]:
+    # every board >= positions in lexicographic order: first the boards sharing the longest prefix, then those that
+    # bump position d and take any tail after it, for d from the last position to the first
+    k = len(positions)
+    n = len(pool)
+    prefix = tuple(pool[p] for p in positions[:-1])
+    for x in range(positions[-1], n):
+        yield prefix + (pool[x],)
+    for d in range(k - 2, -1, -1):
+        prefix = tuple(pool[p] for p in positions[:d])
+        for x in range(positions[d] + 1, n):
+            head = prefix + (pool[x],)
+            for tail in itertools.combinations(pool[x + 1:], k - d - 1):
+                yield head + tail
@@ -0,0 +1,166 @@
+"""
+Many queries in one process, ``python -m holdem batch``
+
+Every input line is a query: either a JSON object as accepted by ``holdem.query`` or the short form
+``HOLE [board=CARDS] [exclude=CARDS] [mode=exact|sample] [samples=N] [tolerance=F] [seed=N]``, e.g.
+``AsKs board=QsJs2d exclude=2c``. Every query gets one JSON output line, ``{"line": n, "id": ..., "ok": true,
+"result": {...}}`` or ``{"line": n, "id": ..., "ok": false, "error": "..."}``.
+
+The evaluator tables are loaded once per process. Queries run in a process pool with at most `window` of them in
+flight (results written out of input order count as in flight too), so memory stays bounded whatever the input
+size. Results of deterministic queries are remembered in an LRU: a query repeated after its result came back is
+answered from it, but duplicates in flight at the same time are not coalesced, each of them is computed.
+"""
+import json
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, Optional
+
+from . import query
+
+# results remembered for repeated queries
+RESULT_CACHE = 4096
+_NUMBERS = {'samples': int, 'seed': int, 'tolerance': float}
+
+
+def parse_line(line: str) -> dict:
+    """
+    :return: the query of an input line, JSON or short form
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            return json.loads(line)
+        except ValueError as err:
+            raise query.QueryError(f'Invalid JSON: {err}')
+    hole, *options = line.split()
+    request = {'type': 'histogram', 'hole': hole}
+    for option in options:
+        name, sep, value = option.partition('=')
+        if not sep or name not in ('board', 'exclude', 'mode', *_NUMBERS):
+            raise query.QueryError(f'Unknown option: {option}')
+        try:
+            request[name] = _NUMBERS[name](value) if name in _NUMBERS else value
+        except ValueError:
+            raise query.QueryError(f'Not a number: {option}')
+    return request
+
+
+class _Results:
+    # LRU of the results of deterministic queries
+    def __init__(self, size: int):
+        self.size = size
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        result = self._data.get(key)
+        if result is not None:
+            self._data.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict):
+        self._data[key] = result
+        if len(self._data) > self.size:
+            self._data.popitem(last=False)
+
+
+def run_batch(lines: Iterable[str], workers=1, ordered=True, window: int = None,
+              cache_size=RESULT_CACHE) -> Iterator[dict]:
+    """
+    :param lines: input lines, blank ones are skipped
+    :param workers: worker processes, 1 runs the queries in this process
+    :param ordered: yield the responses in input order, else as they complete
+    :param window: queries in flight, 4 per worker by default
+    :return: the response of every query
+    """
+    results = _Results(cache_size)
+    # (sequence number, response) of the queries that need no computation, (sequence number, line, id, key,
+    # normalized query) of the others
+    jobs = _jobs(lines, results)
+    if workers <= 1:
+        query.warm_up()
+        for seq, job in jobs:
+            yield job if isinstance(job, dict) else _run(job, results)
+        return
+
+    window = window or 4 * workers
+    ready = {}
+    pending = {}
+    next_seq = 0
+    with ProcessPoolExecutor(workers, initializer=query.warm_up) as executor:
+        def collect(block: bool):
+            nonlocal next_seq
+            if pending and block:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            else:
+                done = [future for future in pending if future.done()]
+            for future in done:
+                seq, job = pending.pop(future)
+                ready[seq] = _response(job, future, results)
+            if ordered:
+                while next_seq in ready:
+                    yield ready.pop(next_seq)
+                    next_seq += 1
+            else:
+                yield from ready.values()
+                ready.clear()
+
+        for seq, job in jobs:
+            if isinstance(job, dict):
+                ready[seq] = job
+            else:
+                pending[executor.submit(query.run_query, job[3])] = seq, job
+            yield from collect(block=False)
+            while len(pending) + len(ready) >= window:
+                yield from collect(block=True)
+        while pending or ready:
+            yield from collect(block=True)
+
+
+def _jobs(lines: Iterable[str], results: _Results):
+    seq = 0
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        rid = None
+        try:
+            request = parse_line(line)
+            rid = request.get('id') if isinstance(request, dict) else None
+            normalized = query.normalize(request)
+        except ValueError as err:
+            yield seq, {'line': number, 'id': rid, 'ok': False, 'error': str(err)}
+        else:
+            key = query.query_key(normalized)
+            cached = results.get(key) if query.deterministic(normalized) else None
+            if cached is not None:
+                yield seq, {'line': number, 'id': rid, 'ok': True, 'result': cached}
+            else:
+                yield seq, (number, rid, key, normalized)
+        seq += 1
+
+
+def _run(job, results: _Results) -> dict:
+    number, rid, key, normalized = job
+    try:
+        result = query.run_query(normalized)
+    except Exception as err:
+        # one bad query fails its own line, not the batch
+        return {'line': number, 'id': rid, 'ok': False, 'error': _error_message(err)}
+    if query.deterministic(normalized):
+        results.put(key, result)
+    return {'line': number, 'id': rid, 'ok': True, 'result': result}
+
+
+def _response(job, future, results: _Results) -> dict:
+    number, rid, key, normalized = job
+    error = future.exception()
+    if error is not None:
+        return {'line': number, 'id': rid, 'ok': False, 'error': _error_message(error)}
+    if query.deterministic(normalized):
+        results.put(key, future.result())
+    return {'line': number, 'id': rid, 'ok': True, 'result': future.result()}
+
+
+def _error_message(error: BaseException) -> str:
+    # a ValueError is a bad query, anything else is reported with its type
+    return str(error) if isinstance(error, ValueError) else f'{type(error).__name__}: {error}'
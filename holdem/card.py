@@ -1,6 +1,7 @@
 import enum
 import operator
 import re
+from typing import Iterable, List
 
 
 class Suit(enum.Enum):
@@ -59,6 +60,29 @@ class Rank(enum.Enum):
         }
         return m[self.value] if self.value in m else str(self.value)
 
+    @classmethod
+    def from_str(cls, rank_str: str):
+        """
+        :param rank_str: one of 2-9, T, J, Q, K, A, case insensitive
+        """
+        match rank_str.upper():
+            case 'A':
+                rank = 14
+            case 'K':
+                rank = 13
+            case 'Q':
+                rank = 12
+            case  'J':
+                rank = 11
+            case 'T':
+                rank = 10
+            case _:
+                try:
+                    rank = int(rank_str)
+                except ValueError as err:
+                    raise ValueError(f"Illegal number rank: {err}")
+        return cls(rank)
+
     @staticmethod
     def is_straight(ranks):
         # 顺子判定
@@ -75,19 +99,39 @@ class TexasCard:
     """
     Special card type for Texas Hold'em, override the greater and equal method as Hold'em only cares about rank, ignores
     suit.
+
+    Cards are interned: the 52 possible cards are created once, and ``TexasCard(suit, rank)`` returns the shared
+    instance. Every card carries its integer ``code`` (0..51, suit-major, the same order as ``Deck.gen_poker``) and
+    a single-bit ``mask`` so card sets can be handled as 64-bit integers.
     """
+    __slots__ = ('suit', 'rank', 'code', 'mask', 'rank_value')
+    _interned = [None] * 52
+
     @staticmethod
     def sort_desc(cards):
         # sort in reverse order
-        return sorted(cards, key=operator.attrgetter('rank'), reverse=True)
-
-    def __init__(self, suit: Suit, rank: Rank):
-        self.suit = suit
-        self.rank = rank
+        return sorted(cards, key=operator.attrgetter('rank_value'), reverse=True)
+
+    def __new__(cls, suit: Suit, rank: Rank):
+        code = encode(suit, rank)
+        card = cls._interned[code]
+        if card is None:
+            card = super().__new__(cls)
+            card.suit = suit
+            card.rank = rank
+            card.code = code
+            card.mask = 1 << code
+            card.rank_value = rank.value
+            cls._interned[code] = card
+        return card
+
+    def __reduce__(self):
+        # keep cards interned across pickling (e.g. when sent to worker processes)
+        return TexasCard, (self.suit, self.rank)
 
     def __eq__(self, other):
         # Texas hol;dem rule: The card's numerical rank is of sole importance; suit values are irrelevant
-        return self.rank == other.rank and self.suit == other.suit
+        return self.code == other.code
 
     def __str__(self):
         return self.__repr__()
@@ -96,8 +140,7 @@ class TexasCard:
         return repr(self.rank) + repr(self.suit)
 
     def __hash__(self):
-        _key = self.suit, self.rank
-        return hash(_key)
+        return self.code
 
     def __repr__(self):
         return f'<card {repr(self.rank) + repr(self.suit)}>'
@@ -115,23 +158,7 @@ class TexasCard:
             raise ValueError(f"Cannot parse card string: {card_str}")
         rank, suit_str = match.groups()
 
-        match rank.upper():
-            case 'A':
-                rank = 14
-            case 'K':
-                rank = 13
-            case 'Q':
-                rank = 12
-            case  'J':
-                rank = 11
-            case 'T':
-                rank = 10
-            case _:
-                try:
-                    rank = int(rank)
-                except ValueError as err:
-                    raise ValueError(f"Illegal number rank: {err}")
-                
+        rank = Rank.from_str(rank)
         if suit_str.lower() == 'd':
             suit = Suit.Diamond
         elif suit_str.lower() == 'c':
@@ -143,4 +170,47 @@ class TexasCard:
         else:
             raise ValueError(f"Illege suit: {suit_str}")
 
-        return TexasCard(suit, Rank(rank))
+        return TexasCard(suit, rank)
+
+
+# card codes: code = suit index * 13 + rank index, with Two as rank index 0 and Diamond as suit index 0
+# a set of cards is a bitmask with bit `code` set for every card, the 13 bits of a suit are contiguous
+RANKS = tuple(Rank)
+SUITS = tuple(Suit)
+FULL_MASK = (1 << 52) - 1
+SUIT_MASK = (1 << 13) - 1
+
+
+def encode(suit: Suit, rank: Rank) -> int:
+    return (suit.value - 1) * 13 + rank.value - 2
+
+
+def card_from_code(code: int) -> TexasCard:
+    return CARDS[code]
+
+
+def cards_to_mask(cards: Iterable[TexasCard]) -> int:
+    mask = 0
+    for card in cards:
+        mask |= card.mask
+    return mask
+
+
+def mask_to_codes(mask: int) -> List[int]:
+    """
+    :param mask: card set bitmask
+    :return: card codes in ascending order
+    """
+    codes = []
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
+
+
+def mask_to_cards(mask: int) -> List[TexasCard]:
+    return [CARDS[code] for code in mask_to_codes(mask)]
+
+
+CARDS = tuple(TexasCard(s, r) for s in SUITS for r in RANKS)
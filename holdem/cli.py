@@ -1,19 +1,111 @@
+import contextlib
+import functools
+import os
+import sys
+
 import click
 
-from .detect import histogram
+from . import engines
 from .deck import Deck
-from .card import TexasCard
+from .card import TexasCard, cards_to_mask
 
 
 def card_parser(arg):
     return TexasCard.from_str(arg)
 
 
-@click.command()
+def cards_parser(arg):
+    """
+    Several cards in one argument, comma separated ('As,Kd') or concatenated ('AsKd')
+    """
+    tokens = arg.split(',') if ',' in arg else [arg[i:i + 2] for i in range(0, len(arg), 2)]
+    return [card_parser(token.strip()) for token in tokens if token.strip()]
+
+
+class DefaultGroup(click.Group):
+    """
+    Command group that falls back to `default_command` when the first argument is not a sub command, so that
+    `python -m holdem As 2c` keeps working next to `python -m holdem build-preflop`
+    """
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+# functions listed by --profile
+PROFILE_LINES = 30
+
+
+def instrumented(command):
+    """
+    Add --metrics and --profile to a command, see ``holdem.metrics``
+    """
+
+    @click.option('--metrics', 'metrics_path', default=None, metavar='FILE',
+                  help="write counters, phase times, hands/sec and peak memory as JSON to FILE, '-' for stdout")
+    @click.option('--profile', is_flag=True, help="run under cProfile and print the slowest functions to stderr")
+    @functools.wraps(command)
+    def wrapper(*args, metrics_path=None, profile=False, **kwargs):
+        from . import metrics
+
+        profiler = None
+        if profile:
+            import cProfile
+            profiler = cProfile.Profile()
+        with metrics.collect() if metrics_path else contextlib.nullcontext() as collected:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                result = command(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        if profiler is not None:
+            import pstats
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        if collected is not None:
+            if metrics_path == '-':
+                print(collected.to_json(indent=2))
+            else:
+                with open(metrics_path, 'w') as f:
+                    f.write(collected.to_json(indent=2))
+        return result
+
+    return wrapper
+
+
+@click.group(cls=DefaultGroup, default_command='histogram')
+def main():
+    """Texas Hold'em hand statistics. Without a sub command, runs `histogram`."""
+
+
+@main.command('histogram')
+@instrumented
 @click.argument('hole_cards', type=card_parser, nargs=-1)
 @click.option('-p', 'progress', is_flag=True, help="show progress bar (tqdm based)")
 @click.option('-x', 'exclude', type=lambda arg: [card_parser(a) for a in arg.split(',')], help="exclude other cards from the pool")
-def main(hole_cards, progress, exclude):
+@click.option('-b', '--board', type=cards_parser, default='', help="known flop or turn, e.g. 2s3s9c")
+@click.option('-j', 'workers', type=int, default=1, show_default=True, help="number of worker processes")
+@click.option('--iso', 'isomorphic', is_flag=True, help="evaluate one board per suit-isomorphism class")
+@click.option('--samples', type=int, default=None, help="estimate from at most this many random boards")
+@click.option('--tolerance', type=float, default=None,
+              help="estimate from random boards until every 95% confidence interval is narrower than +-TOLERANCE")
+@click.option('--seed', type=int, default=None, help="random seed for --samples/--tolerance")
+@click.option('--cache', 'cache_mb', type=int, default=None, metavar='MB',
+              help="look up hand strengths in an LRU cache of this many megabytes (single process only)")
+@click.option('-e', '--engine', type=click.Choice(list(engines.ENGINES)), default=None,
+              help=f"evaluator counting the boards  [default: {engines.DEFAULT_ENGINE}, "
+                   f"{engines.ENUMERATING_ENGINE} with -j or -p]")
+@click.option('--store', 'store_path', default=None, metavar='PATH',
+              help="keep exact results in this database across runs, defaults to $HOLDEM_STORE")
+def histogram_command(hole_cards, progress, exclude, board, workers, isomorphic, samples, tolerance, seed, cache_mb,
+                      engine, store_path):
     """Calculate the histgram for a hand of 'HOLE_CARDS'.
     HOLE_CARDS should be comma-separated cards
     """
@@ -22,7 +114,235 @@ def main(hole_cards, progress, exclude):
     hole_cards = list(hole_cards)
     if exclude is None:
         exclude = []
-    remaining_cards = Deck().pop(*hole_cards, *exclude).pool
-    result = histogram(hole_cards, remaining_cards, progress=progress)
+    # an excluded hole card would just be dropped from the pool
+    if cards_to_mask(hole_cards + exclude).bit_count() < len(hole_cards) + len(exclude):
+        raise click.UsageError('Duplicated cards')
+    remaining_cards = Deck().pop(*hole_cards, *exclude, *board).pool
+    cache = None
+    if cache_mb is not None:
+        from .cache import EvalCache
+        cache = EvalCache(max_bytes=cache_mb << 20)
+    store = None
+    if store_path is not None:
+        from .store import ResultStore
+        store = ResultStore(store_path)
+    try:
+        if board or isomorphic or samples is not None or tolerance is not None or cache is not None:
+            from .detect import histogram
+
+            result = histogram(hole_cards, remaining_cards, progress=progress, workers=workers,
+                               isomorphic=isomorphic, samples=samples, tolerance=tolerance, seed=seed, board=board,
+                               cache=cache, engine=engine or engines.DEFAULT_ENGINE, store=store)
+        else:
+            sharded = workers > 1 or progress
+            if engine is None:
+                engine = engines.ENUMERATING_ENGINE if sharded else engines.DEFAULT_ENGINE
+            elif sharded and not engines.enumerates(engine):
+                raise ValueError(f'The {engine} engine counts the boards in one process without progress, '
+                                 f'drop -j and -p')
+            # the table lookup or plain enumeration, only imports the selected engine
+            result = engines.histogram(hole_cards, remaining_cards, engine=engine, workers=workers,
+                                       progress=progress, store=store)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    errors = getattr(result, 'errors', None)
     for k, v in result.items():
-        print(f'{k:<13} : {v:.6f}')
+        if errors is None:
+            print(f'{k:<13} : {v:.6f}')
+        else:
+            print(f'{k:<13} : {v:.6f} ± {errors[k]:.6f}')
+    if errors is not None:
+        print(f'{result.samples} boards sampled')
+    if cache is not None:
+        stats = cache.stats
+        print(f'cache: {stats.hits} hits, {stats.misses} misses ({stats.hit_rate:.1%}), {stats.size} entries')
+
+
+@main.command('build-preflop')
+@click.option('-o', 'path', default=None,
+              help="output file, defaults to $HOLDEM_PREFLOP_TABLE or ~/.cache/holdem/preflop.npy")
+@click.option('-j', 'workers', type=int, default=1, show_default=True, help="number of worker processes")
+@click.option('-p', 'progress', is_flag=True, help="show progress bar (tqdm based)")
+def build_preflop_command(path, workers, progress):
+    """Precompute the histograms of the 169 starting hands for instant preflop queries."""
+    from . import preflop
+
+    print(preflop.build_table(path, workers=workers, progress=progress))
+
+
+@main.command('equity')
+@instrumented
+@click.argument('hands', type=cards_parser, nargs=-1, required=True)
+@click.option('-b', '--board', type=cards_parser, default='', help="known community cards, e.g. 2s3s9c")
+@click.option('-x', 'dead', type=cards_parser, default='', help="dead cards, out of play")
+@click.option('--samples', type=int, default=None, help="sample this many boards instead of enumerating")
+@click.option('--seed', type=int, default=None, help="random seed for sampling")
+def equity_command(hands, board, dead, samples, seed):
+    """Win / tie / loss shares of 2 to 9 HANDS, each given as two cards like AsKd."""
+    from .equity import equity
+
+    try:
+        result = equity(hands, board=board, dead=dead, samples=samples, seed=seed)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    for hand, e in zip(hands, result.hands):
+        name = ''.join(repr(c.rank) + repr(c.suit) for c in hand)
+        print(f'{name:<6} equity {e.equity:.4%}  win {e.win:.4%}  tie {e.tie:.4%}  loss {e.loss:.4%}')
+    print(f'{result.boards} boards, {"exact" if result.exact else "sampled"}')
+
+
+@main.command('streets')
+@instrumented
+@click.argument('hands', type=cards_parser, nargs=-1, required=True)
+@click.option('-b', '--board', type=cards_parser, default='', help="known community cards, e.g. 2s3s9c")
+@click.option('-x', 'dead', type=cards_parser, default='', help="dead cards, out of play")
+def streets_command(hands, board, dead):
+    """Histogram of the first of HANDS and the showdown equity of all of them at the flop, turn and river.
+
+    A single hand is shown down against a random holding."""
+    from .streets import street_histograms
+
+    try:
+        results = street_histograms(hands[0], hands[1:], board=board, dead=dead)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    print(f'{"":<13}' + ''.join(f'{r.street:>11}' for r in results))
+    for name in results[0].histogram:
+        print(f'{name:<13}' + ''.join(f'{r.histogram[name]:>11.6f}' for r in results))
+    names = [''.join(repr(c.rank) + repr(c.suit) for c in hand) for hand in hands] + ['random'] * (len(hands) == 1)
+    for i, name in enumerate(names):
+        print(f'{name + " equity":<13}' + ''.join(f'{r.equity.hands[i].equity:>11.4%}' for r in results))
+    print(f'{"boards":<13}' + ''.join(f'{r.boards:>11}' for r in results))
+
+
+@main.command('strength')
+@instrumented
+@click.argument('hole_cards', type=cards_parser)
+@click.option('-b', '--board', type=cards_parser, required=True, help="the flop, turn or river, e.g. 2s3s9c")
+@click.option('-x', 'dead', type=cards_parser, default='', help="dead cards, out of play")
+@click.option('-n', 'opponents', type=int, default=1, show_default=True, help="number of opponents for EHS")
+def strength_command(hole_cards, board, dead, opponents):
+    """HS, PPot, NPot and EHS of HOLE_CARDS (e.g. AsKd) against every opponent holding."""
+    from .strength import hand_strength
+
+    try:
+        result = hand_strength(hole_cards, board, dead=dead, opponents=opponents)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    print(f'HS {result.hs:.4f}  PPot {result.ppot:.4f}  NPot {result.npot:.4f}  EHS {result.ehs:.4f}  '
+          f'EHS2 {result.ehs2:.4f}')
+    print(f'{result.holdings} opponent holdings, {result.boards} boards')
+
+
+@main.command('range')
+@instrumented
+@click.argument('hero')
+@click.argument('villain')
+@click.option('-b', '--board', type=cards_parser, default='', help="known community cards, e.g. 2s3s9c")
+@click.option('-x', 'dead', type=cards_parser, default='', help="dead cards, out of play")
+@click.option('--samples', type=int, default=None, help="sample this many boards instead of enumerating")
+@click.option('--seed', type=int, default=None, help="random seed for sampling")
+def range_command(hero, villain, board, dead, samples, seed):
+    """Equity of range HERO against range VILLAIN, e.g. "AKs, TT+, A5s-A2s" random."""
+    from .hand_range import parse_range, range_equity
+
+    try:
+        result = range_equity(parse_range(hero), parse_range(villain), board=board, dead=dead, samples=samples,
+                              seed=seed)
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    print(f'equity {result.equity:.4%}  win {result.win:.4%}  tie {result.tie:.4%}  loss {result.loss:.4%}')
+    print(f'{result.matchups} matchups in {result.classes} suit classes, {result.boards} boards, '
+          f'{"exact" if result.exact else "sampled"}')
+
+
+@main.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True, help="TCP address to listen on")
+@click.option('--port', type=int, default=8765, show_default=True, help="TCP port to listen on")
+@click.option('--unix', 'unix_path', default=None, help="listen on this Unix socket instead of TCP")
+@click.option('-j', 'workers', type=int, default=None, help="worker processes, defaults to the number of CPUs")
+@click.option('--cache-size', type=int, default=4096, show_default=True, help="results kept for repeated queries")
+def serve_command(host, port, unix_path, workers, cache_size):
+    """Answer JSON-lines queries over a socket, see holdem.query for the format."""
+    import asyncio
+
+    from .server import serve
+
+    try:
+        asyncio.run(serve(host, port, unix_path=unix_path, workers=workers, cache_size=cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+@main.command('batch')
+@click.argument('source', type=click.File('r'), default='-')
+@click.option('-o', 'output', type=click.File('w'), default='-', help="output file, defaults to stdout")
+@click.option('-j', 'workers', type=int, default=1, show_default=True, help="number of worker processes")
+@click.option('--unordered', is_flag=True, help="write results as they complete instead of in input order")
+@click.option('--window', type=int, default=None, help="queries in flight, defaults to 4 per worker")
+@click.option('--cache-size', type=int, default=4096, show_default=True, help="results kept for repeated queries")
+def batch_command(source, output, workers, unordered, window, cache_size):
+    """Answer one query per line of SOURCE (a file, - for stdin) as JSON lines, see holdem.bulk for the format."""
+    import json
+
+    from .bulk import run_batch
+
+    for response in run_batch(source, workers=workers, ordered=not unordered, window=window, cache_size=cache_size):
+        output.write(json.dumps(response) + '\n')
+        output.flush()
+
+
+@main.command('history')
+@instrumented
+@click.argument('source', default='-')
+@click.option('-o', 'output', type=click.File('w'), default='-', help="output file, defaults to stdout")
+@click.option('--per', type=click.Choice(['hand', 'player']), default='hand', show_default=True,
+              help="a result per showdown, or per player over the whole input")
+@click.option('-j', 'workers', type=int, default=1, show_default=True, help="number of worker processes")
+@click.option('--chunk-mb', type=int, default=8, show_default=True, help="size of the chunks read at once")
+@click.option('--window', type=int, default=None, help="chunks in flight, defaults to 2 per worker")
+def history_command(source, output, per, workers, chunk_mb, window):
+    """Evaluate the showdowns of a PokerStars hand history SOURCE (a file, - for stdin) to JSON lines."""
+    import json
+
+    from .history import run_history
+
+    if source == '-':
+        source = sys.stdin.buffer
+    elif not os.path.isfile(source):
+        raise click.BadParameter(f'No such file: {source}', param_hint='SOURCE')
+    for result in run_history(source, per=per, workers=workers, chunk_bytes=chunk_mb << 20, window=window):
+        output.write(json.dumps(result) + '\n')
+
+
+@main.command('simulate')
+@instrumented
+@click.option('-n', 'players', type=int, multiple=True, default=[2, 6, 9], show_default=True,
+              help="players per table, repeat for several table sizes")
+@click.option('--hands', type=int, default=1000000, show_default=True, help="tables dealt per table size")
+@click.option('-j', 'workers', type=int, default=1, show_default=True, help="number of worker processes")
+@click.option('--seed', type=int, default=None, help="random seed")
+@click.option('--top', type=int, default=20, show_default=True, help="hand classes listed, 169 for all")
+@click.option('--json', 'as_json', is_flag=True, help="print one JSON line per table size instead")
+def simulate_command(players, hands, workers, seed, top, as_json):
+    """Deal random full tables to the river: win rate by starting hand, categories by table size."""
+    from .simulate import simulate
+
+    try:
+        results = [simulate(n, hands, seed=seed, workers=workers) for n in players]
+    except ValueError as err:
+        raise click.UsageError(str(err))
+    if as_json:
+        import json
+
+        for result in results:
+            print(json.dumps(result.to_dict()))
+        return
+    print(f'{"players":<13}' + ''.join(f'{r.players:>11}' for r in results))
+    histograms = [r.category_frequencies() for r in results]
+    for name in histograms[0]:
+        print(f'{name:<13}' + ''.join(f'{h[name]:>11.6f}' for h in histograms))
+    print(f'{"split pots":<13}' + ''.join(f'{r.split_pots / r.hands:>11.4%}' for r in results))
+    rates = [r.win_rates() for r in results]
+    for name in list(rates[0])[:top]:
+        print(f'{name:<13}' + ''.join(f'{rate.get(name, 0.):>11.4%}' for rate in rates))
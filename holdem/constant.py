@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 from holdem.showdown import RoyalFlush, StraightFlush, FourOfAKind, FullHouse, Flush, Straight, ThreeOfAKind, TwoPair, \
     Pair, HighCard
 
@@ -12,4 +14,18 @@ HAND_SEARCH_ORDER = [
     TwoPair,
     Pair,
     HighCard
-]
\ No newline at end of file
+]
+# Power value -> showdown class
+SHOWDOWN_BY_POWER = {t.__power__.value: t for t in HAND_SEARCH_ORDER}
+
+
+def category_histogram(counts, total) -> OrderedDict:
+    """
+    :param counts: number of boards per category, indexed by ``Power`` value
+    :param total: number of boards
+    :return: OrderedDict of showdown name -> probability, in HAND_SEARCH_ORDER
+    """
+    od = OrderedDict()
+    for t in HAND_SEARCH_ORDER:
+        od[t.__name__] = counts[t.__power__.value] / total
+    return od
@@ -1,48 +1,83 @@
 import itertools
-from functools import cached_property
-from typing import List
+from typing import Iterator, List
 
-import numpy as np
-
-from holdem.card import Suit, Rank, TexasCard
+from holdem.card import TexasCard, CARDS, FULL_MASK, cards_to_mask, mask_to_codes, mask_to_cards
 
 
 class Deck:
+    """
+    A set of cards backed by a 52-bit mask, see ``holdem.card`` for the code layout. Removing cards is a single
+    bitwise operation, ``pool`` and ``codes`` are views built from the mask.
+    """
+    __slots__ = ('_mask',)
+
     def __init__(self, cards: List[TexasCard] = None):
         if cards is None:
-            self._pool = self.gen_poker()
+            self._mask = FULL_MASK
         else:
-            self._pool = list(cards)
+            self._mask = cards_to_mask(cards)
+
+    @classmethod
+    def from_mask(cls, mask: int):
+        deck = cls.__new__(cls)
+        deck._mask = mask & FULL_MASK
+        return deck
+
+    @property
+    def mask(self) -> int:
+        return self._mask
 
-    def deal(self, n):
+    def deal(self, n, rng=None):
         """
-        Draw texas cards from the decker
+        Draw n distinct texas cards from the decker
+
+        :param rng: ``numpy.random.Generator``, a fresh one by default
         """
-        idxes = np.random.randint(0, len(self.pool), size=n)
-        return tuple(self.pool[i] for i in idxes)
+        if rng is None:
+            import numpy as np
+            rng = np.random.default_rng()
+        pool = self.pool
+        idxes = rng.choice(len(pool), size=n, replace=False)
+        return tuple(pool[i] for i in idxes)
 
-    @cached_property
-    def pool(self):
+    @property
+    def pool(self) -> List[TexasCard]:
         # give a copy
-        return list(self._pool)
+        return mask_to_cards(self._mask)
+
+    @property
+    def codes(self) -> List[int]:
+        """
+        :return: card codes in the deck, ascending
+        """
+        return mask_to_codes(self._mask)
 
     @staticmethod
     def gen_poker():
         """
         :return: a list of 52 poker cards, excluding the Jokers
         """
-        cards = []
-        for s, r in itertools.product(list(Suit), list(Rank)):
-            cards.append(TexasCard(s, r))
-        return cards
+        return list(CARDS)
 
     def pop(self, *remove: TexasCard):
         """
         :param remove: cards to be pop out
         :return: new Deck object with cards removed
         """
-        cards = [c for c in self._pool if c not in remove]
-        return Deck(cards)
+        return Deck.from_mask(self._mask & ~cards_to_mask(remove))
+
+    def boards(self, k=5) -> Iterator[int]:
+        """
+        Enumerate every k-card subset of the deck as a card mask, in ``itertools.combinations`` order
+        """
+        bits = [1 << code for code in self.codes]
+        return map(sum, itertools.combinations(bits, k))
+
+    def __contains__(self, card: TexasCard):
+        return bool(self._mask & card.mask)
+
+    def __len__(self):
+        return self._mask.bit_count()
 
     def __repr__(self):
-        return f'<Deck obj, pool={len(self._pool)} cards>'
+        return f'<Deck obj, pool={len(self)} cards>'
@@ -1,12 +1,14 @@
-import itertools
-import time
-from collections import defaultdict, OrderedDict
+import functools
+from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Sequence
 
 from tqdm import tqdm
 
-from .constant import HAND_SEARCH_ORDER
+from . import boards, engines, isomorphism, metrics, parallel, preflop
+from . import store as result_store
+from .card import SUITS, card_from_code, cards_to_mask, mask_to_cards
+from .constant import category_histogram
 from .showdown import *
 from .util import Timeit
 
@@ -22,11 +24,12 @@ def get_rank_distribution(cards: Iterable[TexasCard]):
     """
 
     :param cards: descending sorted
-    :return: OrdedDict[Rank, (count, cards)], keys sorted descending
+    :return: OrdedDict[rank value, (count, cards)], keys sorted descending
     """
+    # keyed by the int rank value, hashing the Rank enum is slow
     d = defaultdict(BestRankItem)
     for card in cards:
-        obj = d[card.rank]
+        obj = d[card.rank_value]
         obj.rank = card.rank
         obj.count += 1
         obj.cards.append(card)
@@ -36,10 +39,12 @@ def get_rank_distribution(cards: Iterable[TexasCard]):
 # suit with the most number of cards
 # ties doesn't matter here, 2==2 ties cannot change anything
 def get_max_suit(community_cards: List[TexasCard]):
-    ms = defaultdict(lambda: 0)
+    # card codes are suit-major, code // 13 is the suit index
+    ms = [0, 0, 0, 0]
     for card in community_cards:
-        ms[card.suit] += 1
-    return max(ms.items(), key=operator.itemgetter(1))
+        ms[card.code // 13] += 1
+    count = max(ms)
+    return SUITS[ms.index(count)], count
 
 
 def find_suit(cards: List[TexasCard], flush_suit):
@@ -69,34 +74,109 @@ def detect_straight(cards: List[TexasCard]):
     acc = [cursor]
     # check if ace in cards
     for card in cards[1:]:
-        if cursor.rank.value - 1 == card.rank.value:
+        if cursor.rank_value - 1 == card.rank_value:
             cursor = card
             acc.append(card)
             if len(acc) == 5:
-                return acc, max(acc, key=operator.attrgetter('rank')).rank
-        elif cursor.rank.value == card.rank.value:
+                return acc, max(acc, key=operator.attrgetter('rank_value')).rank
+        elif cursor.rank_value == card.rank_value:
             pass
-        elif cursor.rank.value - 1 > card.rank.value:
+        elif cursor.rank_value - 1 > card.rank_value:
             # broken straight
             cursor = card
             acc = [cursor]
 
-    if cursor.rank.value == 2 and len(acc) == 4 and Rank.Ace in [c.rank for c in cards]:
+    if cursor.rank_value == 2 and len(acc) == 4 and Rank.Ace in [c.rank for c in cards]:
         # pick that ace card
-        highest_rank = max(acc, key=operator.attrgetter('rank')).rank
+        highest_rank = max(acc, key=operator.attrgetter('rank_value')).rank
         ace_card = next(c for c in cards if c.rank == Rank.Ace)
         acc.append(ace_card)
         return acc, highest_rank
     return None
 
 
+class HandResult:
+    """
+    Outcome of ``decide_showdown``. The showdown class is decided right away; the strength and the full ``Showdown``
+    with its cards, values and kickers are only built on first access, so callers that count categories allocate
+    nothing else per hand.
+    """
+    __slots__ = ('showdown_class', 'table_cards', '_build', '_showdown', '_strength')
+
+    def __init__(self, showdown_class, table_cards: List[TexasCard], build):
+        """
+        :param table_cards: the cards, sorted desc
+        :param build: no-argument callable returning the Showdown
+        """
+        self.showdown_class = showdown_class
+        self.table_cards = table_cards
+        self._build = build
+        self._showdown = None
+        self._strength = None
+
+    @property
+    def __power__(self) -> Power:
+        return self.showdown_class.__power__
+
+    @property
+    def category(self) -> int:
+        """
+        :return: ``Power`` value of the hand
+        """
+        return self.showdown_class.__power__.value
+
+    @property
+    def strength(self) -> int:
+        """
+        :return: integer strength, ordered like ``Showdown.__gt__`` with equal strengths for ties, see
+            ``holdem.lut``
+        """
+        if self._strength is None:
+            from . import lut
+
+            self._strength = lut.evaluate(self.table_cards)
+        return self._strength
+
+    @property
+    def showdown(self) -> Showdown:
+        if self._showdown is None:
+            self._showdown = self._build()
+        return self._showdown
+
+    def cards(self):
+        return self.showdown.cards()
+
+    def values(self):
+        return self.showdown.values()
+
+    def __gt__(self, other):
+        # like ``Showdown.__gt__``: by category then values, a tie raises TieException
+        return self.showdown > (other.showdown if isinstance(other, HandResult) else other)
+
+    def __eq__(self, other):
+        # equal strengths split the pot
+        if isinstance(other, HandResult):
+            return self.strength == other.strength
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.strength)
+
+    def __repr__(self):
+        return f'<HandResult {self.showdown_class.__name__}>'
+
+
 # source: https://github.com/RoelandMatthijssens/holdem_calc/blob/master/holdem_calc/holdem_functions.py
-def decide_showdown(table_cards):
+def decide_showdown(table_cards) -> HandResult:
+    # branch counters, None unless metrics are collected
+    m = metrics.active
     # all seven cards on the table, sorted desc
     table_cards = TexasCard.sort_desc(table_cards)
     max_suit, max_suit_count = get_max_suit(table_cards)
     # Determine if flush possible
     if max_suit_count >= 5:
+        if m is not None:
+            m.counters['flush_path'] += 1
         # flush is reachable
         # at least five cards are of different ranks, so full house, four of a kind is not possible
 
@@ -109,15 +189,17 @@ def decide_showdown(table_cards):
             cards, max_rank = result
             # is straight flush
             if cards[-1].rank == Rank.Ten:
-                return RoyalFlush(cards)
+                return HandResult(RoyalFlush, table_cards, lambda: RoyalFlush(cards))
             else:
-                return StraightFlush(cards, max_rank)
+                return HandResult(StraightFlush, table_cards, lambda: StraightFlush(cards, max_rank))
         else:
-            return Flush(flush_cards[-5:])
+            return HandResult(Flush, table_cards, lambda: Flush(flush_cards[:5]))
 
     # Remaining: Four of a kind / Full house / Straight / Three of a kind / Two pair / Pair / High card
 
     # Trick: find most frequent rank and second most frequent rank
+    if m is not None:
+        m.counters['rank_path'] += 1
     rank_distribution = get_rank_distribution(table_cards)
 
     # sort the k, v pair by count(value[0] first, then by the rank(key)
@@ -134,62 +216,246 @@ def decide_showdown(table_cards):
             if func(c):
                 yield c
 
+    # the Showdown objects below are only built when the caller asks for them
+
     # check if there is a four of a kind
     if best_rank.count == 4:
-        four_cards = tuple(best_rank.cards)
-        kicker = next(kicker_gen(lambda c: c.rank != best_rank.rank))
-        return FourOfAKind(quad=four_cards, kicker=kicker)
+        def four_of_a_kind():
+            four_cards = tuple(best_rank.cards)
+            kicker = next(kicker_gen(lambda c: c.rank != best_rank.rank))
+            return FourOfAKind(quad=four_cards, kicker=kicker)
+        return HandResult(FourOfAKind, table_cards, four_of_a_kind)
     if best_rank.count == 3 and sec_best_rank.count >= 2:
-        # could be more than two cards
-        triplet = tuple(best_rank.cards)
-        twins = tuple(sec_best_rank.cards[:2])  # could be more than two
-        return FullHouse(triplet, twins)
+        def full_house():
+            # could be more than two cards
+            triplet = tuple(best_rank.cards)
+            twins = tuple(sec_best_rank.cards[:2])  # could be more than two
+            return FullHouse(triplet, twins)
+        return HandResult(FullHouse, table_cards, full_house)
 
     # check if it is possible to have a straight
     if len(rank_distribution.keys()) >= 5:
+        if m is not None:
+            m.counters['straight_check'] += 1
         result = detect_straight(table_cards)
         if result:
             cards, max_rank = result
-            return Straight(cards, max_rank)
+            return HandResult(Straight, table_cards, lambda: Straight(cards, max_rank))
 
     # check if there is a three of a kind
     if best_rank.count == 3:
-        three_cards = tuple(best_rank.cards)
-        kg = kicker_gen(lambda c: c.rank != best_rank.rank)
-        kickers = [next(kg) for _ in range(2)]
-        return ThreeOfAKind(triplet=three_cards, kickers=kickers)
+        def three_of_a_kind():
+            three_cards = tuple(best_rank.cards)
+            kg = kicker_gen(lambda c: c.rank != best_rank.rank)
+            kickers = [next(kg) for _ in range(2)]
+            return ThreeOfAKind(triplet=three_cards, kickers=kickers)
+        return HandResult(ThreeOfAKind, table_cards, three_of_a_kind)
 
     # check if there is two pair / pair
     if best_rank.count == 2:
-        strong_pair = tuple(best_rank.cards)
         if sec_best_rank.count == 2:
-            weak_pair = tuple(sec_best_rank.cards)
-            kicker = next(kicker_gen(lambda c: c.rank != best_rank.rank and c.rank != sec_best_rank.rank))
-            return TwoPair(pair_major=strong_pair, pair_minor=weak_pair, kicker=kicker)
+            def two_pair():
+                kicker = next(kicker_gen(lambda c: c.rank != best_rank.rank and c.rank != sec_best_rank.rank))
+                return TwoPair(pair_major=tuple(best_rank.cards), pair_minor=tuple(sec_best_rank.cards),
+                               kicker=kicker)
+            return HandResult(TwoPair, table_cards, two_pair)
         else:
-            kg = kicker_gen(lambda c: c.rank != best_rank.rank)
-            kickers = [next(kg) for _ in range(3)]
-            return Pair(pair=strong_pair, kickers=kickers)
+            def pair():
+                kg = kicker_gen(lambda c: c.rank != best_rank.rank)
+                kickers = [next(kg) for _ in range(3)]
+                return Pair(pair=tuple(best_rank.cards), kickers=kickers)
+            return HandResult(Pair, table_cards, pair)
 
     # high card
-    return HighCard(cards=table_cards[-5:])
+    return HandResult(HighCard, table_cards, lambda: HighCard(cards=table_cards[:5]))
 
 
 @Timeit(message='Time elapsed')
-def histogram(hole_cards: Tuple[TexasCard, TexasCard], board: Iterable[TexasCard], progress=False):
-    start = time.time()
-    results = defaultdict(lambda: 0)
+def histogram(hole_cards: Tuple[TexasCard, TexasCard], pool: Iterable[TexasCard], progress=False, batch_size=None,
+              workers=1, isomorphic=False, use_table=True, samples=None, tolerance=None, seed=None,
+              board: Sequence[TexasCard] = (), cache=None, engine=engines.DEFAULT_ENGINE, store=None):
+    """
+    Boards are enumerated lazily, memory does not grow with the number of boards.
+
+    :param hole_cards: the two hole cards
+    :param pool: pool of cards the community cards are drawn from
+    :param progress: show a tqdm progress bar
+    :param batch_size: if given, evaluate the boards in numpy chunks of this size with ``holdem.batch`` instead of
+        building a Showdown per board
+    :param workers: split the boards in index ranges evaluated by this many processes
+    :param isomorphic: evaluate one board per class of boards equivalent under the suit symmetries left by the hole
+        cards and the pool, weighted by the class size, see ``holdem.isomorphism``. Runs in a single process.
+    :param use_table: answer preflop queries without exclusions from the precomputed table if it has been built,
+        see ``holdem.preflop``
+    :param samples: estimate from at most this many random boards instead of enumerating, see ``holdem.sampling``
+    :param tolerance: estimate from random boards until every category's 95% confidence interval half-width is
+        below this
+    :param seed: random seed for sampling
+    :param board: known community cards, e.g. a flop or a turn. Only the missing cards are drawn from the pool,
+        which takes at most C(47, 2) completions, so they are always enumerated in this process with the
+        incremental ``holdem.lut.HandState``: `samples`, `tolerance`, `isomorphic`, `workers`, `batch_size` and
+        `cache` raise ValueError, `engine` is not used.
+    :param cache: ``holdem.cache.EvalCache`` of hand strengths, looked up by the single-process paths without
+        `batch_size` instead of evaluating every hand
+    :param engine: name of the ``holdem.engines`` engine enumerating the boards when neither `batch_size` nor
+        `cache` is given
+    :param store: ``holdem.store.ResultStore`` of exact counts, looked up before enumerating; None for the one
+        named by ``$HOLDEM_STORE`` if any, False for none
+    :return: OrderedDict of showdown name -> probability, in HAND_SEARCH_ORDER
+    """
+    hole_cards, pool = tuple(hole_cards), tuple(pool)
+    store = result_store.resolve(store)
+    if board:
+        board = tuple(board)
+        if len(board) > 5 or cards_to_mask(hole_cards) & cards_to_mask(board) or len(set(board)) != len(board):
+            raise ValueError('The board holds at most five cards, none of them in the hole cards or twice')
+        ignored = [name for name, value in (('samples', samples), ('tolerance', tolerance), ('batch_size', batch_size),
+                                            ('cache', cache)) if value is not None]
+        ignored += [name for name, value in (('isomorphic', isomorphic), ('workers', workers > 1)) if value]
+        if ignored:
+            raise ValueError(f'A known board is always enumerated exactly in one process, drop {", ".join(ignored)}')
+        # the board cards may still be in the pool
+        pool = tuple(c for c in pool if c not in board)
+        with metrics.phase('evaluate'):
+            counts = result_store.stored_counts(store, hole_cards, board, pool,
+                                                lambda: _board_counts(hole_cards, board, pool))
+        return category_histogram(counts, boards.count_boards(len(pool), 5 - len(board)))
+    if samples is not None or tolerance is not None:
+        from . import sampling
+
+        with tqdm(total=samples or sampling.MAX_SAMPLES, disable=not progress) as bar:
+            return sampling.sample_histogram(hole_cards, pool, samples=samples, tolerance=tolerance, seed=seed,
+                                             callback=bar.update)
     # possible to draw five from the pool
-    possible_boards = list(itertools.combinations(board, 5))
-    total_trial = len(possible_boards)
-
-    for board in tqdm(possible_boards) if progress else possible_boards:
-        # board is tuple here
-        best = decide_showdown(list(hole_cards) + list(board))
-        results[best.__class__] += 1
-
-    od = OrderedDict()
-    for t in HAND_SEARCH_ORDER:
-        od[t.__name__] = results[t] / total_trial
-    print(f'Time elapsed: {(time.time() - start)} seconds')
-    return od
+    total_trial = boards.count_boards(len(pool), 5)
+    if use_table:
+        with metrics.phase('preflop_lookup'):
+            counts = preflop.lookup(hole_cards, pool)
+        if counts is not None:
+            return category_histogram(counts, total_trial)
+    counts = result_store.stored_counts(
+        store, hole_cards, (), pool,
+        lambda: _enumerate(hole_cards, pool, total_trial, progress, batch_size, workers, isomorphic, cache, engine))
+    return category_histogram(counts, total_trial)
+
+
+def _enumerate(hole_cards, pool, total_trial, progress, batch_size, workers, isomorphic, cache, engine) -> list:
+    """
+    :return: number of boards per category of the boards of five cards from the pool, see ``histogram``
+    """
+    if cache is not None and workers > 1:
+        # the workers would each start from an empty cache of their own
+        raise ValueError('The evaluation cache runs in a single process')
+    count = functools.partial(count_range, hole_cards, pool, batch_size=batch_size)
+    before = cache.stats if cache is not None else None
+    if isomorphic:
+        if workers > 1:
+            raise ValueError('Isomorphic enumeration runs in a single process')
+        with tqdm(total=total_trial, disable=not progress) as bar, metrics.phase('evaluate'):
+            counts = count_isomorphic(hole_cards, pool, batch_size=batch_size, callback=bar.update, cache=cache)
+    elif batch_size is None and cache is None:
+        with metrics.phase('parallel' if workers > 1 else 'evaluate'):
+            counts = engines.count_boards(engine, [c.code for c in hole_cards], [c.code for c in pool],
+                                          workers=workers, progress=progress)
+    elif workers > 1:
+        # the workers' own counters are not collected
+        with metrics.phase('parallel'):
+            counts = parallel.run_sharded(count, total_trial, workers, progress=progress)
+        metrics.count('hands', total_trial)
+    else:
+        with tqdm(total=total_trial, disable=not progress) as bar, metrics.phase('evaluate'):
+            counts = count(0, total_trial, callback=bar.update, cache=cache)
+    if cache is not None:
+        stats = cache.stats
+        metrics.count('cache_hits', stats.hits - before.hits)
+        metrics.count('cache_misses', stats.misses - before.misses)
+    return counts
+
+
+def _board_counts(hole_cards: Tuple[TexasCard, ...], board: Tuple[TexasCard, ...], pool: Sequence[TexasCard]) -> list:
+    """
+    :param pool: cards the missing community cards are drawn from, none of them on the board
+    """
+    from . import lut
+
+    missing = 5 - len(board)
+    state = lut.HandState.from_cards(hole_cards + board)
+    metrics.count('hands', boards.count_boards(len(pool), missing))
+    return lut.count_completions(state, [c.code for c in pool], missing)
+
+
+def count_range(hole_cards: Tuple[TexasCard, TexasCard], board: Sequence[TexasCard], start=0, stop=None,
+                batch_size=None, callback=None, cache=None):
+    """
+    Count the boards with index in [start, stop) of the enumeration of five cards from `board`, see
+    ``holdem.boards``. Counts of disjoint ranges add up, so a run can be sharded or resumed from any index.
+
+    :param callback: called with the number of boards just counted, for progress reporting
+    :param cache: ``holdem.cache.EvalCache`` of hand strengths, replaces ``decide_showdown`` when given
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    if batch_size is not None:
+        from . import batch
+
+        combos = boards.iter_boards([c.code for c in board], 5, start, stop)
+        chunks = metrics.timed('enumerate', batch.iter_chunks(combos, batch_size))
+        return batch.count_categories([c.code for c in hole_cards], chunks, callback=callback)
+
+    counts = [0] * (len(Power) + 1)
+    if cache is not None:
+        from .lut import CATEGORY_SHIFT
+
+        hole_mask = cards_to_mask(hole_cards)
+        for community in metrics.timed('enumerate', boards.iter_boards([c.mask for c in board], 5, start, stop)):
+            counts[cache.evaluate_mask(hole_mask | sum(community)) >> CATEGORY_SHIFT] += 1
+            if callback is not None:
+                callback(1)
+    else:
+        hole_cards = tuple(hole_cards)
+        for community in metrics.timed('enumerate', boards.iter_boards(board, 5, start, stop)):
+            counts[decide_showdown(hole_cards + community).category] += 1
+            if callback is not None:
+                callback(1)
+    metrics.count('hands', sum(counts))
+    return counts
+
+
+def count_codes(hole_codes: Sequence[int], pool_codes: Sequence[int], start, stop, callback=None):
+    """
+    The detect engine, see ``holdem.engines``
+    """
+    return count_range(tuple(map(card_from_code, hole_codes)), [card_from_code(c) for c in pool_codes], start, stop,
+                       callback=callback)
+
+
+def count_isomorphic(hole_cards: Tuple[TexasCard, TexasCard], board: Sequence[TexasCard], batch_size=None,
+                     callback=None, cache=None):
+    """
+    Same counts as ``count_range`` over all boards, evaluating one board per suit-isomorphism class
+
+    :param callback: called with the number of boards (class sizes) just counted, for progress reporting
+    :param cache: ``holdem.cache.EvalCache`` of hand strengths, replaces ``decide_showdown`` when given
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    representatives = metrics.timed('enumerate', isomorphism.canonical_boards(hole_cards, board))
+    if batch_size is not None:
+        from . import batch
+
+        return batch.count_weighted([c.code for c in hole_cards], representatives, batch_size, callback=callback)
+
+    counts = [0] * (len(Power) + 1)
+    if cache is not None:
+        from .lut import CATEGORY_SHIFT
+
+        hole_mask = cards_to_mask(hole_cards)
+        evaluate = cache.evaluate_mask
+    hole_cards = list(hole_cards)
+    for board_mask, weight in representatives:
+        if cache is not None:
+            counts[evaluate(hole_mask | board_mask) >> CATEGORY_SHIFT] += weight
+        else:
+            counts[decide_showdown(hole_cards + mask_to_cards(board_mask)).category] += weight
+        if callback is not None:
+            callback(weight)
+        metrics.count('hands')
+    return counts
@@ -0,0 +1,121 @@
+"""
+Hand evaluation engines and the histogram driver they share
+
+An engine is a module with a ``count_codes(hole_codes, pool_codes, start, stop, callback=None)`` function: the
+number of boards per category, indexed by ``Power`` value, of the boards with index in [start, stop) of the
+enumeration of five cards from the pool (see ``holdem.boards``), calling `callback` with the number of boards done.
+An engine that counts the boards without enumerating them has ``count_all(hole_codes, pool_codes)`` instead, it
+always runs in one process.
+
+========  ======================  ==============================================
+detect    ``holdem.detect``       a ``decide_showdown`` per board
+lut       ``holdem.lut``          table lookups on packed rank and suit counts
+numpy     ``holdem.batch``        the lookups vectorized over chunks of boards
+eval7     ``holdem.eval7_api``    the eval7 C extension
+analytic  ``holdem.analytic``     rank multisets weighted by their card sets
+========  ======================  ==============================================
+
+Engines are imported when they are selected, so a command using one of them does not import the others (nor
+numpy or eval7). ``histogram`` answers preflop queries without exclusions from the table of ``holdem.preflop`` and
+enumerates the boards with the engine otherwise, in one process or sharded over `workers`, unless the counts are in
+the ``holdem.store`` result store.
+"""
+import functools
+import importlib
+from typing import Iterable, Sequence, Tuple
+
+from . import boards, metrics
+from . import store as result_store
+from .card import TexasCard, cards_to_mask
+
+ENGINES = {
+    'detect': 'holdem.detect',
+    'lut': 'holdem.lut',
+    'numpy': 'holdem.batch',
+    'eval7': 'holdem.eval7_api',
+    'analytic': 'holdem.analytic',
+}
+# exact and fastest, never enumerates the boards
+DEFAULT_ENGINE = 'analytic'
+# the default when the boards are sharded over workers or counted with a progress bar
+ENUMERATING_ENGINE = 'lut'
+
+
+def load(name: str):
+    """
+    :return: the module of an engine, imported on first use
+    """
+    try:
+        module = ENGINES[name]
+    except KeyError:
+        raise ValueError(f'Unknown engine {name!r}, choose from {", ".join(ENGINES)}')
+    return importlib.import_module(module)
+
+
+def enumerates(engine: str) -> bool:
+    """
+    :return: whether an engine enumerates the boards, so that they can be sharded and their progress shown
+    """
+    return not hasattr(load(engine), 'count_all')
+
+
+def count_boards(engine: str, hole_codes: Sequence[int], pool_codes: Sequence[int], workers=1,
+                 progress=False) -> list:
+    """
+    :param engine: name of the engine
+    :param workers: split the boards in index ranges counted by this many processes
+    :param progress: show a tqdm progress bar
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    module = load(engine)
+    if hasattr(module, 'count_all'):
+        return module.count_all(list(hole_codes), list(pool_codes))
+    count_codes = module.count_codes
+    total = boards.count_boards(len(pool_codes), 5)
+    # codes pickle cheaply for the workers
+    count_range = functools.partial(count_codes, list(hole_codes), list(pool_codes))
+    if workers > 1:
+        from . import parallel
+
+        counts = parallel.run_sharded(count_range, total, workers, progress=progress)
+        # the workers' own counters are not collected
+        metrics.count('hands', total)
+        return counts
+    if not progress:
+        return count_range(0, total)
+    from tqdm import tqdm
+
+    with tqdm(total=total) as bar:
+        return count_range(0, total, callback=bar.update)
+
+
+def histogram(hole_cards: Tuple[TexasCard, TexasCard], pool: Iterable[TexasCard], engine=DEFAULT_ENGINE, workers=1,
+              progress=False, use_table=True, store=None):
+    """
+    :param pool: cards the five community cards are drawn from
+    :param engine: name of the engine counting the boards
+    :param workers: split the boards in index ranges evaluated by this many processes
+    :param progress: show a tqdm progress bar
+    :param use_table: answer preflop queries without exclusions from the precomputed table if it has been built
+    :param store: ``holdem.store.ResultStore`` looked up before counting, None for the one named by
+        ``$HOLDEM_STORE`` if any, False for none
+    :return: OrderedDict of showdown name -> probability, in HAND_SEARCH_ORDER
+    """
+    from . import preflop
+    from .constant import category_histogram
+
+    hole_cards, pool = tuple(hole_cards), tuple(pool)
+    if cards_to_mask(hole_cards + pool).bit_count() < len(hole_cards) + len(pool):
+        raise ValueError('Duplicated cards')
+    total = boards.count_boards(len(pool), 5)
+    if use_table:
+        with metrics.phase('preflop_lookup'):
+            counts = preflop.lookup(hole_cards, pool)
+        if counts is not None:
+            return category_histogram(counts, total)
+    with metrics.phase('parallel' if workers > 1 else 'evaluate'):
+        counts = result_store.stored_counts(
+            result_store.resolve(store), hole_cards, (), pool,
+            lambda: count_boards(engine, [c.code for c in hole_cards], [c.code for c in pool], workers=workers,
+                                 progress=progress))
+    return category_histogram(counts, total)
@@ -0,0 +1,142 @@
+"""
+Showdown equity of 2 to 9 known hands
+
+The missing community cards are enumerated when there are few enough completions, otherwise sampled. Every hand
+is evaluated for a whole batch of boards with ``holdem.batch``, and the winners of each board are the hands whose
+strength equals the board maximum, so ties need no special handling.
+"""
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+import numpy as np
+
+from . import boards, metrics
+from .card import FULL_MASK, TexasCard, mask_to_codes
+
+# enumerate exactly up to this many board completions, sample above it
+EXACT_LIMIT = 200_000
+DEFAULT_SAMPLES = 100_000
+
+
+@dataclass
+class HandEquity:
+    win: float = 0.
+    tie: float = 0.
+    loss: float = 0.
+    # share of the pot: wins plus split pots divided among the winners
+    equity: float = 0.
+
+
+@dataclass
+class EquityResult:
+    hands: List[HandEquity] = field(default_factory=list)
+    boards: int = 0
+    exact: bool = True
+
+
+def check_cards(*groups: Sequence[TexasCard]) -> int:
+    """
+    :return: mask of all the cards, raise ValueError if a card appears twice
+    """
+    mask = 0
+    for group in groups:
+        for card in group:
+            if mask & card.mask:
+                raise ValueError(f'Duplicated card {card}')
+            mask |= card.mask
+    return mask
+
+
+class ShowdownTally:
+    """
+    Accumulates win / tie / pot share counts of several hands over batches of boards
+    """
+
+    def __init__(self, players: int):
+        self.wins = np.zeros(players)
+        self.ties = np.zeros(players)
+        self.shares = np.zeros(players)
+        self.boards = 0
+
+    def add(self, strengths: np.ndarray, weights: np.ndarray = None):
+        """
+        :param strengths: (players, N) hand strengths on N boards
+        :param weights: optional per-board weights
+        """
+        winners = strengths == strengths.max(axis=0)
+        n_winners = winners.sum(axis=0)
+        if weights is None:
+            weights = np.ones(strengths.shape[1])
+        self.wins += (winners & (n_winners == 1)) @ weights
+        self.ties += (winners & (n_winners > 1)) @ weights
+        self.shares += (winners / n_winners) @ weights
+        self.boards += weights.sum()
+
+    def result(self, exact: bool) -> EquityResult:
+        hands = []
+        for win, tie, share in zip(self.wins / self.boards, self.ties / self.boards, self.shares / self.boards):
+            hands.append(HandEquity(win=float(win), tie=float(tie), loss=float(1 - win - tie), equity=float(share)))
+        return EquityResult(hands=hands, boards=int(self.boards), exact=exact)
+
+
+def hand_strengths(hole_hands: Sequence[Sequence[int]], community: np.ndarray) -> np.ndarray:
+    """
+    :param hole_hands: hole card codes of every hand
+    :param community: (N, 5) community card codes
+    :return: (players, N) strengths
+    """
+    from .batch import evaluate_batch
+
+    n = len(community)
+    metrics.count('hands', n * len(hole_hands))
+    return np.stack([evaluate_batch(np.hstack([np.broadcast_to(np.asarray(hole), (n, len(hole))), community]))[1]
+                     for hole in hole_hands])
+
+
+def equity(hole_hands: Sequence[Sequence[TexasCard]], board: Sequence[TexasCard] = (),
+           dead: Sequence[TexasCard] = (), samples: int = None, exact_limit=EXACT_LIMIT, seed=None,
+           batch_size=1 << 15) -> EquityResult:
+    """
+    :param hole_hands: 2 to 9 hands of two hole cards
+    :param board: known community cards, 0 to 5
+    :param dead: cards known to be out of play
+    :param samples: number of random boards; by default boards are enumerated when there are at most
+        `exact_limit` completions and DEFAULT_SAMPLES boards are sampled otherwise
+    :param seed: seed of the numpy random generator
+    :return: win / tie / loss / equity of every hand, in the order given
+    """
+    from .sampling import sample_boards
+
+    if not 2 <= len(hole_hands) <= 9:
+        raise ValueError('Equity needs 2 to 9 hands')
+    if any(len(hand) != 2 for hand in hole_hands) or len(board) > 5:
+        raise ValueError('Every hand needs two hole cards and the board at most five cards')
+    used = check_cards(*hole_hands, board, dead)
+    pool = np.array(mask_to_codes(FULL_MASK & ~used), dtype=np.int64)
+    known = np.array([c.code for c in board], dtype=np.int64)
+    missing = 5 - len(board)
+    hole_codes = [[c.code for c in hand] for hand in hole_hands]
+    tally = ShowdownTally(len(hole_hands))
+
+    total = boards.count_boards(len(pool), missing)
+    exact = samples is None and total <= exact_limit
+    if exact:
+        combos = itertools.combinations(pool.tolist(), missing)
+        while True:
+            chunk = list(itertools.islice(combos, batch_size))
+            if not chunk:
+                break
+            completions = np.array(chunk, dtype=np.int64).reshape(len(chunk), missing)
+            tally.add(hand_strengths(hole_codes, _with_known(known, completions)))
+    else:
+        rng = np.random.default_rng(seed)
+        budget = samples or DEFAULT_SAMPLES
+        while tally.boards < budget:
+            completions = sample_boards(pool, int(min(batch_size, budget - tally.boards)), rng, k=missing)
+            tally.add(hand_strengths(hole_codes, _with_known(known, completions)))
+    return tally.result(exact)
+
+
+def _with_known(known: np.ndarray, completions: np.ndarray) -> np.ndarray:
+    return np.hstack([np.broadcast_to(known, (len(completions), len(known))), completions])
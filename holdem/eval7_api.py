@@ -1,66 +1,86 @@
+"""
+eval7 backend
+
+Cards go to eval7 through ``EVAL7_CARDS``, the ``eval7.Card`` of every card code built once at import, and a
+query checks its cards for duplicates once instead of once per board. The category comes straight from the eval7
+score: the hand type is ``score >> 24`` (0 high card to 8 straight flush), and the royal flush is the ace-high
+straight flush, the largest score there is.
+"""
 import itertools
-from collections import OrderedDict, defaultdict
-from typing import Iterable, List, Tuple
+from collections import Counter
+from typing import Iterable, Sequence, Tuple
 
 import eval7
-from tqdm import tqdm
 
-from holdem.card import TexasCard
+from holdem.card import CARDS, TexasCard, cards_to_mask
 
-from . import detect
-from .constant import HAND_SEARCH_ORDER
-from .showdown import (Flush, FourOfAKind, FullHouse, HighCard, Pair,
-                       RoyalFlush, Straight, StraightFlush, ThreeOfAKind,
-                       TwoPair)
+from . import boards, metrics
+from .constant import SHOWDOWN_BY_POWER
+from .showdown import Power
 from .util import Timeit
 
-STR_MAP = {
-    "High Card": HighCard,
-    "Pair": Pair,
-    "Two Pair": TwoPair,
-    "Trips": ThreeOfAKind,
-    "Straight": Straight,
-    "Flush": Flush,
-    "Full House": FullHouse,
-    "Quads": FourOfAKind,
-    "Straight Flush": StraightFlush
-}
+EVAL7_CARDS = tuple(eval7.Card(c.to_eval7_str()) for c in CARDS)
+TYPE_SHIFT = 24
+ROYAL_FLUSH_SCORE = 8 << TYPE_SHIFT | 12 << 16
+# boards evaluated per call of the progress callback
+CHUNK = 1 << 16
+
+
+def to_eval7(cards: Iterable[TexasCard]) -> list:
+    return [EVAL7_CARDS[c.code] for c in cards]
+
+
+def category(score: int) -> int:
+    """
+    :return: ``Power`` value of an eval7 score
+    """
+    if score >= ROYAL_FLUSH_SCORE:
+        return Power.ROYAL_FLUSH.value
+    return (score >> TYPE_SHIFT) + 1
 
 
 def decide_showdown(table_cards: Iterable[TexasCard], assist=True):
     """
-    If table cards have duplicates, the eval7 implementation might go wrong!
-    so check for it
+    eval7 gives wrong results for duplicated cards, so they are rejected
     @param table_cards: five to seven cards
-    @return:
+    @param assist: no-op, kept for callers of the former check of straight flushes against ``holdem.detect``: the
+        royal flush is now told apart from the eval7 strength itself
+    @return: the showdown class of the best hand
     """
-    if len(set(table_cards)) < len(tuple(table_cards)):
+    table_cards = tuple(table_cards)
+    if cards_to_mask(table_cards).bit_count() < len(table_cards):
         raise ValueError('Duplicated cards')
-    table_cards: List[TexasCard] = TexasCard.sort_desc(table_cards)
-    hand = [eval7.Card(c.to_eval7_str()) for c in table_cards]
-    int_type = eval7.evaluate(hand)
-    str_type = eval7.handtype(int_type)
-    best_type = STR_MAP[str_type]
-
-    if assist and best_type == StraightFlush:
-        # check with my implementation
-        best = detect.decide_showdown(table_cards)
-        assert isinstance(best, StraightFlush) or isinstance(best, RoyalFlush)
-        if best.__class__ == RoyalFlush:
-            best_type = RoyalFlush
-    return best_type
+    return SHOWDOWN_BY_POWER[category(eval7.evaluate(to_eval7(table_cards)))]
 
 
 @Timeit(message='Time elapsed')
-def histogram(hole_cards: Tuple[TexasCard, TexasCard], pool: Iterable[TexasCard]):
-    results = defaultdict(lambda: 0)
-    possible_boards = list(itertools.combinations(pool, 5))
-    total_trial = len(possible_boards)
-    for comm_cards in tqdm(possible_boards):
-        # return the showndown class
-        best_cls = decide_showdown(hole_cards + comm_cards)
-        results[best_cls] += 1
-    od = OrderedDict()
-    for t in HAND_SEARCH_ORDER:
-        od[t.__name__] = results[t] / total_trial
-    return od
+def histogram(hole_cards: Tuple[TexasCard, TexasCard], pool: Iterable[TexasCard], workers=1, progress=False):
+    """
+    Enumerate every board with eval7, see ``holdem.engines.histogram``
+
+    :return: OrderedDict of showdown name -> probability, in HAND_SEARCH_ORDER
+    """
+    from .engines import histogram
+
+    return histogram(hole_cards, pool, engine='eval7', workers=workers, progress=progress, use_table=False)
+
+
+def count_codes(hole_codes: Sequence[int], pool_codes: Sequence[int], start, stop, callback=None):
+    """
+    The eval7 engine, see ``holdem.engines``
+    """
+    hole = tuple(EVAL7_CARDS[c] for c in hole_codes)
+    combos = boards.iter_boards([EVAL7_CARDS[c] for c in pool_codes], 5, start, stop)
+    stop = min(stop, boards.count_boards(len(pool_codes), 5))
+    # the loop over the boards runs in C: tuple concatenation, eval7.evaluate and counting equal scores
+    scores = Counter()
+    for done in range(start, stop, CHUNK):
+        n = min(CHUNK, stop - done)
+        scores.update(map(eval7.evaluate, map(hole.__add__, itertools.islice(combos, n))))
+        if callback is not None:
+            callback(n)
+    counts = [0] * (len(Power) + 1)
+    for score, n in scores.items():
+        counts[category(score)] += n
+    metrics.count('hands', sum(counts))
+    return counts
@@ -0,0 +1,239 @@
+"""
+Hand ranges and range-vs-range equity
+
+A range is written with the card notation of ``TexasCard.from_str``: comma separated classes like ``AKs``,
+``AKo``, ``AK`` (both), ``TT``, ``TT+`` (tens or better), ``A5s+`` (A5s to AKs), spans like ``A5s-A2s`` or
+``TT-77``, explicit combos like ``AsKd``, and ``random`` for all 1326 combos.
+
+``range_equity`` evaluates board-major: for every board, each distinct hand of either range is evaluated once and
+all matchups read their strengths from that table. Matchups that share a card with each other, the board or the
+dead cards are dropped, and matchups that are equal up to a suit permutation fixing the board and the dead cards
+are merged into one class with a weight.
+"""
+import itertools
+import re
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from . import boards, metrics
+from .card import CARDS, FULL_MASK, RANKS, SUITS, Rank, TexasCard, cards_to_mask, mask_to_codes
+from .equity import check_cards
+from .isomorphism import suit_classes
+
+Combo = Tuple[TexasCard, TexasCard]
+
+# enumerate exactly up to this many boards, sample above it
+EXACT_LIMIT = 50_000
+DEFAULT_BOARDS = 5_000
+
+_RANK = '[2-9TJQKAtjqka]'
+_CARD = _RANK + '[dchsDCHS]'
+_CLASS = f'({_RANK})({_RANK})([soSO]?)'
+
+
+def class_combos(high: Rank, low: Rank, kind: str) -> List[Combo]:
+    """
+    :param kind: 's' suited, 'o' offsuit, '' both; pairs ignore it
+    :return: every combo of a starting hand class
+    """
+    if high == low:
+        return [(TexasCard(a, high), TexasCard(b, high)) for a, b in itertools.combinations(SUITS, 2)]
+    return [(TexasCard(a, high), TexasCard(b, low)) for a, b in itertools.product(SUITS, SUITS)
+            if kind == '' or (a == b) == (kind == 's')]
+
+
+def _parse_class(groups) -> Tuple[Rank, Rank, str]:
+    first, second, kind = Rank.from_str(groups[0]), Rank.from_str(groups[1]), groups[2].lower()
+    high, low = (first, second) if first.value >= second.value else (second, first)
+    if high == low and kind:
+        raise ValueError(f'A pair cannot be suited or offsuit: {"".join(groups)}')
+    return high, low, kind
+
+
+def _parse_token(token: str) -> List[Combo]:
+    if token.lower() in ('random', 'any'):
+        return list(itertools.combinations(CARDS, 2))
+    if re.fullmatch(_CARD * 2, token):
+        first, second = TexasCard.from_str(token[:2]), TexasCard.from_str(token[2:])
+        if first == second:
+            raise ValueError(f'Duplicated card in combo: {token}')
+        return [(first, second)]
+    match = re.fullmatch(_CLASS + r'(\+?)', token)
+    if match:
+        high, low, kind = _parse_class(match.groups()[:3])
+        if not match.group(4):
+            return class_combos(high, low, kind)
+        if high == low:
+            # TT+: every pair from tens up
+            return [c for r in RANKS if r.value >= high.value for c in class_combos(r, r, '')]
+        # A5s+: the kicker goes up to one below the high card
+        return [c for r in RANKS if low.value <= r.value < high.value for c in class_combos(high, r, kind)]
+    match = re.fullmatch(_CLASS + '-' + _CLASS, token)
+    if match:
+        first = _parse_class(match.groups()[:3])
+        last = _parse_class(match.groups()[3:])
+        if first[0] == first[1] and last[0] == last[1]:
+            lo, hi = sorted((first[0].value, last[0].value))
+            return [c for r in RANKS if lo <= r.value <= hi for c in class_combos(r, r, '')]
+        if first[0] != last[0] or first[2] != last[2]:
+            raise ValueError(f'A span keeps the high card and the kind: {token}')
+        lo, hi = sorted((first[1].value, last[1].value))
+        return [c for r in RANKS if lo <= r.value <= hi for c in class_combos(first[0], r, first[2])]
+    raise ValueError(f'Cannot parse range: {token}')
+
+
+def parse_range(text: str) -> List[Combo]:
+    """
+    :param text: comma separated range, see the module doc
+    :return: distinct combos of the range
+    """
+    combos = {}
+    for token in re.split(r'[,\s]+', text.strip()):
+        if token:
+            for combo in _parse_token(token):
+                combos.setdefault(cards_to_mask(combo), combo)
+    return list(combos.values())
+
+
+@dataclass
+class RangeEquity:
+    """
+    Shares of the first range against the second, averaged over all matchups of non-conflicting combos
+    """
+    equity: float = 0.
+    win: float = 0.
+    tie: float = 0.
+    loss: float = 0.
+    # non-conflicting combo pairs, and the classes left after suit isomorphism
+    matchups: int = 0
+    classes: int = 0
+    boards: int = 0
+    exact: bool = True
+
+
+def _suit_permutations(board_mask: int, dead_mask: int) -> np.ndarray:
+    """
+    :return: (G, 52) array, row g maps each card code to its image under a suit permutation that keeps the board
+        and the dead cards in place
+    """
+    classes = suit_classes(board_mask, FULL_MASK & ~dead_mask)
+    images = []
+    for perms in itertools.product(*(itertools.permutations(cls) for cls in classes)):
+        mapping = {}
+        for cls, perm in zip(classes, perms):
+            mapping.update(zip(cls, perm))
+        images.append([mapping[code // 13] * 13 + code % 13 for code in range(52)])
+    return np.array(images, dtype=np.int64)
+
+
+def _pair_keys(codes: np.ndarray) -> np.ndarray:
+    # (P, 4) codes of hero and villain combos -> one int per ordered matchup, each combo's cards sorted
+    h0, h1 = np.minimum(codes[:, 0], codes[:, 1]), np.maximum(codes[:, 0], codes[:, 1])
+    v0, v1 = np.minimum(codes[:, 2], codes[:, 3]), np.maximum(codes[:, 2], codes[:, 3])
+    return ((h0 * 52 + h1) * 52 + v0) * 52 + v1
+
+
+def matchup_classes(hero: Sequence[Combo], villain: Sequence[Combo], board_mask=0, dead_mask=0):
+    """
+    :return: (codes, weights), (R, 4) array of the hero and villain card codes of one matchup per suit-isomorphism
+        class, and the number of non-conflicting matchups in each class
+    """
+    used = board_mask | dead_mask
+    hero = [c for c in hero if not cards_to_mask(c) & used]
+    villain = [c for c in villain if not cards_to_mask(c) & used]
+    if not hero or not villain:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int64)
+    hero_codes = np.array([[a.code, b.code] for a, b in hero], dtype=np.int64)
+    villain_codes = np.array([[a.code, b.code] for a, b in villain], dtype=np.int64)
+    hero_masks = np.bitwise_or.reduce(1 << hero_codes, axis=1)
+    villain_masks = np.bitwise_or.reduce(1 << villain_codes, axis=1)
+    h, v = np.nonzero((hero_masks[:, None] & villain_masks[None, :]) == 0)
+    codes = np.hstack([hero_codes[h], villain_codes[v]])
+
+    canonical = None
+    for image in _suit_permutations(board_mask, dead_mask):
+        keys = _pair_keys(image[codes])
+        canonical = keys if canonical is None else np.minimum(canonical, keys)
+    keys, weights = np.unique(canonical, return_counts=True)
+    classes = np.stack([keys // 52 ** 3, keys // 52 ** 2 % 52, keys // 52 % 52, keys % 52], axis=1)
+    return classes, weights
+
+
+def range_equity(hero: Sequence[Combo], villain: Sequence[Combo], board: Sequence[TexasCard] = (),
+                 dead: Sequence[TexasCard] = (), samples: int = None, exact_limit=EXACT_LIMIT, seed=None,
+                 batch_size=1 << 18) -> RangeEquity:
+    """
+    :param hero: combos of the first range, see ``parse_range``
+    :param villain: combos of the second range
+    :param board: known community cards, 0 to 5
+    :param dead: cards out of play
+    :param samples: number of random boards; by default boards are enumerated when there are at most
+        `exact_limit` of them and DEFAULT_BOARDS boards are sampled otherwise
+    :param seed: seed of the numpy random generator
+    :param batch_size: bound on the elements of the per-batch numpy arrays: hand evaluations and (board, matchup)
+        comparisons
+    """
+    from .batch import evaluate_batch
+    from .sampling import sample_boards
+
+    check_cards(board, dead)
+    board_mask, dead_mask = cards_to_mask(board), cards_to_mask(dead)
+    classes, weights = matchup_classes(hero, villain, board_mask, dead_mask)
+    if not len(classes):
+        raise ValueError('No matchup left after card removal')
+
+    # every distinct hand is evaluated once per board, matchups index into that table
+    hand_keys, inverse = np.unique(np.concatenate([classes[:, 0] * 52 + classes[:, 1],
+                                                   classes[:, 2] * 52 + classes[:, 3]]), return_inverse=True)
+    hero_idx, villain_idx = inverse[:len(classes)], inverse[len(classes):]
+    hands = np.stack([hand_keys // 52, hand_keys % 52], axis=1)
+    hand_masks = np.bitwise_or.reduce(1 << hands, axis=1)
+
+    known = np.array([c.code for c in board], dtype=np.int64)
+    pool = np.array(mask_to_codes(FULL_MASK & ~(board_mask | dead_mask)), dtype=np.int64)
+    missing = 5 - len(board)
+    total = boards.count_boards(len(pool), missing)
+    exact = samples is None and total <= exact_limit
+    budget = total if exact else (samples or DEFAULT_BOARDS)
+    per_batch = max(1, batch_size // len(hands))
+    if exact:
+        combos = itertools.combinations(pool.tolist(), missing)
+    else:
+        rng = np.random.default_rng(seed)
+
+    wins = np.zeros(len(classes), dtype=np.int64)
+    ties = np.zeros(len(classes), dtype=np.int64)
+    valid = np.zeros(len(classes), dtype=np.int64)
+    done = 0
+    while done < budget:
+        n = min(per_batch, budget - done)
+        if exact:
+            completions = np.array(list(itertools.islice(combos, n)), dtype=np.int64).reshape(n, missing)
+        else:
+            completions = sample_boards(pool, n, rng, k=missing)
+        community = np.hstack([np.broadcast_to(known, (n, len(known))), completions])
+        community_masks = np.bitwise_or.reduce(1 << completions, axis=1)
+        playable = (community_masks[:, None] & hand_masks[None, :]) == 0
+        board_idx, hand_idx = np.nonzero(playable)
+        metrics.count('hands', len(board_idx))
+        strengths = np.zeros((n, len(hands)), dtype=np.int64)
+        strengths[board_idx, hand_idx] = evaluate_batch(np.hstack([community[board_idx], hands[hand_idx]]))[1]
+
+        # the matchup columns in slices, so that no (boards, matchups) array exceeds batch_size
+        step = max(1, batch_size // n)
+        for start in range(0, len(classes), step):
+            columns = slice(start, start + step)
+            hero_cols, villain_cols = hero_idx[columns], villain_idx[columns]
+            ok = playable[:, hero_cols] & playable[:, villain_cols]
+            hero_strength, villain_strength = strengths[:, hero_cols], strengths[:, villain_cols]
+            wins[columns] += ((hero_strength > villain_strength) & ok).sum(axis=0)
+            ties[columns] += ((hero_strength == villain_strength) & ok).sum(axis=0)
+            valid[columns] += ok.sum(axis=0)
+        done += n
+
+    total_valid = valid @ weights
+    win, tie = wins @ weights / total_valid, ties @ weights / total_valid
+    return RangeEquity(equity=float(win + tie / 2), win=float(win), tie=float(tie), loss=float(1 - win - tie),
+                       matchups=int(weights.sum()), classes=len(classes), boards=int(done), exact=exact)
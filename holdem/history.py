@@ -0,0 +1,303 @@
+"""
+Showdowns of PokerStars hand histories, ``python -m holdem history``
+
+A hand is a showdown when its summary has a five-card ``Board [...]`` and at least two players ``shows [...]``
+their hole cards; the other hands are only counted. Every showdown is evaluated again and the pot is shared by
+the best hands, so a result does not depend on the text the site printed.
+
+The input is read in chunks of about ``CHUNK_BYTES`` cut at hand boundaries: a file is memory-mapped and only the
+(start, stop) offsets of a chunk go to the worker that reads it, a stream is read block by block. A chunk is parsed
+with a handful of ``re.finditer`` over the whole chunk, the matches are assigned to their hand by position, and the
+card tokens are decoded all at once with numpy byte tables into card codes, the board and the hole cards of every
+showdown into one array each. The hands are then evaluated as one ``holdem.batch.evaluate_keys`` call, the best
+hand of every showdown is a ``maximum.reduceat``.
+
+Chunks run in a process pool with at most `window` of them in flight and are yielded in input order: the input is
+not read further while the window is full, so memory stays flat whatever the input size. Results come per hand,
+or per player aggregated over the whole input.
+"""
+import mmap
+import os
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, Union
+
+import numpy as np
+
+from . import metrics
+from .constant import SHOWDOWN_BY_POWER
+from .showdown import Power
+
+CHUNK_BYTES = 8 << 20
+_SEPARATOR = b'\nPokerStars '
+# patterns starting with a literal, which re searches for much faster than a line start
+_HAND = re.compile(rb'PokerStars (?:Zoom )?(?:Hand|Game) #(\d+)')
+_BOARD = re.compile(rb'\nBoard \[([^\]]*)\]')
+# the player name is the start of the line
+_SHOWS = re.compile(rb': shows \[([^\]]*)\]')
+# byte -> rank index / suit index of a card token, -1 if not a rank / suit
+_RANK_INDEX = np.full(256, -1, dtype=np.int64)
+_SUIT_INDEX = np.full(256, -1, dtype=np.int64)
+for _i, _c in enumerate(b'23456789TJQKA'):
+    _RANK_INDEX[_c] = _RANK_INDEX[ord(chr(_c).lower())] = _i
+for _i, _c in enumerate(b'dchs'):
+    _SUIT_INDEX[_c] = _SUIT_INDEX[ord(chr(_c).upper())] = _i
+
+
+def parse_codes(text: bytes) -> np.ndarray:
+    """
+    :param text: card tokens like ``b'Ah 7c 2d'``, two characters each, separated by single spaces
+    :return: the card code of every token, -1 for the tokens that are not a card
+    """
+    tokens = np.frombuffer(text + b' ' if text else b'', dtype=np.uint8).reshape(-1, 3)
+    ranks, suits = _RANK_INDEX[tokens[:, 0]], _SUIT_INDEX[tokens[:, 1]]
+    return np.where((ranks >= 0) & (suits >= 0) & (tokens[:, 2] == ord(' ')), suits * 13 + ranks, -1)
+
+
+@dataclass
+class Chunk:
+    # hand headers seen
+    hands: int = 0
+    # per hand: a dict per showdown; per player: name -> PlayerStats
+    results: Union[list, dict] = field(default_factory=list)
+
+
+@dataclass
+class PlayerStats:
+    showdowns: int = 0
+    # pots won, a split pot counted as the share won
+    won: float = 0.
+    # showdowns per category, indexed by ``Power`` value
+    categories: List[int] = field(default_factory=lambda: [0] * (len(Power) + 1))
+
+    def add(self, other: 'PlayerStats'):
+        self.showdowns += other.showdowns
+        self.won += other.won
+        self.categories = [a + b for a, b in zip(self.categories, other.categories)]
+
+    def to_dict(self, name: str) -> dict:
+        return {'player': name, 'showdowns': self.showdowns, 'won': round(self.won, 6),
+                'win_rate': round(self.won / self.showdowns, 6) if self.showdowns else 0.,
+                'categories': {SHOWDOWN_BY_POWER[value].__name__: n
+                               for value, n in enumerate(self.categories) if n}}
+
+
+def _matches(pattern: re.Pattern, data: bytes, starts: np.ndarray, width: int):
+    """
+    :param width: length of a valid card list
+    :return: (hand index, match) of the matches with a card list of that length inside a hand
+    """
+    found = [m for m in pattern.finditer(data) if len(m.group(1)) == width]
+    hands = np.searchsorted(starts, np.array([m.start() for m in found], dtype=np.int64), side='right') - 1
+    return hands, found
+
+
+def _groups(hands: np.ndarray) -> np.ndarray:
+    """
+    :param hands: hand index of every row; the shows come in file order, so the rows of a hand are contiguous
+    :return: the first row of every hand
+    """
+    return np.flatnonzero(np.r_[True, hands[1:] != hands[:-1]])
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    """
+    :return: number of cards of every card mask
+    """
+    return np.unpackbits(masks.astype('<i8').view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def evaluate_chunk(data: bytes, per='hand') -> Chunk:
+    """
+    :param data: whole hands of a hand history
+    :param per: 'hand' for a result per showdown, 'player' for the stats of every player
+    """
+    from .batch import evaluate_keys
+    from .lut import FLUSH_BIAS, KEYS
+
+    heads = list(_HAND.finditer(data))
+    chunk = Chunk(hands=len(heads), results=[] if per == 'hand' else {})
+    if not heads:
+        return chunk
+    starts = np.array([m.start() for m in heads], dtype=np.int64)
+
+    board_hands, boards = _matches(_BOARD, data, starts, 14)
+    board_codes = parse_codes(b' '.join(m.group(1) for m in boards)).reshape(-1, 5)
+    # hands with exactly one valid board
+    hand_board = np.full(len(heads), -1, dtype=np.int64)
+    ok = (board_hands >= 0) & (board_codes >= 0).all(axis=1)
+    unique, counts = np.unique(board_hands[ok], return_counts=True)
+    single = np.isin(board_hands, unique[counts == 1]) & ok
+    hand_board[board_hands[single]] = np.flatnonzero(single)
+
+    show_hands, shows = _matches(_SHOWS, data, starts, 5)
+    hole_codes = parse_codes(b' '.join(m.group(1) for m in shows)).reshape(-1, 2)
+    keep = (show_hands >= 0) & (hole_codes >= 0).all(axis=1)
+    keep[keep] = hand_board[show_hands[keep]] >= 0
+    # showdowns: two players or more
+    shown = np.bincount(show_hands[keep], minlength=len(heads))
+    keep[keep] = shown[show_hands[keep]] >= 2
+    rows = np.flatnonzero(keep)
+    if not len(rows):
+        return chunk
+    bits = np.left_shift(1, np.arange(52), dtype=np.int64)
+    # a card dealt twice, the hand history is corrupt: the union of the cards of the board, of a hole or of the
+    # whole hand holds fewer cards than were shown
+    board_masks = np.bitwise_or.reduce(bits[board_codes[hand_board[show_hands[rows]]]], axis=1)
+    hole_masks = np.bitwise_or.reduce(bits[hole_codes[rows]], axis=1)
+    offsets = _groups(show_hands[rows])
+    sizes = np.diff(np.r_[offsets, len(rows)])
+    dealt = np.bitwise_or.reduceat(board_masks | hole_masks, offsets)
+    whole = np.logical_and.reduceat((_popcount(board_masks) == 5) & (_popcount(hole_masks) == 2), offsets)
+    clean = whole & (_popcount(dealt) == 5 + 2 * sizes)
+    rows = rows[np.repeat(clean, sizes)]
+    if not len(rows):
+        return chunk
+
+    hands = show_hands[rows]
+    holes = hole_codes[rows]
+    board = board_codes[hand_board[hands]]
+    table = np.array(KEYS, dtype=np.int64)
+    keys = FLUSH_BIAS + table[board].sum(axis=1) + table[holes].sum(axis=1)
+    masks = np.bitwise_or.reduce(bits[board], axis=1) | np.bitwise_or.reduce(bits[holes], axis=1)
+    categories, strengths = evaluate_keys(keys, masks)
+    offsets = _groups(hands)
+    group = np.repeat(np.arange(len(offsets)), np.diff(np.r_[offsets, len(rows)]))
+    winners = strengths == np.maximum.reduceat(strengths, offsets)[group]
+    shares = winners / np.add.reduceat(winners, offsets)[group]
+    metrics.count('hands', len(rows))
+    metrics.count('showdowns', len(offsets))
+    names = [_player(data, shows[row]) for row in rows]
+
+    if per == 'hand':
+        for g, start in enumerate(offsets):
+            stop = offsets[g + 1] if g + 1 < len(offsets) else len(rows)
+            hand = hands[start]
+            chunk.results.append({
+                'hand': heads[hand].group(1).decode(),
+                'board': boards[hand_board[hand]].group(1).decode().replace(' ', ''),
+                'players': [{'player': names[i], 'cards': shows[rows[i]].group(1).decode().replace(' ', ''),
+                             'category': SHOWDOWN_BY_POWER[int(categories[i])].__name__,
+                             'share': round(float(shares[i]), 6)} for i in range(start, stop)]})
+        return chunk
+    index = {}
+    players = np.array([index.setdefault(name, len(index)) for name in names], dtype=np.int64)
+    showdowns = np.bincount(players, minlength=len(index))
+    won = np.bincount(players, weights=shares, minlength=len(index))
+    width = len(Power) + 1
+    per_category = np.bincount(players * width + categories, minlength=len(index) * width).reshape(-1, width)
+    for name, i in index.items():
+        chunk.results[name] = PlayerStats(int(showdowns[i]), float(won[i]), per_category[i].tolist())
+    return chunk
+
+
+def _player(data: bytes, match: re.Match) -> str:
+    """
+    :return: name of the player of a ``shows`` line
+    """
+    return data[data.rfind(b'\n', 0, match.start()) + 1:match.start()].decode(errors='replace')
+
+
+def file_chunks(path: str, size=CHUNK_BYTES) -> Iterator[tuple]:
+    """
+    :return: (start, stop) offsets of chunks of about `size` bytes, cut before a hand header
+    """
+    with open(path, 'rb') as f:
+        length = os.fstat(f.fileno()).st_size
+        if not length:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < length:
+                stop = mm.find(_SEPARATOR, min(start + size, length))
+                stop = length if stop < 0 else stop + 1
+                yield start, stop
+                start = stop
+
+
+def stream_chunks(stream: BinaryIO, size=CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    :return: chunks of whole hands of about `size` bytes, read block by block
+    """
+    rest = b''
+    while True:
+        block = stream.read(size)
+        if not block:
+            if rest:
+                yield rest
+            return
+        data = rest + block
+        cut = data.rfind(_SEPARATOR)
+        if cut < 0:
+            # a single hand longer than a block
+            rest = data
+            continue
+        yield data[:cut + 1]
+        rest = data[cut + 1:]
+
+
+def _read(path: str, start: int, stop: int) -> bytes:
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[start:stop]
+
+
+def _evaluate_job(job, per: str) -> Chunk:
+    # a (path, start, stop) range of a file or the bytes of a chunk
+    data = _read(*job) if isinstance(job, tuple) else job
+    return evaluate_chunk(data, per)
+
+
+def _warm_up():
+    from . import batch  # noqa: F401, builds the lookup tables once per process
+
+
+def evaluate_chunks(source: Union[str, BinaryIO], per='hand', workers=1, chunk_bytes=CHUNK_BYTES,
+                    window: int = None) -> Iterator[Chunk]:
+    """
+    :param source: path of a hand history file, or a binary stream
+    :param per: 'hand' or 'player', see ``evaluate_chunk``
+    :param workers: worker processes, 1 evaluates in this process
+    :param window: chunks in flight, 2 per worker by default
+    :return: the result of every chunk, in input order
+    """
+    if isinstance(source, str):
+        jobs = ((source, start, stop) for start, stop in file_chunks(source, chunk_bytes))
+    else:
+        jobs = stream_chunks(source, chunk_bytes)
+    if workers <= 1:
+        for job in jobs:
+            yield _evaluate_job(job, per)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = window or 2 * workers
+    pending = deque()
+    with ProcessPoolExecutor(workers, initializer=_warm_up) as executor:
+        for job in jobs:
+            pending.append(executor.submit(_evaluate_job, job, per))
+            # backpressure: read no further until the oldest chunk is done
+            while len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def run_history(source: Union[str, BinaryIO], per='hand', workers=1, chunk_bytes=CHUNK_BYTES,
+                window: int = None) -> Iterator[dict]:
+    """
+    :return: per hand, a dict per showdown as its chunk completes; per player, a dict per player once the input is
+        read, most showdowns first
+    """
+    if per not in ('hand', 'player'):
+        raise ValueError(f'Unknown aggregation {per!r}, choose from hand, player')
+    players: Dict[str, PlayerStats] = {}
+    for chunk in evaluate_chunks(source, per, workers, chunk_bytes, window):
+        metrics.count('history_hands', chunk.hands)
+        if per == 'hand':
+            yield from chunk.results
+            continue
+        for name, stats in chunk.results.items():
+            players.setdefault(name, PlayerStats()).add(stats)
+    for name, stats in sorted(players.items(), key=lambda item: (-item[1].showdowns, item[0])):
+        yield stats.to_dict(name)
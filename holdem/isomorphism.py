@@ -0,0 +1,97 @@
+"""
+Suit isomorphism for exact board enumeration
+
+Relabelling suits does not change a hand's category. A suit permutation that maps the hole cards onto themselves
+and the pool onto itself (i.e. leaves the ``-x`` exclusions in place) therefore maps every board to a board with
+the same outcome. Two suits can be swapped when they hold the same hole ranks and the same pool ranks, so the
+symmetry group is a product of symmetric groups over such suit classes.
+
+``canonical_boards`` yields one representative per orbit of boards together with the orbit size: inside each suit
+class the per-suit parts of the board must be non-increasing by (number of cards, rank mask), and the orbit size
+is the number of distinct ways to reorder them, m! / prod(c!) for a class of m suits with groups of c equal parts.
+"""
+import itertools
+from math import factorial
+from typing import Iterable, Iterator, List, Tuple
+
+from .card import SUIT_MASK, TexasCard, cards_to_mask
+
+
+def suit_classes(hole_mask: int, pool_mask: int) -> List[List[int]]:
+    """
+    :return: lists of interchangeable suit indexes, suits with the same hole ranks and pool ranks share a list
+    """
+    classes = {}
+    for suit in range(4):
+        signature = hole_mask >> 13 * suit & SUIT_MASK, pool_mask >> 13 * suit & SUIT_MASK
+        classes.setdefault(signature, []).append(suit)
+    return list(classes.values())
+
+
+def _subsets(ranks: int, size: int) -> List[int]:
+    # every `size`-subset of a 13-bit rank mask, as rank masks in descending order
+    bits = [1 << r for r in range(13) if ranks >> r & 1]
+    return sorted((sum(c) for c in itertools.combinations(bits, size)), reverse=True)
+
+
+def canonical_boards(hole_cards: Iterable[TexasCard], pool: Iterable[TexasCard], k=5) -> Iterator[Tuple[int, int]]:
+    """
+    :param hole_cards: the hole cards
+    :param pool: cards the board is drawn from
+    :param k: board size
+    :return: (board mask, orbit size) for one board per orbit, orbit sizes sum to C(len(pool), k)
+    """
+    hole_mask = cards_to_mask(hole_cards)
+    pool_mask = cards_to_mask(pool)
+    classes = suit_classes(hole_mask, pool_mask)
+    order = [suit for cls in classes for suit in cls]
+    # whether the suit at position i shares its class with the suit before it
+    linked = [False] + [any(order[i - 1] in cls and order[i] in cls for cls in classes) for i in range(1, 4)]
+    available = [pool_mask >> 13 * suit & SUIT_MASK for suit in order]
+    shifts = [13 * suit for suit in order]
+
+    for sizes in _split(k, [a.bit_count() for a in available], linked):
+        lists = [_subsets(available[i], sizes[i]) for i in range(4)]
+        # a suit linked to the previous one with the same size takes masks no greater than the previous mask, which
+        # is a suffix of the same descending list
+        tie = [linked[i] and sizes[i] == sizes[i - 1] for i in range(4)]
+        weights = [_orbit_size(classes, [tie[i] and bool(equal >> i & 1) for i in range(4)]) for equal in range(16)]
+        l0, l1, l2, l3 = lists
+        s0, s1, s2, s3 = shifts
+        for i0, m0 in enumerate(l0):
+            b0 = m0 << s0
+            for i1 in range(i0 if tie[1] else 0, len(l1)):
+                m1 = l1[i1]
+                b1 = b0 | m1 << s1
+                e1 = 2 if tie[1] and m1 == m0 else 0
+                for i2 in range(i1 if tie[2] else 0, len(l2)):
+                    m2 = l2[i2]
+                    b2 = b1 | m2 << s2
+                    e2 = e1 | (4 if tie[2] and m2 == m1 else 0)
+                    for i3 in range(i2 if tie[3] else 0, len(l3)):
+                        m3 = l3[i3]
+                        yield b2 | m3 << s3, weights[e2 | (8 if tie[3] and m3 == m2 else 0)]
+
+
+def _split(k: int, capacity: List[int], linked: List[bool]) -> Iterator[Tuple[int, ...]]:
+    # number of board cards per suit position, non-increasing inside a suit class
+    for sizes in itertools.product(*(range(min(k, c) + 1) for c in capacity)):
+        if sum(sizes) == k and not any(linked[i] and sizes[i] > sizes[i - 1] for i in range(1, 4)):
+            yield sizes
+
+
+def _orbit_size(classes: List[List[int]], equal: List[bool]) -> int:
+    """
+    :param equal: per suit position, whether its board mask equals the one at the previous position
+    :return: number of distinct boards reached by permuting suits inside each class
+    """
+    size = 1
+    i = 0
+    for cls in classes:
+        size *= factorial(len(cls))
+        run = 1
+        for j in range(i + 1, i + len(cls)):
+            run = run + 1 if equal[j] else 1
+            size //= run
+        i += len(cls)
+    return size
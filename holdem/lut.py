@@ -0,0 +1,338 @@
+"""
+Lookup-table evaluator, maps any 5 to 7 cards to a single strength integer
+
+Every card code has a packed key: the low 39 bits hold one 3-bit counter per rank, the bits from ``SUIT_SHIFT`` on
+hold one 4-bit counter per suit. Adding up the keys of a hand gives its rank-count and suit-count histograms in
+one int. The rank part is looked up in a table built over every rank multiset; when a suit reaches five cards the
+13-bit rank mask of that suit is looked up in the flush table instead.
+
+A strength is ``category << 20`` followed by up to five 4-bit rank values (the ``Showdown.values()`` of the hand),
+so strengths order exactly like ``Showdown.__gt__`` and equal strengths are ties. The category is the ``Power``
+value of the hand, RoyalFlush included.
+"""
+import itertools
+import operator
+from typing import Iterable, Sequence, Tuple
+
+from . import boards, metrics
+from .card import TexasCard
+from .constant import SHOWDOWN_BY_POWER
+from .showdown import Power
+from .util import Timeit
+
+RANK_BITS = (1 << 39) - 1
+SUIT_SHIFT = 40
+# every suit counter starts at 3, so a suit holding five cards or more sets bit 3 of its counter (up to 7 cards)
+FLUSH_BIAS = 0x3333 << SUIT_SHIFT
+FLUSH_BITS = 0x8888 << SUIT_SHIFT
+CATEGORY_SHIFT = 20
+# boards counted per call of the progress callback
+CHUNK = 1 << 16
+
+KEYS = [(1 << 3 * (code % 13)) | (1 << SUIT_SHIFT + 4 * (code // 13)) for code in range(52)]
+RANK_BIT = [1 << code % 13 for code in range(52)]
+SUIT_OF = [code // 13 for code in range(52)]
+
+# rank values are 2..14, rank index 0..12
+_ACE = 12
+_WHEEL = (1 << _ACE) | 0b1111
+
+
+def _pack(category: Power, values) -> int:
+    strength = category.value
+    for i, value in enumerate(values):
+        strength = strength << 4 | value
+    return strength << 4 * (5 - len(values))
+
+
+def _straight_high(ranks: int) -> int:
+    """
+    :param ranks: 13-bit rank mask
+    :return: rank value of the highest straight's top card, 0 if there is no straight
+    """
+    for top in range(_ACE, 3, -1):
+        window = 0b11111 << top - 4
+        if ranks & window == window:
+            return top + 2
+    if ranks & _WHEEL == _WHEEL:
+        return 5
+    return 0
+
+
+def _top_values(ranks: int, n: int):
+    # rank values of the n highest bits in a rank mask
+    return [r + 2 for r in range(_ACE, -1, -1) if ranks >> r & 1][:n]
+
+
+def _five_card_strength(counts) -> int:
+    """
+    :param counts: card count per rank index, five cards in total, no flush
+    """
+    groups = sorted(((c, r) for r, c in enumerate(counts) if c), reverse=True)
+    pattern = tuple(c for c, _ in groups)
+    values = [r + 2 for _, r in groups]
+    if pattern == (4, 1):
+        return _pack(Power.FOUR_OF_A_KIND, values)
+    if pattern == (3, 2):
+        return _pack(Power.FULL_HOUSE, values)
+    if pattern == (3, 1, 1):
+        return _pack(Power.THREE_OF_A_KIND, values)
+    if pattern == (2, 2, 1):
+        return _pack(Power.TWO_PAIR, values)
+    if pattern == (2, 1, 1, 1):
+        return _pack(Power.PAIR, values)
+    high = _straight_high(sum(1 << r for _, r in groups))
+    if high:
+        return _pack(Power.STRAIGHT, [high])
+    return _pack(Power.HIGH_CARD, values)
+
+
+def _build_rank_table():
+    """
+    Strength of the best five cards for every rank multiset of 5, 6 and 7 cards, keyed by the rank part of the
+    packed key. Larger multisets take the best of their multisets with one card less.
+    """
+    table = {}
+    previous = {}
+    unit = [1 << 3 * r for r in range(13)]
+    for n in (5, 6, 7):
+        current = {}
+        for combo in itertools.combinations_with_replacement(range(13), n):
+            # sorted combo, a rank repeated five times is not a valid multiset
+            if any(map(operator.eq, combo, combo[4:])):
+                continue
+            key = sum(map(unit.__getitem__, combo))
+            if n == 5:
+                current[key] = _five_card_strength([key >> 3 * r & 7 for r in range(13)])
+            else:
+                current[key] = max([previous[key - unit[r]] for r in set(combo)])
+        table.update(current)
+        previous = current
+    return table
+
+
+def _build_flush_table():
+    """
+    Strength for every 13-bit rank mask of a flush suit, 0 for masks with less than five ranks
+    """
+    table = [0] * (1 << 13)
+    for ranks in range(1 << 13):
+        if ranks.bit_count() < 5:
+            continue
+        high = _straight_high(ranks)
+        if high == _ACE + 2:
+            table[ranks] = _pack(Power.ROYAL_FLUSH, [high])
+        elif high:
+            table[ranks] = _pack(Power.STRAIGHT_FLUSH, [high])
+        else:
+            table[ranks] = _pack(Power.FLUSH, _top_values(ranks, 5))
+    return table
+
+
+RANK_STRENGTH = _build_rank_table()
+FLUSH_STRENGTH = _build_flush_table()
+RANK_CATEGORY = {key: strength >> CATEGORY_SHIFT for key, strength in RANK_STRENGTH.items()}
+FLUSH_CATEGORY = [strength >> CATEGORY_SHIFT for strength in FLUSH_STRENGTH]
+# rank part of the packed key for a 13-bit rank mask of a single suit
+_RANK_MASK_KEY = [sum(1 << 3 * r for r in range(13) if ranks >> r & 1) for ranks in range(1 << 13)]
+
+
+def hand_key(codes: Iterable[int]) -> int:
+    """
+    :param codes: card codes
+    :return: packed rank/suit counters of the cards, flush bias included
+    """
+    key = FLUSH_BIAS
+    for code in codes:
+        key += KEYS[code]
+    return key
+
+
+def flush_ranks(key: int, codes: Iterable[int]) -> int:
+    """
+    :param key: packed key of the cards, must have a flush
+    :param codes: the same cards
+    :return: 13-bit rank mask of the flush suit
+    """
+    suit = ((key & FLUSH_BITS).bit_length() - SUIT_SHIFT - 4) >> 2
+    ranks = 0
+    for code in codes:
+        if SUIT_OF[code] == suit:
+            ranks |= RANK_BIT[code]
+    return ranks
+
+
+def evaluate_codes(codes) -> int:
+    """
+    :param codes: five to seven card codes
+    :return: hand strength
+    """
+    key = hand_key(codes)
+    if key & FLUSH_BITS:
+        return FLUSH_STRENGTH[flush_ranks(key, codes)]
+    return RANK_STRENGTH[key & RANK_BITS]
+
+
+def evaluate(cards: Iterable[TexasCard]) -> int:
+    return evaluate_codes([c.code for c in cards])
+
+
+def evaluate_mask(mask: int) -> int:
+    """
+    :param mask: card set bitmask holding five to seven cards
+    :return: hand strength
+    """
+    key = 0
+    for suit in range(4):
+        ranks = mask >> 13 * suit & 0x1FFF
+        if ranks.bit_count() >= 5:
+            return FLUSH_STRENGTH[ranks]
+        key += _RANK_MASK_KEY[ranks]
+    return RANK_STRENGTH[key]
+
+
+def category(strength: int) -> int:
+    """
+    :return: ``Power`` value of a hand strength
+    """
+    return strength >> CATEGORY_SHIFT
+
+
+def showdown_class(strength: int):
+    return SHOWDOWN_BY_POWER[strength >> CATEGORY_SHIFT]
+
+
+def decide_showdown(table_cards: Iterable[TexasCard]):
+    """
+    @param table_cards: five to seven cards
+    @return: the showdown class of the best hand
+    """
+    return showdown_class(evaluate(table_cards))
+
+
+def count_categories(hole_codes, boards) -> list:
+    """
+    :param hole_codes: codes of the hole cards
+    :param boards: iterable of community card code tuples
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    counts = [0] * (len(Power) + 1)
+    base = hand_key(hole_codes)
+    keys = KEYS
+    rank_category = RANK_CATEGORY
+    for board in boards:
+        key = base + keys[board[0]] + keys[board[1]] + keys[board[2]] + keys[board[3]] + keys[board[4]]
+        if key & FLUSH_BITS:
+            counts[FLUSH_CATEGORY[flush_ranks(key, itertools.chain(hole_codes, board))]] += 1
+        else:
+            counts[rank_category[key & RANK_BITS]] += 1
+    return counts
+
+
+def _flush_suit(key: int) -> int:
+    return ((key & FLUSH_BITS).bit_length() - SUIT_SHIFT - 4) >> 2
+
+
+class HandState:
+    """
+    Evaluator state of a partial hand, e.g. the hole cards and a known flop
+
+    The packed key holds the rank and suit counters, the card mask the rank mask of every suit for flushes and
+    straight flushes. ``add`` extends both by one card in O(1), so the state of hole + flop is built once and each
+    turn / river completion costs two additions and one table read.
+    """
+    __slots__ = ('key', 'mask')
+
+    def __init__(self, codes: Iterable[int] = (), key=FLUSH_BIAS, mask=0):
+        for code in codes:
+            key += KEYS[code]
+            mask |= 1 << code
+        self.key = key
+        self.mask = mask
+
+    @classmethod
+    def from_cards(cls, cards: Iterable[TexasCard]):
+        return cls(c.code for c in cards)
+
+    def add(self, code: int) -> 'HandState':
+        """
+        :return: a new state with one more card, the card must not be in the hand already
+        """
+        return HandState(key=self.key + KEYS[code], mask=self.mask | 1 << code)
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def strength(self) -> int:
+        """
+        :return: hand strength, the state must hold five to seven cards
+        """
+        key = self.key
+        if key & FLUSH_BITS:
+            return FLUSH_STRENGTH[self.mask >> 13 * _flush_suit(key) & 0x1FFF]
+        return RANK_STRENGTH[key & RANK_BITS]
+
+    def category(self) -> int:
+        return self.strength() >> CATEGORY_SHIFT
+
+
+def count_completions(state: HandState, codes, k: int) -> list:
+    """
+    :param state: the known cards, hole cards and board
+    :param codes: card codes the missing cards are drawn from
+    :param k: number of missing cards, the state plus k cards makes five to seven cards
+    :return: number of completions per category, indexed by ``Power`` value
+    """
+    counts = [0] * (len(Power) + 1)
+    _walk(state.key, state.mask, list(codes), 0, k, counts)
+    return counts
+
+
+def _walk(key, mask, codes, start, k, counts):
+    if k == 0:
+        if key & FLUSH_BITS:
+            counts[FLUSH_CATEGORY[mask >> 13 * _flush_suit(key) & 0x1FFF]] += 1
+        else:
+            counts[RANK_CATEGORY[key & RANK_BITS]] += 1
+        return
+    if k > 1:
+        for i in range(start, len(codes) - k + 1):
+            code = codes[i]
+            _walk(key + KEYS[code], mask | 1 << code, codes, i + 1, k - 1, counts)
+        return
+    # the last card, inlined
+    keys, rank_category = KEYS, RANK_CATEGORY
+    for code in codes[start:]:
+        last = key + keys[code]
+        if last & FLUSH_BITS:
+            counts[FLUSH_CATEGORY[(mask | 1 << code) >> 13 * _flush_suit(last) & 0x1FFF]] += 1
+        else:
+            counts[rank_category[last & RANK_BITS]] += 1
+
+
+def count_codes(hole_codes: Sequence[int], pool_codes: Sequence[int], start, stop, callback=None) -> list:
+    """
+    The lut engine, see ``holdem.engines``
+    """
+    combos = boards.iter_boards(pool_codes, 5, start, stop)
+    stop = min(stop, boards.count_boards(len(pool_codes), 5))
+    counts = [0] * (len(Power) + 1)
+    for done in range(start, stop, CHUNK):
+        n = min(CHUNK, stop - done)
+        counts = [a + b for a, b in zip(counts, count_categories(hole_codes, itertools.islice(combos, n)))]
+        if callback is not None:
+            callback(n)
+    metrics.count('hands', sum(counts))
+    return counts
+
+
+@Timeit(message='Time elapsed')
+def histogram(hole_cards: Tuple[TexasCard, TexasCard], pool: Iterable[TexasCard], progress=False, workers=1):
+    """
+    Enumerate every board with the lookup tables, see ``holdem.engines.histogram``
+
+    :return: OrderedDict of showdown name -> probability, in HAND_SEARCH_ORDER
+    """
+    from .engines import histogram
+
+    return histogram(hole_cards, pool, engine='lut', workers=workers, progress=progress, use_table=False)
@@ -0,0 +1,133 @@
+"""
+Opt-in instrumentation of the evaluation hot paths
+
+Nothing is recorded unless a run is wrapped in ``collect()``, which installs a ``Metrics`` object as ``active``.
+Instrumented code reads ``active`` once per call and skips all bookkeeping when it is None, so the cost of the
+disabled layer is one attribute read and one comparison per call, never per board in the batch paths.
+
+Phases nest: the time of a phase excludes the phases opened inside it, e.g. ``enumerate`` inside ``evaluate``.
+Counters and phases of worker processes are not collected, only those of the calling process.
+"""
+import contextlib
+import json
+import time
+from collections import Counter, defaultdict
+from typing import Iterable, Iterator, Optional
+
+active: Optional['Metrics'] = None
+
+_NULL = contextlib.nullcontext()
+
+
+def peak_memory() -> Optional[int]:
+    """
+    :return: peak resident set size in bytes of this process plus its finished children, None where the resource
+        module is missing
+    """
+    try:
+        import resource
+        import sys
+    except ImportError:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            + resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * scale
+
+
+class Metrics:
+    """
+    Counters, per-phase exclusive time and throughput of one run
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.phases = defaultdict(float)
+        self.started = time.perf_counter()
+        self.wall = None
+        self.peak_memory = None
+        # [name, start, time of nested phases]
+        self._stack = []
+
+    def count(self, name: str, n=1):
+        self.counters[name] += n
+
+    def start(self, name: str):
+        self._stack.append([name, time.perf_counter(), 0.])
+
+    def stop(self):
+        name, start, nested = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        self.phases[name] += elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def timed(self, name: str, iterable: Iterable) -> Iterator:
+        """
+        :return: the items of `iterable`, the time spent producing them is added to phase `name`
+        """
+        iterator = iter(iterable)
+        while True:
+            self.start(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.stop()
+            yield item
+
+    def finish(self):
+        self.wall = time.perf_counter() - self.started
+        self.peak_memory = peak_memory()
+
+    @property
+    def hands_per_sec(self) -> float:
+        wall = self.wall if self.wall is not None else time.perf_counter() - self.started
+        return self.counters['hands'] / wall if wall else 0.
+
+    def to_dict(self) -> dict:
+        return {'wall_seconds': self.wall, 'hands': self.counters['hands'], 'hands_per_sec': self.hands_per_sec,
+                'phases': dict(self.phases), 'counters': dict(self.counters), 'peak_memory_bytes': self.peak_memory}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[Metrics]:
+    """
+    Record the metrics of the code run in the block
+    """
+    global active
+    previous, active = active, Metrics()
+    metrics = active
+    try:
+        yield metrics
+    finally:
+        active = previous
+        metrics.finish()
+
+
+def count(name: str, n=1):
+    if active is not None:
+        active.counters[name] += n
+
+
+def phase(name: str):
+    """
+    :return: a context manager timing the block as phase `name`, a no-op when disabled
+    """
+    return active.phase(name) if active is not None else _NULL
+
+
+def timed(name: str, iterable: Iterable) -> Iterable:
+    return active.timed(name, iterable) if active is not None else iterable
@@ -0,0 +1,37 @@
+"""
+Run a board-counting function over index ranges of the board enumeration in a process pool
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Tuple
+
+from tqdm import tqdm
+
+
+def split_ranges(total: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    :return: up to `parts` contiguous [start, stop) ranges covering range(total), sizes differ by at most one
+    """
+    bounds = [total * i // parts for i in range(parts + 1)]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if start < stop]
+
+
+def run_sharded(count_range: Callable[[int, int], list], total: int, workers: int, progress=False,
+                shards_per_worker=4) -> list:
+    """
+    :param count_range: picklable callable, count_range(start, stop) -> list of counts for the boards with index
+        in [start, stop)
+    :param total: number of boards
+    :param workers: number of worker processes
+    :param progress: show a tqdm progress bar, advanced as shards complete
+    :param shards_per_worker: split the boards in this many ranges per worker, smaller shards balance better
+    :return: element-wise sum of the counts of all shards
+    """
+    counts = None
+    ranges = split_ranges(total, workers * shards_per_worker)
+    with ProcessPoolExecutor(max_workers=workers) as executor, tqdm(total=total, disable=not progress) as bar:
+        futures = {executor.submit(count_range, start, stop): stop - start for start, stop in ranges}
+        for future in as_completed(futures):
+            shard = future.result()
+            counts = shard if counts is None else [a + b for a, b in zip(counts, shard)]
+            bar.update(futures[future])
+    return counts
@@ -0,0 +1,142 @@
+"""
+Precomputed preflop histograms for the 169 canonical starting hands
+
+Without excluded cards the histogram of a hole pair only depends on its class: the two ranks and whether the cards
+are suited. ``build_table`` counts the categories of every class once and saves them as a (169, 11) int64 ``.npy``
+array, indexed by class and ``Power`` value. ``lookup`` maps concrete hole cards onto their class, so a preflop
+query is a single row read.
+
+``lookup`` reads the table with ``struct`` (it is 169 * 11 int64, about 15 KB) instead of numpy, so answering a
+preflop query from the command line does not pay for importing numpy.
+"""
+import ast
+import functools
+import os
+import struct
+from typing import Optional, Sequence, Tuple
+
+from .card import FULL_MASK, RANKS, SUITS, TexasCard, cards_to_mask
+from .deck import Deck
+from .showdown import Power
+
+N_CLASSES = 169
+DEFAULT_TABLE = os.path.join(os.path.expanduser('~'), '.cache', 'holdem', 'preflop.npy')
+
+
+def table_path() -> str:
+    """
+    :return: the table location, ``$HOLDEM_PREFLOP_TABLE`` or ~/.cache/holdem/preflop.npy
+    """
+    return os.environ.get('HOLDEM_PREFLOP_TABLE', DEFAULT_TABLE)
+
+
+def hand_class(hole_cards: Sequence[TexasCard]) -> int:
+    """
+    :return: class index 13 * a + b of two hole cards; pairs have a == b, suited hands a > b (a the higher rank
+        index), offsuit hands a < b
+    """
+    first, second = hole_cards
+    high, low = sorted((first.code % 13, second.code % 13), reverse=True)
+    if first.suit == second.suit:
+        return 13 * high + low
+    return 13 * low + high
+
+
+def class_name(index: int) -> str:
+    a, b = divmod(index, 13)
+    high, low = repr(RANKS[max(a, b)]), repr(RANKS[min(a, b)])
+    if a == b:
+        return high + low
+    return high + low + ('s' if a > b else 'o')
+
+
+def representative(index: int) -> Tuple[TexasCard, TexasCard]:
+    """
+    :return: concrete hole cards of a class
+    """
+    a, b = divmod(index, 13)
+    spade, heart = SUITS[3], SUITS[2]
+    if a > b:
+        return TexasCard(spade, RANKS[a]), TexasCard(spade, RANKS[b])
+    return TexasCard(spade, RANKS[max(a, b)]), TexasCard(heart, RANKS[min(a, b)])
+
+
+def compute_counts(index: int) -> list:
+    """
+    :return: number of boards per category, indexed by ``Power`` value, for the class without exclusions
+    """
+    from . import analytic
+
+    hole_cards = representative(index)
+    pool = Deck().pop(*hole_cards).pool
+    return analytic.count_all([c.code for c in hole_cards], [c.code for c in pool])
+
+
+def build_table(path: str = None, workers=1, progress=False) -> str:
+    """
+    Compute the counts of all 169 classes and save them to `path`
+
+    :return: the path written
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    import numpy as np
+    from tqdm import tqdm
+
+    path = path or table_path()
+    table = np.zeros((N_CLASSES, len(Power) + 1), dtype=np.int64)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = executor.map(compute_counts, range(N_CLASSES))
+        for index, counts in enumerate(tqdm(rows, total=N_CLASSES, disable=not progress)):
+            table[index] = counts
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # write then rename, readers never see a partial table
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, table)
+    os.replace(tmp, path)
+    return path
+
+
+@functools.lru_cache(maxsize=None)
+def _load_rows(path: str, mtime: float) -> Tuple[Tuple[int, ...], ...]:
+    with open(path, 'rb') as f:
+        if f.read(6) != b'\x93NUMPY':
+            raise ValueError(f'Not a .npy file: {path}')
+        major = f.read(2)[0]
+        (length,) = struct.unpack('<H', f.read(2)) if major == 1 else struct.unpack('<I', f.read(4))
+        header = ast.literal_eval(f.read(length).decode('latin1'))
+        width = len(Power) + 1
+        if header != {'descr': '<i8', 'fortran_order': False, 'shape': (N_CLASSES, width)}:
+            raise ValueError(f'Unexpected preflop table layout: {header}')
+        values = struct.unpack(f'<{N_CLASSES * width}q', f.read(N_CLASSES * width * 8))
+    return tuple(values[i:i + width] for i in range(0, len(values), width))
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def load_rows(path: str = None) -> Optional[Tuple[Tuple[int, ...], ...]]:
+    """
+    :return: the rows of the table as tuples, read without numpy, None if it has not been built
+    """
+    path = path or table_path()
+    mtime = _mtime(path)
+    return None if mtime is None else _load_rows(path, mtime)
+
+
+def lookup(hole_cards: Sequence[TexasCard], pool: Sequence[TexasCard], path: str = None) -> Optional[list]:
+    """
+    :return: number of boards per category, indexed by ``Power`` value, if the query is a preflop query without
+        exclusions (the pool is every other card) and the table exists, else None
+    """
+    if len(hole_cards) != 2 or cards_to_mask(hole_cards) | cards_to_mask(pool) != FULL_MASK or len(pool) != 50:
+        return None
+    rows = load_rows(path)
+    if rows is None:
+        return None
+    return list(rows[hand_class(hole_cards)])
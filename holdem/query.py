@@ -0,0 +1,189 @@
+"""
+JSON queries, shared by ``python -m holdem serve`` and ``python -m holdem batch``
+
+A query is a JSON object with a "type", cards are written like on the command line ("AsKs" or "As,Ks")::
+
+    {"type": "histogram", "hole": "AsKs", "board": "QsJs2d", "exclude": "2c"}
+    {"type": "histogram", "hole": "AsKs", "mode": "sample", "samples": 100000, "seed": 1}
+    {"type": "equity", "hands": ["AsAh", "KsKh"], "board": "2s3s9c", "dead": "", "samples": null, "seed": null}
+    {"type": "range", "hero": "AKs, TT+", "villain": "random", "board": "", "dead": ""}
+
+``normalize`` validates a query and puts it in a canonical form: card lists become sorted card codes and defaults
+are filled in. Equal normalized queries have the same ``query_key`` and the same result, which is what the server
+coalesces and caches on. ``run_query`` computes the JSON-ready result of a normalized query; it only needs plain
+data, so it runs in worker processes as well.
+"""
+import json
+import re
+from dataclasses import asdict
+from typing import List
+
+from .card import TexasCard, card_from_code
+
+MODES = ('exact', 'sample')
+
+
+class QueryError(ValueError):
+    pass
+
+
+def parse_cards(value) -> List[TexasCard]:
+    """
+    :param value: None, a string of cards ('AsKd' or 'As,Kd') or a list of card strings
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        tokens = value.split(',') if ',' in value else [value[i:i + 2] for i in range(0, len(value), 2)]
+    else:
+        tokens = value
+    tokens = [token.strip() for token in tokens if token.strip()]
+    if any(len(token) != 2 for token in tokens):
+        raise QueryError(f'Cannot parse cards: {value}')
+    return [TexasCard.from_str(token) for token in tokens]
+
+
+def _codes(value) -> List[int]:
+    return sorted(c.code for c in parse_cards(value))
+
+
+def _cards(codes) -> List[TexasCard]:
+    return [card_from_code(code) for code in codes]
+
+
+def _range_text(text: str) -> str:
+    return ','.join(token for token in re.split(r'[,\s]+', text) if token)
+
+
+def _check_disjoint(*groups):
+    seen = set()
+    for group in groups:
+        if seen.intersection(group) or len(set(group)) != len(group):
+            raise QueryError('Duplicated card')
+        seen.update(group)
+
+
+def _optional_int(query: dict, name: str):
+    value = query.get(name)
+    if value is not None and (not isinstance(value, int) or value < 0):
+        raise QueryError(f'{name} must be a non-negative integer')
+    return value
+
+
+def normalize(query: dict) -> dict:
+    """
+    :return: the canonical form of a query, raise QueryError if it is invalid
+    """
+    if not isinstance(query, dict):
+        raise QueryError('A query is a JSON object')
+    kind = query.get('type', 'histogram')
+    try:
+        board, dead_name = _codes(query.get('board')), 'exclude' if kind == 'histogram' else 'dead'
+        dead = _codes(query.get(dead_name))
+        if len(board) > 5:
+            raise QueryError('The board holds at most five cards')
+        if kind == 'histogram':
+            hole = _codes(query.get('hole'))
+            if len(hole) != 2:
+                raise QueryError('A histogram needs two hole cards')
+            _check_disjoint(hole, board, dead)
+            left = 52 - len(hole) - len(board) - len(dead)
+            if left < 5 - len(board):
+                raise QueryError(f'{left} cards left, {5 - len(board)} needed to complete the board')
+            mode = query.get('mode', 'exact')
+            if mode not in MODES:
+                raise QueryError(f'mode is one of {", ".join(MODES)}')
+            if board:
+                # at most C(47, 2) completions, always enumerated
+                mode = 'exact'
+            normalized = {'type': kind, 'hole': hole, 'board': board, 'exclude': dead, 'mode': mode}
+            if mode == 'sample':
+                tolerance = query.get('tolerance')
+                if tolerance is not None and not isinstance(tolerance, (int, float)):
+                    raise QueryError('tolerance must be a number')
+                samples = _optional_int(query, 'samples')
+                if samples is None and tolerance is None:
+                    raise QueryError('A sample query needs samples, tolerance or both')
+                normalized.update(samples=samples, tolerance=tolerance, seed=_optional_int(query, 'seed'))
+            return normalized
+        if kind == 'equity':
+            hands = query.get('hands')
+            if not isinstance(hands, list):
+                raise QueryError('hands is a list of hands')
+            # the order of the hands is the order of the results
+            hands = [_codes(hand) for hand in hands]
+            _check_disjoint(*hands, board, dead)
+            return {'type': kind, 'hands': hands, 'board': board, 'dead': dead,
+                    'samples': _optional_int(query, 'samples'), 'seed': _optional_int(query, 'seed')}
+        if kind == 'range':
+            from .hand_range import parse_range
+
+            hero, villain = query.get('hero'), query.get('villain')
+            if not isinstance(hero, str) or not isinstance(villain, str):
+                raise QueryError('hero and villain are range strings')
+            parse_range(hero), parse_range(villain)
+            _check_disjoint(board, dead)
+            return {'type': kind, 'hero': _range_text(hero), 'villain': _range_text(villain),
+                    'board': board, 'dead': dead, 'samples': _optional_int(query, 'samples'),
+                    'seed': _optional_int(query, 'seed')}
+    except QueryError:
+        raise
+    except ValueError as err:
+        raise QueryError(str(err))
+    raise QueryError(f'Unknown query type: {kind}')
+
+
+def query_key(normalized: dict) -> str:
+    return json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+
+
+def deterministic(normalized: dict) -> bool:
+    """
+    :return: whether the result only depends on the query, so it may be cached; sampling without a seed is random
+        and equity or range queries sample when there are too many boards
+    """
+    if normalized['type'] == 'histogram' and normalized['mode'] == 'exact':
+        return True
+    return normalized.get('seed') is not None
+
+
+def run_query(normalized: dict) -> dict:
+    """
+    :param normalized: a query from ``normalize``
+    :return: JSON-ready result
+    """
+    from .deck import Deck
+
+    kind = normalized['type']
+    board, dead = _cards(normalized['board']), _cards(normalized.get('exclude', normalized.get('dead')))
+    if kind == 'histogram':
+        from .detect import histogram
+
+        hole = _cards(normalized['hole'])
+        pool = Deck().pop(*hole, *board, *dead).pool
+        if normalized['mode'] == 'sample':
+            result = histogram(hole, pool, samples=normalized['samples'], tolerance=normalized['tolerance'],
+                               seed=normalized['seed'])
+            return {'histogram': dict(result), 'errors': dict(result.errors), 'samples': result.samples}
+        result = histogram(hole, pool, board=board, engine='analytic')
+        return {'histogram': dict(result)}
+    if kind == 'equity':
+        from .equity import equity
+
+        result = equity([_cards(hand) for hand in normalized['hands']], board=board, dead=dead,
+                        samples=normalized['samples'], seed=normalized['seed'])
+        return asdict(result)
+    from .hand_range import parse_range, range_equity
+
+    result = range_equity(parse_range(normalized['hero']), parse_range(normalized['villain']), board=board,
+                          dead=dead, samples=normalized['samples'], seed=normalized['seed'])
+    return asdict(result)
+
+
+def warm_up():
+    """
+    Import the evaluators and load their tables, so the first query of a process does not pay for it
+    """
+    from . import analytic, batch, detect, preflop  # noqa: F401
+
+    preflop.load_rows()
@@ -0,0 +1,102 @@
+"""
+Monte Carlo estimation of the category histogram
+
+Boards are drawn without replacement from the pool in numpy batches and evaluated with ``holdem.batch``. After
+every batch the Wilson score interval of each category is computed; sampling stops when every interval half-width
+is below the requested tolerance, or when the sample budget is spent.
+"""
+from collections import OrderedDict
+from statistics import NormalDist
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from . import metrics
+from .card import TexasCard
+from .constant import HAND_SEARCH_ORDER
+from .showdown import Power
+
+# sample budget when only a tolerance is given
+MAX_SAMPLES = 10_000_000
+
+
+class SampledHistogram(OrderedDict):
+    """
+    Estimated probabilities, showdown name -> probability in HAND_SEARCH_ORDER like an exact histogram, with the
+    confidence interval half-width of every category in `errors`
+    """
+
+    def __init__(self, estimates, errors, samples: int, confidence: float):
+        super().__init__(estimates)
+        self.errors = OrderedDict(errors)
+        self.samples = samples
+        self.confidence = confidence
+
+
+def sample_boards(pool_codes: np.ndarray, n: int, rng: np.random.Generator, k=5) -> np.ndarray:
+    """
+    :return: (n, k) array of boards, every row is k distinct cards of the pool
+    """
+    if len(pool_codes) < k:
+        # no row would ever be accepted
+        raise ValueError(f'Cannot draw {k} distinct cards from a pool of {len(pool_codes)}')
+    # draw k positions with replacement and reject the rows holding a duplicate, the accepted rows are uniform
+    # k-subsets; about 80% of the rows survive for five cards out of ~50
+    accepted = []
+    missing = n
+    while missing > 0:
+        picks = rng.integers(0, len(pool_codes), size=(missing + missing // 4 + 16, k))
+        ordered = np.sort(picks, axis=1)
+        picks = picks[(ordered[:, 1:] != ordered[:, :-1]).all(axis=1)][:missing]
+        accepted.append(picks)
+        missing -= len(picks)
+    return pool_codes[np.concatenate(accepted)]
+
+
+def wilson_half_width(counts: np.ndarray, n: int, z: float) -> np.ndarray:
+    p = counts / n
+    return z / (1 + z * z / n) * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+
+
+def sample_histogram(hole_cards: Sequence[TexasCard], pool: Sequence[TexasCard], samples: int = None,
+                     tolerance: float = None, confidence=0.95, batch_size=1 << 15, seed=None,
+                     callback: Optional[Callable[[int], None]] = None) -> SampledHistogram:
+    """
+    :param hole_cards: the hole cards
+    :param pool: cards the five community cards are drawn from
+    :param samples: maximum number of boards to draw
+    :param tolerance: stop once every category's confidence interval half-width is below this (absolute
+        probability)
+    :param confidence: confidence level of the intervals
+    :param batch_size: boards evaluated per batch, the stopping rule is checked after each batch
+    :param seed: seed of the numpy random generator
+    :param callback: called with the number of boards of every batch
+    """
+    from .batch import evaluate_batch
+
+    if samples is None and tolerance is None:
+        raise ValueError('Give a number of samples, a tolerance or both')
+    budget = samples if samples is not None else MAX_SAMPLES
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    rng = np.random.default_rng(seed)
+    hole = np.array([c.code for c in hole_cards], dtype=np.int64)
+    pool_codes = np.array([c.code for c in pool], dtype=np.int64)
+    counts = np.zeros(len(Power) + 1, dtype=np.int64)
+    drawn = 0
+    while drawn < budget:
+        n = min(batch_size, budget - drawn)
+        with metrics.phase('sample'):
+            boards = sample_boards(pool_codes, n, rng)
+        with metrics.phase('evaluate'):
+            categories, _ = evaluate_batch(np.hstack([np.broadcast_to(hole, (n, len(hole))), boards]))
+        counts += np.bincount(categories, minlength=len(counts))
+        metrics.count('hands', n)
+        drawn += n
+        if callback is not None:
+            callback(n)
+        if tolerance is not None and wilson_half_width(counts[1:], drawn, z).max() < tolerance:
+            break
+    errors = wilson_half_width(counts, drawn, z)
+    return SampledHistogram(((t.__name__, int(counts[t.__power__.value]) / drawn) for t in HAND_SEARCH_ORDER),
+                            ((t.__name__, float(errors[t.__power__.value])) for t in HAND_SEARCH_ORDER),
+                            samples=drawn, confidence=confidence)
@@ -0,0 +1,132 @@
+"""
+Query server, ``python -m holdem serve``
+
+Clients send one JSON query per line (see ``holdem.query``), with an optional "id", over TCP or a Unix socket, and
+get one JSON line back per query: ``{"id": ..., "ok": true, "result": {...}}`` or ``{"id": ..., "ok": false,
+"error": "..."}``. A connection may send many queries without waiting; answers come back as they finish, matched by
+id. ``{"type": "stats"}`` returns the server counters.
+
+Queries run in a process pool whose workers load the evaluator tables once when they start. Identical queries in
+flight share one computation, and the results of deterministic queries are kept in an LRU cache.
+"""
+import asyncio
+import functools
+import json
+import os
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from . import query
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# results kept for repeated queries
+RESULT_CACHE = 4096
+
+
+class QueryServer:
+    def __init__(self, workers: int = None, cache_size=RESULT_CACHE):
+        self.workers = workers or os.cpu_count()
+        self.cache_size = cache_size
+        self.stats = Counter()
+        self._executor = None
+        self._inflight = {}
+        self._results = OrderedDict()
+
+    def start(self):
+        self._executor = ProcessPoolExecutor(self.workers, initializer=query.warm_up)
+        # the pool spawns a worker per pending task, start them all now instead of on the first queries
+        for _ in range(self.workers):
+            self._executor.submit(int)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def snapshot(self) -> dict:
+        return {**self.stats, 'inflight': len(self._inflight), 'cached': len(self._results),
+                'workers': self.workers}
+
+    async def answer(self, request) -> dict:
+        """
+        :param request: a decoded query
+        :return: the response object
+        """
+        rid = request.get('id') if isinstance(request, dict) else None
+        try:
+            if isinstance(request, dict) and request.get('type') == 'stats':
+                return {'id': rid, 'ok': True, 'result': self.snapshot()}
+            result = await self.compute(query.normalize(request))
+        except ValueError as err:
+            self.stats['errors'] += 1
+            return {'id': rid, 'ok': False, 'error': str(err)}
+        except Exception as err:
+            self.stats['errors'] += 1
+            return {'id': rid, 'ok': False, 'error': f'{type(err).__name__}: {err}'}
+        return {'id': rid, 'ok': True, 'result': result}
+
+    async def compute(self, normalized: dict) -> dict:
+        key = query.query_key(normalized)
+        self.stats['queries'] += 1
+        if key in self._results:
+            self.stats['cache_hits'] += 1
+            self._results.move_to_end(key)
+            return self._results[key]
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats['computed'] += 1
+            future = asyncio.get_running_loop().run_in_executor(self._executor, query.run_query, normalized)
+            self._inflight[key] = future
+            future.add_done_callback(functools.partial(self._done, key, query.deterministic(normalized)))
+        else:
+            self.stats['coalesced'] += 1
+        # a caller going away does not cancel the computation the others wait for
+        return await asyncio.shield(future)
+
+    def _done(self, key: str, cacheable: bool, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if cacheable and not future.cancelled() and future.exception() is None:
+            self._results[key] = future.result()
+            if len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        pending = set()
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(self._reply(line, writer))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+        finally:
+            writer.close()
+
+    async def _reply(self, line: bytes, writer: asyncio.StreamWriter):
+        try:
+            request = json.loads(line)
+        except ValueError as err:
+            self.stats['errors'] += 1
+            response = {'id': None, 'ok': False, 'error': f'Invalid JSON: {err}'}
+        else:
+            response = await self.answer(request)
+        if not writer.is_closing():
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path: str = None, workers: int = None,
+                cache_size=RESULT_CACHE):
+    server = QueryServer(workers, cache_size)
+    server.start()
+    try:
+        if unix_path:
+            listener = await asyncio.start_unix_server(server.handle, path=unix_path)
+            print(f'Serving on {unix_path} with {server.workers} workers', flush=True)
+        else:
+            listener = await asyncio.start_server(server.handle, host, port)
+            print(f'Serving on {host}:{port} with {server.workers} workers', flush=True)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.shutdown()
@@ -0,0 +1,149 @@
+"""
+Random full tables: every player's hole cards and a board, showdown to the end, ``python -m holdem simulate``
+
+A batch of tables is dealt at once from the cards of a ``Deck``: the cards of a table are the first 2 * players + 5
+of a random permutation of the deck (``argpartition`` of one random key per card), so every table is dealt without
+replacement and every deal is equally likely. Each player's seven cards are evaluated with
+``holdem.batch.evaluate_keys`` as one array, the board key and mask shared by the players of a table. The pot goes
+to the highest integer strength, a tie splits it evenly.
+
+The statistics are per starting hand class (see ``holdem.preflop.hand_class``): how often it is dealt and the share
+of pots it wins, and the showdown categories of every player's final hand. Batches are independent, so a run is
+split in shards over worker processes, each with its own ``numpy.random.SeedSequence`` child: a seeded run gives
+the same result for the same number of workers.
+"""
+from dataclasses import dataclass, field
+from typing import Dict
+
+import numpy as np
+
+from . import metrics
+from .constant import category_histogram
+from .deck import Deck
+from .showdown import Power
+
+N_CLASSES = 169
+BATCH_SIZE = 1 << 15
+
+
+@dataclass
+class SimulationResult:
+    players: int
+    hands: int = 0
+    # per hand class: times dealt, pots won (a split pot counted as the share won)
+    dealt: np.ndarray = field(default_factory=lambda: np.zeros(N_CLASSES, dtype=np.int64))
+    won: np.ndarray = field(default_factory=lambda: np.zeros(N_CLASSES))
+    # final hands of all players per category, indexed by ``Power`` value
+    categories: np.ndarray = field(default_factory=lambda: np.zeros(len(Power) + 1, dtype=np.int64))
+    # tables whose pot was split
+    split_pots: int = 0
+
+    def add(self, other: 'SimulationResult'):
+        self.hands += other.hands
+        self.dealt += other.dealt
+        self.won += other.won
+        self.categories += other.categories
+        self.split_pots += other.split_pots
+
+    def win_rates(self) -> Dict[str, float]:
+        """
+        :return: class name -> share of the pots won when dealt, strongest first
+        """
+        from .preflop import class_name
+
+        rates = {class_name(index): float(self.won[index] / self.dealt[index])
+                 for index in range(N_CLASSES) if self.dealt[index]}
+        return dict(sorted(rates.items(), key=lambda item: -item[1]))
+
+    def category_frequencies(self):
+        """
+        :return: OrderedDict of showdown name -> frequency of the players' final hands
+        """
+        return category_histogram(self.categories.tolist(), self.hands * self.players)
+
+    def to_dict(self) -> dict:
+        return {'players': self.players, 'hands': self.hands, 'split_pots': self.split_pots,
+                'categories': self.category_frequencies(), 'win_rates': self.win_rates()}
+
+
+def hand_classes(holes: np.ndarray) -> np.ndarray:
+    """
+    :param holes: (..., 2) hole card codes
+    :return: ``holdem.preflop.hand_class`` of every pair of hole cards
+    """
+    ranks, suits = holes % 13, holes // 13
+    high, low = ranks.max(axis=-1), ranks.min(axis=-1)
+    return np.where(suits[..., 0] == suits[..., 1], 13 * high + low, 13 * low + high)
+
+
+def deal(rng: np.random.Generator, pool: np.ndarray, n: int, k: int) -> np.ndarray:
+    """
+    :return: (n, k) card codes, every row k distinct cards of the pool
+    """
+    order = np.argpartition(rng.random((n, len(pool))), k - 1, axis=1)[:, :k]
+    return pool[order]
+
+
+def simulate_batch(rng: np.random.Generator, players: int, n: int) -> SimulationResult:
+    """
+    :return: the statistics of n tables of `players` players
+    """
+    from .batch import evaluate_keys
+    from .lut import FLUSH_BIAS, KEYS
+
+    pool = np.array(Deck().codes, dtype=np.int64)
+    cards = deal(rng, pool, n, 2 * players + 5)
+    holes = cards[:, :2 * players].reshape(n, players, 2)
+    board = cards[:, 2 * players:]
+    table = np.array(KEYS, dtype=np.int64)
+    bits = np.left_shift(1, pool, dtype=np.int64)
+    keys = (FLUSH_BIAS + table[board].sum(axis=1))[:, None] + table[holes].sum(axis=2)
+    masks = bits[board].sum(axis=1)[:, None] | bits[holes].sum(axis=2)
+    categories, strengths = evaluate_keys(keys.ravel(), masks.ravel())
+    strengths = strengths.reshape(n, players)
+    metrics.count('hands', n * players)
+
+    winners = strengths == strengths.max(axis=1, keepdims=True)
+    n_winners = winners.sum(axis=1)
+    classes = hand_classes(holes).ravel()
+    return SimulationResult(
+        players=players, hands=n,
+        dealt=np.bincount(classes, minlength=N_CLASSES),
+        won=np.bincount(classes, weights=(winners / n_winners[:, None]).ravel(), minlength=N_CLASSES),
+        categories=np.bincount(categories, minlength=len(Power) + 1),
+        split_pots=int((n_winners > 1).sum()))
+
+
+def _simulate_shard(players: int, hands: int, seed: np.random.SeedSequence, batch_size: int) -> SimulationResult:
+    rng = np.random.default_rng(seed)
+    result = SimulationResult(players)
+    for start in range(0, hands, batch_size):
+        result.add(simulate_batch(rng, players, min(batch_size, hands - start)))
+    return result
+
+
+def simulate(players: int, hands: int, seed=None, workers=1, batch_size=BATCH_SIZE) -> SimulationResult:
+    """
+    :param players: 2 to 9 players at the table
+    :param hands: number of tables dealt
+    :param seed: seed of the numpy random generators
+    :param workers: split the tables in this many shards, each evaluated by a worker process
+    :param batch_size: tables dealt and evaluated at once
+    """
+    if not 2 <= players <= 9:
+        raise ValueError('A table has 2 to 9 players')
+    if hands < 1:
+        raise ValueError('Deal at least one hand')
+    seeds = np.random.SeedSequence(seed).spawn(max(workers, 1))
+    if workers <= 1:
+        return _simulate_shard(players, hands, seeds[0], batch_size)
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = [hands // workers + (i < hands % workers) for i in range(workers)]
+    result = SimulationResult(players)
+    with ProcessPoolExecutor(workers) as executor:
+        for shard in executor.map(_simulate_shard, [players] * workers, shards, seeds, [batch_size] * workers):
+            result.add(shard)
+    # the workers' own counters are not collected
+    metrics.count('hands', hands * players)
+    return result
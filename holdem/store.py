@@ -0,0 +1,178 @@
+"""
+Persistent store of exact histogram counts, shared by processes and runs
+
+A query is keyed by the card masks of its hole cards, known board and pool, put in a canonical suit order: a
+histogram does not change when suits are permuted, so the four suits are sorted by their (hole, board, pool) rank
+masks and e.g. AsKs and AhKh with the same exclusions share one entry. Modes, engines, workers and the other
+options of ``histogram`` only change how the exact counts are computed, not the counts, so they are not part of
+the key. Sampled histograms are not stored.
+
+The store is a single SQLite file in WAL mode: any number of processes read and write it concurrently, writers
+wait on each other for at most ``TIMEOUT`` seconds. Every entry records ``ENGINE_VERSION``; entries of another
+version never match and are dropped when the store is opened, so bump it whenever the evaluators change their
+results. When the database outgrows its size budget the least recently used entries are evicted. The store is a
+cache: a database error turns into a miss and a warning, never into a failed query.
+
+It is used when ``$HOLDEM_STORE`` names the file, or given explicitly to ``histogram``.
+"""
+import functools
+import json
+import logging
+import os
+import time
+from typing import Callable, List, Optional, Sequence
+
+from .card import SUIT_MASK, TexasCard, cards_to_mask
+
+ENGINE_VERSION = 1
+DEFAULT_MAX_BYTES = 256 << 20
+# seconds a writer waits for the lock
+TIMEOUT = 30
+# check the database size every this many writes
+CHECK_EVERY = 64
+# evict down to this share of the budget
+EVICT_TO = 0.9
+
+logger = logging.getLogger(__name__)
+
+
+def store_path() -> Optional[str]:
+    """
+    :return: ``$HOLDEM_STORE``, None when the store is disabled
+    """
+    return os.environ.get('HOLDEM_STORE') or None
+
+
+def query_key(hole_cards: Sequence[TexasCard], board: Sequence[TexasCard], pool: Sequence[TexasCard]) -> str:
+    """
+    :return: the key of a histogram query, equal for all suit permutations of the query
+    """
+    board_mask = cards_to_mask(board)
+    masks = (cards_to_mask(hole_cards), board_mask, cards_to_mask(pool) & ~board_mask)
+    suits = sorted((tuple(mask >> 13 * suit & SUIT_MASK for mask in masks) for suit in range(4)), reverse=True)
+    return '.'.join(f'{sum(suit[i] << 13 * s for s, suit in enumerate(suits)):x}' for i in range(len(masks)))
+
+
+class ResultStore:
+    """
+    :param path: the SQLite database file, created if missing
+    :param max_bytes: size budget of the database
+    """
+
+    def __init__(self, path: str, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._db = None
+        self._pid = None
+        self._writes = 0
+
+    @property
+    def db(self):
+        # connections do not survive a fork, every process opens its own
+        if self._db is None or self._pid != os.getpid():
+            import sqlite3
+
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=TIMEOUT, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('CREATE TABLE IF NOT EXISTS results '
+                       '(key TEXT PRIMARY KEY, version INTEGER, counts TEXT, used REAL)')
+            db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+            db.execute('DELETE FROM results WHERE version != ?', (ENGINE_VERSION,))
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    def get(self, key: str) -> Optional[List[int]]:
+        """
+        :return: the stored counts of a query, None if missing
+        """
+        import sqlite3
+
+        try:
+            row = self.db.execute('SELECT counts FROM results WHERE key = ? AND version = ?',
+                                  (key, ENGINE_VERSION)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.Error as err:
+            logger.warning(f'result store {self.path}: {err}')
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, counts: Sequence[int]):
+        import sqlite3
+
+        try:
+            self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                            (key, ENGINE_VERSION, json.dumps([int(n) for n in counts]), time.time()))
+            self._writes += 1
+            if self._writes % CHECK_EVERY == 0:
+                self.evict()
+        except sqlite3.Error as err:
+            logger.warning(f'result store {self.path}: {err}')
+
+    def size(self) -> int:
+        """
+        :return: bytes used by the database, the pages of deleted entries excluded
+        """
+        page_size, = self.db.execute('PRAGMA page_size').fetchone()
+        pages, = self.db.execute('PRAGMA page_count').fetchone()
+        free, = self.db.execute('PRAGMA freelist_count').fetchone()
+        return (pages - free) * page_size
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the database fits in EVICT_TO of its budget
+        """
+        size = self.size()
+        if size <= self.max_bytes:
+            return
+        count = len(self)
+        excess = count - int(count * EVICT_TO * self.max_bytes / size)
+        self.db.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY used LIMIT ?)',
+                        (max(excess, 1),))
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _open(path: str) -> ResultStore:
+    return ResultStore(path)
+
+
+def resolve(store=None) -> Optional[ResultStore]:
+    """
+    :param store: a ResultStore, None for the one named by ``$HOLDEM_STORE`` if any, False for none
+    """
+    if store is None:
+        path = store_path()
+        return _open(path) if path else None
+    # not `store or None`, an empty store has no length
+    return None if store is False else store
+
+
+def stored_counts(store: Optional[ResultStore], hole_cards: Sequence[TexasCard], board: Sequence[TexasCard],
+                  pool: Sequence[TexasCard], compute: Callable[[], list]) -> list:
+    """
+    :param store: from ``resolve``
+    :param compute: computes the counts of the query when they are not stored
+    :return: number of boards per category, indexed by ``Power`` value
+    """
+    from . import metrics
+
+    if store is None:
+        return compute()
+    key = query_key(hole_cards, board, pool)
+    counts = store.get(key)
+    if counts is not None:
+        metrics.count('store_hits')
+        return counts
+    metrics.count('store_misses')
+    counts = compute()
+    store.put(key, counts)
+    return counts
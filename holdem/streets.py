@@ -0,0 +1,209 @@
+"""
+Category histograms and showdown equity at the flop, turn and river in one pass
+
+Every flop is equally likely, and so is every four-card (flop and turn) and five-card board, so the aggregates of a
+street are averages over the card sets of its size. The card sets are walked as one tree: the sets of k + 1 cards
+extend the sets of k cards by a card of higher code, every set is reached once, and its packed ``holdem.lut`` key
+and card mask are its parent's plus one card. The board part is shared by every player, a hand's key is its hole
+key plus the board key. A level is evaluated for all players with ``holdem.batch.evaluate_keys`` and tallied for
+its street, the next level is expanded from it, the river level in chunks.
+
+The equity of a street is the showdown of the cards dealt so far: the pot share each hand would win if the hands
+were shown down at that street, the river one being the usual showdown equity. A single hand is shown down against
+a random holding of two pool cards: every holding is evaluated on every board of the level while there are at most
+``RANDOM_EXACT_LIMIT`` (board, holding) pairs, beyond that ``RANDOM_SAMPLES`` random pairs are drawn.
+"""
+import itertools
+from dataclasses import dataclass, field
+from typing import List, Sequence
+
+import numpy as np
+
+from . import metrics
+from .card import FULL_MASK, TexasCard, mask_to_codes
+from .constant import category_histogram
+from .equity import EquityResult, ShowdownTally, check_cards
+from .showdown import Power
+
+STREETS = {3: 'flop', 4: 'turn', 5: 'river'}
+# river boards evaluated per chunk
+CHUNK = 1 << 17
+# a single hand against a random holding: (board, holding) pairs enumerated up to this many, sampled above it
+RANDOM_EXACT_LIMIT = 2_000_000
+RANDOM_SAMPLES = 1_000_000
+
+
+@dataclass
+class StreetResult:
+    street: str
+    boards: int
+    # showdown name -> probability, for the first hand
+    histogram: dict = field(default_factory=dict)
+    # every hand, without opponents the hand and the random holding it is shown down against, whose `boards`
+    # are (board, holding) pairs
+    equity: EquityResult = None
+
+
+class _Level:
+    """
+    The card sets of one size: board key, board mask and the pool index of the highest card of every set
+    """
+
+    def __init__(self, keys: np.ndarray, masks: np.ndarray, last: np.ndarray):
+        self.keys, self.masks, self.last = keys, masks, last
+
+    def __len__(self):
+        return len(self.last)
+
+    def children(self, pool_keys: np.ndarray, pool_masks: np.ndarray, start=0, stop=None) -> '_Level':
+        """
+        :param pool_keys: packed key of every pool card
+        :param pool_masks: card mask of every pool card
+        :return: the sets of one card more extending the sets [start, stop) with a later pool card
+        """
+        last = self.last[start:stop]
+        sizes = len(pool_keys) - 1 - last
+        parents = np.repeat(np.arange(len(last)), sizes)
+        # position of every child among the children of its parent
+        offsets = np.arange(len(parents)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        index = last[parents] + 1 + offsets
+        return _Level(self.keys[start:stop][parents] + pool_keys[index],
+                      self.masks[start:stop][parents] | pool_masks[index], index)
+
+    def chunks(self, pool_keys: np.ndarray, pool_masks: np.ndarray, size: int):
+        """
+        :return: the children as levels of about `size` sets, not all held at once
+        """
+        ends = np.cumsum(len(pool_keys) - 1 - self.last)
+        start = 0
+        while start < len(self):
+            done = int(ends[start - 1]) if start else 0
+            stop = max(start + 1, int(np.searchsorted(ends, done + size, side='right')))
+            yield self.children(pool_keys, pool_masks, start, stop)
+            start = stop
+
+
+def street_histograms(hole_cards: Sequence[TexasCard], opponents: Sequence[Sequence[TexasCard]] = (),
+                      board: Sequence[TexasCard] = (), dead: Sequence[TexasCard] = (), chunk=CHUNK,
+                      seed=None) -> List[StreetResult]:
+    """
+    :param hole_cards: the two hole cards of the hand the histograms are for
+    :param opponents: known hands of the other players, 0 to 8, for the equity; none for a random holding
+    :param board: known community cards, 0 to 4; only the streets after them are computed
+    :param dead: cards known to be out of play
+    :param chunk: river boards evaluated at once
+    :param seed: seed of the numpy random generator sampling the pairs of the random holding
+    :return: a StreetResult per street still to come, flop first
+    """
+    from .batch import evaluate_keys
+    from .lut import FLUSH_BIAS, KEYS
+
+    hands = [tuple(hole_cards), *map(tuple, opponents)]
+    if any(len(hand) != 2 for hand in hands) or len(hands) > 9 or len(board) > 4:
+        raise ValueError('Every hand needs two hole cards, 1 to 9 hands and the board at most four cards')
+    used = check_cards(*hands, board, dead)
+    pool = mask_to_codes(FULL_MASK & ~used)
+    if len(pool) < 5 - len(board) + 2 * (len(hands) == 1):
+        raise ValueError(f'{len(pool)} cards left, not enough to deal the board')
+    pool_keys = np.array([KEYS[code] for code in pool], dtype=np.int64)
+    pool_masks = np.array([1 << code for code in pool], dtype=np.int64)
+    # (players, 1), broadcast against the boards of a level
+    hole_keys = np.array([[sum(KEYS[c.code] for c in hand)] for hand in hands], dtype=np.int64)
+    hole_masks = np.array([[sum(c.mask for c in hand)] for hand in hands], dtype=np.int64)
+    random = _RandomHolding(pool_keys, pool_masks, chunk, seed) if len(hands) == 1 else None
+
+    board_key, board_mask = FLUSH_BIAS + sum(KEYS[c.code] for c in board), sum(c.mask for c in board)
+    level = _Level(np.array([board_key], dtype=np.int64), np.array([board_mask], dtype=np.int64),
+                   np.array([-1], dtype=np.int64))
+    # the sets too small to be a street are only expanded
+    for _ in range(len(board), 2):
+        level = level.children(pool_keys, pool_masks)
+    results = []
+    for size in range(max(len(board) + 1, 3), 6):
+        if size < 5:
+            level = level.children(pool_keys, pool_masks)
+            parts = [level]
+        else:
+            parts = level.chunks(pool_keys, pool_masks, chunk)
+        counts = np.zeros(len(Power) + 1, dtype=np.int64)
+        tally = ShowdownTally(2 if random is not None else len(hands))
+        exact = random is None or random.exact(len(board), size)
+        boards = 0
+        for part in parts:
+            categories, strengths = evaluate_keys((part.keys + hole_keys).ravel(), (part.masks | hole_masks).ravel())
+            counts += np.bincount(categories[:len(part)], minlength=len(counts))
+            if random is None:
+                tally.add(strengths.reshape(len(hands), -1))
+            elif exact:
+                random.add_boards(tally, part, strengths)
+            boards += len(part)
+            metrics.count('hands', len(part) * len(hands))
+        if not exact:
+            random.add_samples(tally, board_key, board_mask, int(hole_keys[0, 0]), int(hole_masks[0, 0]),
+                               size - len(board))
+        results.append(StreetResult(street=STREETS[size], boards=boards,
+                                    histogram=category_histogram(counts.tolist(), boards),
+                                    equity=tally.result(exact=exact)))
+    return results
+
+
+class _RandomHolding:
+    """
+    The showdown of a single hand against every holding of two pool cards
+    """
+
+    def __init__(self, pool_keys: np.ndarray, pool_masks: np.ndarray, chunk: int, seed=None):
+        first, second = np.array(list(itertools.combinations(range(len(pool_keys)), 2)), dtype=np.int64).T
+        self.keys, self.masks = pool_keys[first] + pool_keys[second], pool_masks[first] | pool_masks[second]
+        self.pool_keys, self.pool_masks = pool_keys, pool_masks
+        self.chunk = chunk
+        self.rng = np.random.default_rng(seed)
+
+    def exact(self, known: int, size: int) -> bool:
+        """
+        :return: whether the (board, holding) pairs of a street are few enough to be enumerated
+        """
+        from .boards import count_boards
+
+        drawn = size - known
+        pairs = count_boards(len(self.pool_keys), drawn) * count_boards(len(self.pool_keys) - drawn, 2)
+        return pairs <= RANDOM_EXACT_LIMIT
+
+    def add_boards(self, tally: ShowdownTally, level: _Level, strengths: np.ndarray):
+        """
+        :param strengths: the strength of the hand on every board of the level
+        """
+        from .batch import evaluate_keys
+
+        # the boards in slices, so that no (boards, holdings) array exceeds chunk
+        step = max(1, self.chunk // len(self.keys))
+        for start in range(0, len(level), step):
+            keys, masks = level.keys[start:start + step, None], level.masks[start:start + step, None]
+            playable = (masks & self.masks) == 0
+            rows = np.nonzero(playable)[0]
+            villain = evaluate_keys((keys + self.keys)[playable], (masks | self.masks)[playable])[1]
+            tally.add(np.stack([strengths[start + rows], villain]))
+            metrics.count('hands', len(rows))
+
+    def add_samples(self, tally: ShowdownTally, board_key: int, board_mask: int, hole_key: int, hole_mask: int,
+                    drawn: int):
+        """
+        Show down RANDOM_SAMPLES random boards of the street, `drawn` cards past the known board, each against a
+        random holding
+        """
+        from .batch import evaluate_keys
+        from .sampling import sample_boards
+
+        done = 0
+        while done < RANDOM_SAMPLES:
+            n = min(max(1, self.chunk // 2), RANDOM_SAMPLES - done)
+            cards = sample_boards(np.arange(len(self.pool_keys)), n, self.rng, k=drawn + 2)
+            keys = board_key + self.pool_keys[cards[:, :drawn]].sum(axis=1)
+            masks = board_mask | self.pool_masks[cards[:, :drawn]].sum(axis=1)
+            holding = cards[:, drawn:]
+            hero = evaluate_keys(keys + hole_key, masks | hole_mask)[1]
+            villain = evaluate_keys(keys + self.pool_keys[holding].sum(axis=1),
+                                    masks | self.pool_masks[holding].sum(axis=1))[1]
+            tally.add(np.stack([hero, villain]))
+            metrics.count('hands', 2 * n)
+            done += n
@@ -0,0 +1,121 @@
+"""
+Hand strength against every opponent holding: HS, EHS and hand potential
+
+``hand_strength`` rates a hand on a flop, turn or river against all two-card holdings an opponent may hold:
+
+- HS, the share of holdings the hand beats now, ties counted half;
+- PPot and NPot, the chances of ending up ahead when behind now and behind when ahead now, over every completion
+  of the board (Billings et al., "Opponent Modeling in Poker");
+- EHS = HS^n (1 - NPot) + (1 - HS^n) PPot against n opponents, and EHS2 the mean of the squared river HS.
+
+It is board-major: the holdings are evaluated once on the current board and once per completed board, as one
+numpy array per board, instead of one ``decide_showdown`` per holding and board. Strengths order like
+``Showdown`` (see ``holdem.lut``), the holdings beaten on a board are counted with a sort and ``searchsorted``, and
+the ahead / tied / behind transitions with one ``bincount`` over all (completion, holding) pairs.
+"""
+import itertools
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+from . import metrics
+from .card import TexasCard
+from .deck import Deck
+from .equity import check_cards
+
+AHEAD, TIED, BEHIND = 0, 1, 2
+
+
+@dataclass
+class HandStrength:
+    hs: float = 0.
+    ppot: float = 0.
+    npot: float = 0.
+    ehs: float = 0.
+    ehs2: float = 0.
+    # opponent holdings on the current board
+    holdings: int = 0
+    # completions of the board
+    boards: int = 0
+
+
+def _sets(codes: Sequence[int], k: int):
+    """
+    :return: (packed keys, card masks) of every k-card set of `codes`, in ``itertools.combinations`` order
+    """
+    from .lut import KEYS
+
+    combos = list(itertools.combinations(codes, k))
+    keys = np.array([sum(KEYS[c] for c in combo) for combo in combos], dtype=np.int64)
+    masks = np.array([sum(1 << c for c in combo) for combo in combos], dtype=np.int64)
+    return keys, masks
+
+
+def _status(hero: np.ndarray, opponents: np.ndarray) -> np.ndarray:
+    return np.where(hero > opponents, AHEAD, np.where(hero == opponents, TIED, BEHIND))
+
+
+def hand_strength(hole_cards: Sequence[TexasCard], board: Sequence[TexasCard], dead: Sequence[TexasCard] = (),
+                  opponents=1) -> HandStrength:
+    """
+    :param hole_cards: the two hole cards
+    :param board: the flop, turn or river
+    :param dead: cards known to be out of play, neither in the holdings nor in the completions
+    :param opponents: number of opponents, HS is raised to this power in EHS
+    :return: HS, PPot, NPot, EHS and EHS2; the potentials are 0 on the river
+    """
+    from .batch import evaluate_keys
+    from .lut import FLUSH_BIAS, KEYS
+
+    if len(hole_cards) != 2 or not 3 <= len(board) <= 5:
+        raise ValueError('Hand strength needs two hole cards and a flop, turn or river')
+    check_cards(hole_cards, board, dead)
+    pool = Deck().pop(*hole_cards, *board, *dead).codes
+    board_key = FLUSH_BIAS + sum(KEYS[c.code] for c in board)
+    board_mask = sum(c.mask for c in board)
+    hero_key, hero_mask = sum(KEYS[c.code] for c in hole_cards), sum(c.mask for c in hole_cards)
+    holding_keys, holding_masks = _sets(pool, 2)
+
+    # now: rank the hand among the sorted strengths of the holdings
+    _, hero_now = evaluate_keys(np.array([board_key + hero_key]), np.array([board_mask | hero_mask]))
+    _, now = evaluate_keys(board_key + holding_keys, board_mask | holding_masks)
+    ranked = np.sort(now)
+    beaten = int(np.searchsorted(ranked, hero_now[0], side='left'))
+    tied = int(np.searchsorted(ranked, hero_now[0], side='right')) - beaten
+    hs = (beaten + tied / 2) / len(now)
+    metrics.count('hands', len(now) + 1)
+    missing = 5 - len(board)
+    if not missing:
+        return HandStrength(hs=hs, ehs=hs ** opponents, ehs2=hs * hs, holdings=len(now), boards=1)
+
+    # every completion against every holding disjoint from it
+    completion_keys, completion_masks = _sets(pool, missing)
+    _, hero_final = evaluate_keys(board_key + hero_key + completion_keys, board_mask | hero_mask | completion_masks)
+    keys = board_key + completion_keys[:, None] + holding_keys[None, :]
+    masks = board_mask | completion_masks[:, None] | holding_masks[None, :]
+    _, final = evaluate_keys(keys.ravel(), masks.ravel())
+    final = final.reshape(keys.shape)
+    valid = (completion_masks[:, None] & holding_masks[None, :]) == 0
+    metrics.count('hands', int(valid.sum()) + len(hero_final))
+
+    status = _status(hero_final[:, None], final)
+    transitions = np.bincount((3 * _status(hero_now[0], now)[None, :] + status)[valid], minlength=9).reshape(3, 3)
+    ppot = _potential(transitions, BEHIND, AHEAD)
+    npot = _potential(transitions, AHEAD, BEHIND)
+    # river HS of every completion
+    wins = ((status == AHEAD) & valid).sum(axis=1) + ((status == TIED) & valid).sum(axis=1) / 2
+    river = wins / valid.sum(axis=1)
+    hs_n = hs ** opponents
+    return HandStrength(hs=hs, ppot=ppot, npot=npot, ehs=hs_n * (1 - npot) + (1 - hs_n) * ppot,
+                        ehs2=float(np.mean(river ** 2)), holdings=len(now), boards=len(completion_keys))
+
+
+def _potential(transitions: np.ndarray, start: int, end: int) -> float:
+    """
+    :return: chance to go from `start` to `end`, tied hands counted half at both ends
+    """
+    total = transitions[start].sum() + transitions[TIED].sum() / 2
+    if not total:
+        return 0.
+    return float((transitions[start, end] + transitions[start, TIED] / 2 + transitions[TIED, end] / 2) / total)
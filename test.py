@@ -1,3 +1,4 @@
+import itertools
 import unittest
 
 from holdem.detect import histogram, decide_showdown
@@ -5,6 +6,9 @@ from holdem.card import TexasCard
 from holdem.deck import Deck
 from holdem.showdown import HighCard, Pair, TwoPair, ThreeOfAKind, Straight, Flush, FullHouse, \
     StraightFlush, RoyalFlush, FourOfAKind
+from holdem import lut
+from holdem.constant import category_histogram
+from holdem.showdown import TieException
 from holdem.eval7_api import histogram as eval7_histogram, decide_showdown as eval7_decide_showdown
 
 
@@ -24,6 +28,23 @@ class TestInfra(unittest.TestCase):
         removed = deck.pop(hole_card1, hole_card2)
         self.assertTrue(len(removed.pool) == 52 - 2)
         print(deck.deal(5))
+        self.assertEqual(len(set(removed.deal(50))), 50)
+
+    def test_card_interning(self):
+        import pickle
+        card = TexasCard.from_str('Td')
+        self.assertIs(card, TexasCard.from_str('tD'))
+        self.assertIs(card, pickle.loads(pickle.dumps(card)))
+        self.assertEqual(Deck.gen_poker().index(card), card.code)
+
+    def test_deck_mask(self):
+        deck = Deck().pop(TexasCard.from_str('As'), TexasCard.from_str('2c'))
+        self.assertEqual(len(deck), 50)
+        self.assertNotIn(TexasCard.from_str('As'), deck)
+        self.assertEqual(deck.mask, sum(c.mask for c in deck.pool))
+        boards = list(Deck(deck.pool[:7]).boards(5))
+        self.assertEqual(len(boards), 21)
+        self.assertTrue(all(b.bit_count() == 5 for b in boards))
 
     def test_showdown_decision(self):
         hole_cards = (TexasCard.from_str('5h'), TexasCard.from_str('Th'))
@@ -54,7 +75,7 @@ class TestShowdown(unittest.TestCase):
         hole_cards = tuple(cards[:2])
         community_cards = tuple(cards[2:])
         result = decide_showdown(hole_cards + community_cards)
-        return result
+        return result.showdown
 
     def test_straight_detection(self):
         straight = "4h 3d 5c 6d 7s 3c Jc"
@@ -74,6 +95,31 @@ class TestShowdown(unittest.TestCase):
         self.assertIsInstance(self.showdown(self.straight_flush), StraightFlush)
         self.assertIsInstance(self.showdown(self.royal_flush), RoyalFlush)
 
+    def test_lazy_result(self):
+        cards = [TexasCard.from_str(s) for s in self.full_house.split(' ')]
+        result = decide_showdown(cards)
+        self.assertIs(result.showdown_class, FullHouse)
+        self.assertEqual(result.category, FullHouse.__power__.value)
+        self.assertIsNone(result._showdown)
+        self.assertIsInstance(result.showdown, FullHouse)
+        self.assertIs(result.showdown, result.showdown)
+        self.assertEqual(result.values(), result.showdown.values())
+
+    def test_compare_results(self):
+        def result(string):
+            return decide_showdown([TexasCard.from_str(s) for s in string.split(' ')])
+
+        full_house, flush = result(self.full_house), result(self.flush)
+        self.assertTrue(full_house > flush)
+        self.assertFalse(flush > full_house)
+        self.assertTrue(full_house > flush.showdown)
+        # the same seven-high straight from other cards
+        straight, other = result('4h 3d 5c 6d 7s 3c Jc'), result('4c 3h 5d 6s 7c 2c Jd')
+        self.assertEqual(straight, other)
+        self.assertNotEqual(straight, flush)
+        with self.assertRaises(TieException):
+            straight > other
+
     def test_histogram(self):
         hole_cards_p1 = (TexasCard.from_str('As'), TexasCard.from_str('Ac'))
         hole_cards_p2 = (TexasCard.from_str('7c'), TexasCard.from_str('8d'))
@@ -114,6 +160,9 @@ class TestPyEval7(unittest.TestCase):
         self.assertEqual(self.showdown(self.four_kind), FourOfAKind)
         self.assertEqual(self.showdown(self.straight_flush), StraightFlush)
         self.assertEqual(self.showdown(self.royal_flush), RoyalFlush)
+        # the former assist flag is still accepted
+        cards = [TexasCard.from_str(s) for s in self.royal_flush.split(' ')]
+        self.assertEqual(eval7_decide_showdown(cards, assist=False), RoyalFlush)
 
     def test_eval7_histogram(self):
         hole_cards_p1 = (TexasCard.from_str('As'), TexasCard.from_str('Ac'))
@@ -122,3 +171,729 @@ class TestPyEval7(unittest.TestCase):
         result = eval7_histogram(hole_cards_p1, board)
         for k, v in result.items():
             print(f'{k:<13} : {v:.9f}')
+
+    def test_eval7_matches_lut(self):
+        hole_cards = (TexasCard.from_str('Qh'), TexasCard.from_str('Kh'))
+        pool = Deck().pop(*hole_cards).pool[::2]
+        self.assertEqual(eval7_histogram(hole_cards, pool), lut.histogram(hole_cards, pool))
+        self.assertEqual(eval7_histogram(hole_cards, pool, workers=2), lut.histogram(hole_cards, pool))
+        with self.assertRaises(ValueError):
+            eval7_histogram(hole_cards, pool + [hole_cards[0]])
+
+
+class TestLut(unittest.TestCase):
+    def test_matches_detect(self):
+        import random
+        rng = random.Random(7)
+        previous = None
+        for _ in range(3000):
+            cards = rng.sample(Deck.gen_poker(), rng.choice((5, 6, 7)))
+            best = decide_showdown(cards)
+            strength = lut.evaluate(cards)
+            self.assertIs(lut.showdown_class(strength), best.showdown_class, cards)
+            self.assertEqual(best.strength, strength)
+            self.assertEqual(lut.evaluate_mask(Deck(cards).mask), strength)
+            if previous is not None:
+                try:
+                    self.assertEqual(best.showdown > previous[0].showdown, strength > previous[1])
+                except TieException:
+                    self.assertEqual(strength, previous[1])
+            previous = best, strength
+
+    def test_case_eq(self):
+        for name, cls in [('high_card', HighCard), ('pair', Pair), ('two_pair', TwoPair),
+                          ('three_kind', ThreeOfAKind), ('straight', Straight), ('flush', Flush),
+                          ('full_house', FullHouse), ('four_kind', FourOfAKind),
+                          ('straight_flush', StraightFlush), ('royal_flush', RoyalFlush)]:
+            cards = [TexasCard.from_str(s) for s in getattr(TestPyEval7, name).split(' ')]
+            self.assertIs(lut.decide_showdown(cards), cls, name)
+
+    def test_histogram(self):
+        hole_cards = (TexasCard.from_str('Ah'), TexasCard.from_str('Kh'))
+        pool = Deck().pop(*hole_cards).pool[::3]
+        self.assertEqual(lut.histogram(hole_cards, pool), histogram(hole_cards, pool))
+
+    def test_hand_state(self):
+        import random
+        rng = random.Random(11)
+        for _ in range(500):
+            cards = rng.sample(Deck.gen_poker(), 7)
+            state = lut.HandState.from_cards(cards[:4])
+            for card in cards[4:]:
+                state = state.add(card.code)
+                self.assertEqual(state.strength(), lut.evaluate(cards[:len(state)]))
+
+    def test_board_histogram(self):
+        hole_cards = (TexasCard.from_str('As'), TexasCard.from_str('Ks'))
+        for flop in ('QsJs2d', 'QsJs2d3c', '7h7d7c'):
+            board = [TexasCard.from_str(flop[i:i + 2]) for i in range(0, len(flop), 2)]
+            pool = Deck().pop(*hole_cards, *board).pool
+            counts = [0] * 11
+            for completion in itertools.combinations(pool, 5 - len(board)):
+                counts[decide_showdown(hole_cards + tuple(board) + completion).category] += 1
+            expected = category_histogram(counts, sum(counts))
+            self.assertEqual(histogram(hole_cards, pool, board=board), expected)
+            # board cards left in the pool are skipped
+            self.assertEqual(histogram(hole_cards, Deck().pop(*hole_cards).pool, board=board), expected)
+        for options in ({'samples': 1000}, {'tolerance': .01}, {'workers': 4}, {'isomorphic': True},
+                        {'batch_size': 1000}):
+            with self.assertRaises(ValueError, msg=options):
+                histogram(hole_cards, pool, board=board, **options)
+
+
+class TestBatch(unittest.TestCase):
+    def test_evaluate_batch(self):
+        import numpy as np
+        from holdem.batch import evaluate_batch
+        rng = np.random.default_rng(3)
+        codes = np.argsort(rng.random((2000, 52)), axis=1)[:, :7]
+        for k in (5, 6, 7):
+            categories, strengths = evaluate_batch(codes[:, :k])
+            expected = [lut.evaluate_codes(row) for row in codes[:, :k].tolist()]
+            self.assertEqual(strengths.tolist(), expected)
+            self.assertEqual(categories.tolist(), [lut.category(s) for s in expected])
+
+    def test_histogram_batch(self):
+        hole_cards = (TexasCard.from_str('9c'), TexasCard.from_str('Tc'))
+        pool = Deck().pop(*hole_cards).pool[1::2]
+        self.assertEqual(histogram(hole_cards, pool, batch_size=1000), lut.histogram(hole_cards, pool))
+
+
+class TestParallel(unittest.TestCase):
+    def test_split_ranges(self):
+        from holdem.parallel import split_ranges
+        ranges = split_ranges(10, 4)
+        self.assertEqual(ranges, [(0, 2), (2, 5), (5, 7), (7, 10)])
+        self.assertEqual(split_ranges(2, 4), [(0, 1), (1, 2)])
+
+    def test_parallel_histogram(self):
+        hole_cards = (TexasCard.from_str('2d'), TexasCard.from_str('7s'))
+        pool = Deck().pop(*hole_cards).pool[:18]
+        self.assertEqual(histogram(hole_cards, pool, workers=2, engine='lut'), histogram(hole_cards, pool))
+        self.assertEqual(histogram(hole_cards, pool, batch_size=500, workers=3), histogram(hole_cards, pool))
+
+
+class TestBoards(unittest.TestCase):
+    def test_unrank(self):
+        import itertools
+        from holdem.boards import unrank, rank, iter_boards
+        combos = list(itertools.combinations(range(9), 4))
+        for index, combo in enumerate(combos):
+            self.assertEqual(unrank(index, 9, 4), combo)
+            self.assertEqual(rank(combo, 9), index)
+        for start, stop in [(0, 5), (17, 70), (100, None), (125, 126)]:
+            self.assertEqual(list(iter_boards(range(9), 4, start, stop)), combos[start:stop])
+
+    def test_resume(self):
+        from holdem.detect import count_range
+        hole_cards = (TexasCard.from_str('Qs'), TexasCard.from_str('Qd'))
+        pool = Deck().pop(*hole_cards).pool[:15]
+        whole = count_range(hole_cards, pool)
+        parts = [count_range(hole_cards, pool, 0, 1234), count_range(hole_cards, pool, 1234, batch_size=100)]
+        self.assertEqual([a + b for a, b in zip(*parts)], whole)
+
+
+class TestIsomorphism(unittest.TestCase):
+    def test_orbit_sizes(self):
+        import math
+        from holdem.isomorphism import canonical_boards
+        hole_cards = (TexasCard.from_str('As'), TexasCard.from_str('Ks'))
+        for exclude in ([], [TexasCard.from_str('2c')]):
+            pool = Deck().pop(*hole_cards, *exclude).pool
+            boards = list(canonical_boards(hole_cards, pool))
+            self.assertEqual(sum(w for _, w in boards), math.comb(len(pool), 5))
+            # spades are fixed by the hole cards, the other suits are interchangeable unless excluded cards differ
+            self.assertLess(len(boards), math.comb(len(pool), 5) / (4 if not exclude else 1.5))
+
+    def test_isomorphic_histogram(self):
+        hole_cards = (TexasCard.from_str('8h'), TexasCard.from_str('8c'))
+        pool = Deck().pop(*hole_cards).pool[::2]
+        expected = histogram(hole_cards, pool)
+        self.assertEqual(histogram(hole_cards, pool, isomorphic=True), expected)
+        self.assertEqual(histogram(hole_cards, pool, isomorphic=True, batch_size=1000), expected)
+
+
+class TestPreflop(unittest.TestCase):
+    def test_hand_class(self):
+        from holdem import preflop
+        names = {preflop.class_name(i) for i in range(preflop.N_CLASSES)}
+        self.assertEqual(len(names), 169)
+        for cards, name in [('As Ks', 'AKs'), ('Kd Ah', 'AKo'), ('7c 7h', '77'), ('2h 3h', '32s')]:
+            hole_cards = [TexasCard.from_str(s) for s in cards.split(' ')]
+            index = preflop.hand_class(hole_cards)
+            self.assertEqual(preflop.class_name(index), name)
+            self.assertEqual(preflop.hand_class(preflop.representative(index)), index)
+
+    def test_lookup(self):
+        import os
+        import tempfile
+        import numpy as np
+        from holdem import preflop
+        hole_cards = (TexasCard.from_str('Jd'), TexasCard.from_str('Td'))
+        index = preflop.hand_class(hole_cards)
+        table = np.zeros((preflop.N_CLASSES, 11), dtype=np.int64)
+        table[index] = preflop.compute_counts(index)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'preflop.npy')
+            np.save(path, table)
+            pool = Deck().pop(*hole_cards).pool
+            self.assertEqual(preflop.lookup(hole_cards, pool, path), table[index].tolist())
+            self.assertIsNone(preflop.lookup(hole_cards, pool[1:], path))
+            self.assertIsNone(preflop.lookup(hole_cards, pool, os.path.join(tmp, 'missing.npy')))
+        self.assertEqual(preflop.compute_counts(index)[1:], lut.count_categories(
+            [c.code for c in hole_cards], itertools.combinations([c.code for c in pool], 5))[1:])
+
+
+class TestSampling(unittest.TestCase):
+    def test_sample_boards(self):
+        import numpy as np
+        from holdem.sampling import sample_boards
+        boards = sample_boards(np.arange(10, 20), 5000, np.random.default_rng(0))
+        self.assertEqual(boards.shape, (5000, 5))
+        self.assertTrue(((boards >= 10) & (boards < 20)).all())
+        self.assertTrue(all(len(set(row)) == 5 for row in boards.tolist()))
+        with self.assertRaises(ValueError):
+            sample_boards(np.arange(4), 10, np.random.default_rng(0))
+
+    def test_tolerance(self):
+        hole_cards = (TexasCard.from_str('As'), TexasCard.from_str('2c'))
+        pool = Deck().pop(*hole_cards).pool[::2]
+        exact = histogram(hole_cards, pool)
+        estimate = histogram(hole_cards, pool, tolerance=0.005, seed=11)
+        self.assertEqual(list(estimate), list(exact))
+        self.assertTrue(all(e < 0.005 for e in estimate.errors.values()))
+        for name, p in exact.items():
+            # 4 half-widths: failing would need a ~8 sigma deviation
+            self.assertLess(abs(estimate[name] - p), 4 * max(estimate.errors[name], 1e-4), name)
+
+
+class TestEquity(unittest.TestCase):
+    @staticmethod
+    def cards(string: str):
+        return [TexasCard.from_str(s) for s in string.split(' ')]
+
+    def test_turn_equity(self):
+        from holdem.equity import equity
+        hands = [self.cards('As Ks'), self.cards('Qd Qh'), self.cards('7c 8c')]
+        board = self.cards('2s 3s 9c Td')
+        result = equity(hands, board=board)
+        self.assertTrue(result.exact)
+        # brute force over the river cards
+        wins = [0, 0, 0]
+        rivers = Deck().pop(*hands[0], *hands[1], *hands[2], *board).pool
+        for river in rivers:
+            strengths = [lut.evaluate(hand + board + [river]) for hand in hands]
+            wins[strengths.index(max(strengths))] += strengths.count(max(strengths)) == 1
+        self.assertEqual([h.win for h in result.hands], [w / len(rivers) for w in wins])
+        self.assertAlmostEqual(sum(h.equity for h in result.hands), 1)
+
+    def test_split_pot(self):
+        from holdem.equity import equity
+        result = equity([self.cards('As Kd'), self.cards('Ad Ks')], board=self.cards('2h 3h 9c'))
+        self.assertAlmostEqual(result.hands[0].equity, 0.5)
+        self.assertGreater(result.hands[0].tie, 0.9)
+
+    def test_sampled(self):
+        from holdem.equity import equity
+        result = equity([self.cards('As Ah'), self.cards('Ks Kh')], samples=20000, seed=5)
+        self.assertFalse(result.exact)
+        self.assertEqual(result.boards, 20000)
+        self.assertAlmostEqual(result.hands[0].equity, 0.8264, delta=0.015)
+        with self.assertRaises(ValueError):
+            equity([self.cards('As Ah'), self.cards('As Kh')])
+
+
+class TestRange(unittest.TestCase):
+    def test_parse(self):
+        from holdem.hand_range import parse_range
+        for text, n in [('AKs', 4), ('AKo', 12), ('AK', 16), ('TT+', 30), ('A5s-A2s', 16), ('TT-77', 24),
+                        ('KTo+', 36), ('AsKd', 1), ('random', 1326), ('AKs, TT+, A5s-A2s, AsKs', 50)]:
+            self.assertEqual(len(parse_range(text)), n, text)
+        for bad in ('AKx', 'AsAs', 'AsAs, QQ'):
+            with self.assertRaises(ValueError, msg=bad):
+                parse_range(bad)
+
+    def test_exact_range_equity(self):
+        from holdem.equity import equity
+        from holdem.hand_range import parse_range, range_equity
+        board = [TexasCard.from_str(s) for s in ('2c', '7d', '9c', 'Kc')]
+        hero, villain = parse_range('AA'), parse_range('KQs, 99')
+        result = range_equity(hero, villain, board=board)
+        self.assertTrue(result.exact)
+        self.assertLess(result.classes, result.matchups)
+        used = Deck(board).mask
+        shares = [equity([list(h), list(v)], board=board).hands[0].equity
+                  for h in hero for v in villain
+                  if not Deck([*h, *v]).mask & used and len(Deck([*h, *v])) == 4]
+        self.assertEqual(result.matchups, len(shares))
+        self.assertAlmostEqual(result.equity, sum(shares) / len(shares))
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_hands(self):
+        from benchmarks.cases import hands
+        self.assertEqual(hands('flush_heavy', 50, 1), hands('flush_heavy', 50, 1))
+        for kind in ('random', 'pairs', 'suited_connectors', 'flush_heavy'):
+            for cards in hands(kind, 50, 1):
+                self.assertEqual(len(set(cards)), 7, kind)
+        self.assertTrue(all(lut.category(lut.evaluate(cards)) >= Flush.__power__.value
+                            for cards in hands('flush_heavy', 50, 1)))
+
+    def test_compare(self):
+        from benchmarks.__main__ import compare
+        baseline = {'a': {'hands_per_sec': 100.}, 'b': {'hands_per_sec': 100.}}
+        results = {'a': {'hands_per_sec': 85.}, 'b': {'hands_per_sec': 75.}, 'c': {'hands_per_sec': 1.}}
+        self.assertEqual(compare(results, baseline, 0.2), [('b', 100., 75.)])
+
+    def test_import_time(self):
+        from benchmarks.cases import import_time
+        self.assertGreater(import_time('holdem.card', repeat=1), 0)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_collect(self):
+        from holdem import metrics
+        hole_cards = (TexasCard.from_str('As'), TexasCard.from_str('Ks'))
+        pool = Deck().pop(*hole_cards).pool[::4]
+        with metrics.collect() as m:
+            histogram(hole_cards, pool, use_table=False, engine='detect')
+        self.assertIsNone(metrics.active)
+        self.assertEqual(m.counters['hands'], 1287)
+        self.assertEqual(m.counters['flush_path'] + m.counters['rank_path'], 1287)
+        self.assertGreater(m.phases['enumerate'], 0)
+        self.assertGreater(m.phases['evaluate'], m.phases['enumerate'])
+        self.assertGreater(m.to_dict()['hands_per_sec'], 0)
+
+    def test_nested_phases(self):
+        import time
+        from holdem import metrics
+        with metrics.collect() as m:
+            with metrics.phase('outer'):
+                for _ in metrics.timed('inner', (time.sleep(0.01) for _ in range(3))):
+                    pass
+        self.assertGreaterEqual(m.phases['inner'], 0.03)
+        self.assertLess(m.phases['outer'], 0.01)
+        # disabled, nothing is recorded
+        self.assertIs(metrics.phase('outer'), metrics.phase('inner'))
+
+
+class TestCache(unittest.TestCase):
+    def test_canonical_mask(self):
+        from holdem.cache import canonical_mask
+        from holdem.card import card_from_code
+        cards = Deck().pop().pool[::8]
+        # every suit moved to the next one
+        rotated = [card_from_code((c.code // 13 + 1) % 4 * 13 + c.code % 13) for c in cards]
+        self.assertNotEqual(Deck(cards).mask, Deck(rotated).mask)
+        self.assertEqual(canonical_mask(Deck(cards).mask), canonical_mask(Deck(rotated).mask))
+        self.assertEqual(lut.evaluate_mask(canonical_mask(Deck(cards).mask)), lut.evaluate(cards))
+
+    def test_lru(self):
+        from holdem.cache import ENTRY_BYTES, EvalCache
+        calls = []
+        cache = EvalCache(evaluate=lambda mask: calls.append(mask) or mask.bit_count(), max_bytes=2 * ENTRY_BYTES,
+                          normalize_suits=False)
+        for mask in (0b1, 0b11, 0b1, 0b111, 0b11, 0b1):
+            cache.evaluate_mask(mask)
+        # 0b11 is evicted by 0b111, 0b1 by 0b11
+        self.assertEqual(calls, [0b1, 0b11, 0b111, 0b11, 0b1])
+        stats = cache.stats
+        self.assertEqual((stats.hits, stats.misses, stats.evictions, stats.size), (1, 5, 3, 2))
+
+    def test_histogram(self):
+        from holdem.cache import EvalCache
+        hole_cards = (TexasCard.from_str('9s'), TexasCard.from_str('9h'))
+        pool = Deck().pop(*hole_cards).pool[::3]
+        cache = EvalCache()
+        expected = histogram(hole_cards, pool, use_table=False)
+        self.assertEqual(histogram(hole_cards, pool, use_table=False, cache=cache), expected)
+        self.assertEqual(histogram(hole_cards, pool, use_table=False, cache=cache, isomorphic=True), expected)
+        self.assertGreater(cache.stats.hits, 0)
+        with self.assertRaises(ValueError):
+            histogram(hole_cards, pool, use_table=False, cache=cache, workers=2, store=False)
+
+
+class TestServer(unittest.TestCase):
+    def test_normalize(self):
+        from holdem.query import QueryError, normalize, query_key
+        a = normalize({'type': 'histogram', 'hole': 'AsKs', 'exclude': ['2c', '3d']})
+        b = normalize({'hole': 'Ks,As', 'exclude': '3d2c', 'mode': 'exact'})
+        self.assertEqual(query_key(a), query_key(b))
+        rest = [c.to_eval7_str() for c in Deck().pop(TexasCard.from_str('As'), TexasCard.from_str('Ks')).pool]
+        for bad in ({'hole': 'As'}, {'hole': 'AsAs'}, {'hole': 'AsKs', 'board': 'As'}, {'type': 'nope'},
+                    {'hole': 'AsKs', 'mode': 'sample'}, {'type': 'equity', 'hands': 'AsKs'},
+                    # 3 cards left for a 5 card board, 1 for the last 2
+                    {'hole': 'AsKs', 'exclude': rest[:47]}, {'hole': 'AsKs', 'board': rest[:3], 'exclude': rest[3:49]}):
+            with self.assertRaises(QueryError, msg=bad):
+                normalize(bad)
+
+    def test_coalesce(self):
+        import asyncio
+        from holdem.server import QueryServer
+
+        async def run():
+            server = QueryServer(workers=1)
+            server.start()
+            try:
+                request = {'type': 'histogram', 'hole': 'AsKs', 'board': 'QsJs2d'}
+                responses = await asyncio.gather(*(server.answer({**request, 'id': i}) for i in range(4)))
+                responses.append(await server.answer({'id': 'x', 'hole': 'As'}))
+                responses.append(await server.answer(request))
+                return responses, server.snapshot()
+            finally:
+                server.shutdown()
+
+        responses, stats = asyncio.run(run())
+        self.assertEqual([r['id'] for r in responses[:4]], [0, 1, 2, 3])
+        self.assertTrue(all(r['result'] == responses[0]['result'] for r in responses[:4]))
+        self.assertAlmostEqual(responses[0]['result']['histogram']['RoyalFlush'], 46 / 1081)
+        self.assertFalse(responses[4]['ok'])
+        self.assertEqual((stats['computed'], stats['coalesced'], stats['cache_hits'], stats['errors']), (1, 3, 1, 1))
+
+
+class TestBulk(unittest.TestCase):
+    def test_parse_line(self):
+        from holdem.bulk import parse_line
+        from holdem.query import QueryError
+        self.assertEqual(parse_line('AsKs board=QsJs2d samples=10\n'),
+                         {'type': 'histogram', 'hole': 'AsKs', 'board': 'QsJs2d', 'samples': 10})
+        self.assertEqual(parse_line('{"type": "equity", "id": 1}'), {'type': 'equity', 'id': 1})
+        for bad in ('AsKs board', 'AsKs samples=x', '{"hole"'):
+            with self.assertRaises(QueryError, msg=bad):
+                parse_line(bad)
+
+    def test_run_batch(self):
+        from holdem.bulk import run_batch
+        lines = ['AsKs board=QsJs2d', '', '{"id": "e", "type": "equity", "hands": ["AsAh", "KsKh"], "board": "2s3s9c"}',
+                 'AsAs', 'AsKs board=QsJs2d']
+        for workers, ordered in ((1, True), (2, True), (2, False)):
+            responses = list(run_batch(lines, workers=workers, ordered=ordered, window=2))
+            if ordered:
+                self.assertEqual([r['line'] for r in responses], [1, 3, 4, 5])
+            by_line = {r['line']: r for r in responses}
+            self.assertEqual(sorted(by_line), [1, 3, 4, 5])
+            self.assertAlmostEqual(by_line[1]['result']['histogram']['RoyalFlush'], 46 / 1081)
+            self.assertEqual(by_line[1]['result'], by_line[5]['result'])
+            self.assertEqual(by_line[3]['id'], 'e')
+            self.assertFalse(by_line[4]['ok'])
+
+    def test_run_batch_errors(self):
+        import json
+        from holdem.bulk import run_batch
+        # three cards left, no board to deal: the failing line gets an error, the batch goes on
+        pool = Deck().pop(TexasCard.from_str('As'), TexasCard.from_str('Ks')).pool
+        lines = [json.dumps({'hole': 'AsKs', 'exclude': ''.join(c.to_eval7_str() for c in pool[:47])}),
+                 'AsKs board=QsJs2d']
+        for workers in (1, 2):
+            responses = list(run_batch(lines, workers=workers))
+            self.assertEqual([r['ok'] for r in responses], [False, True])
+            self.assertTrue(responses[0]['error'])
+
+
+class TestEngines(unittest.TestCase):
+    def test_engines_agree(self):
+        from holdem import engines
+        hole_cards = (TexasCard.from_str('Ah'), TexasCard.from_str('Kh'))
+        pool = Deck().pop(*hole_cards).pool[::3]
+        expected = lut.count_categories([c.code for c in hole_cards], itertools.combinations(
+            [c.code for c in pool], 5))
+        for name in engines.ENGINES:
+            self.assertEqual(engines.count_boards(name, [c.code for c in hole_cards], [c.code for c in pool]),
+                             expected, name)
+            self.assertEqual(engines.histogram(hole_cards, pool, engine=name),
+                             category_histogram(expected, sum(expected)), name)
+        self.assertEqual(histogram(hole_cards, pool, engine='numpy', use_table=False),
+                         category_histogram(expected, sum(expected)))
+        with self.assertRaises(ValueError):
+            engines.load('nope')
+
+    def test_lazy_imports(self):
+        import subprocess
+        import sys
+        code = 'import sys, holdem.cli; print(sorted({"numpy", "tqdm", "eval7", "holdem.lut"} & set(sys.modules)))'
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), '[]')
+
+
+class TestAnalytic(unittest.TestCase):
+    def test_matches_enumeration(self):
+        import random
+        from holdem import analytic
+        rng = random.Random(5)
+        for _ in range(20):
+            codes = list(range(52))
+            rng.shuffle(codes)
+            hole, pool = codes[:2], sorted(codes[2:2 + rng.randrange(8, 26)])
+            self.assertEqual(analytic.count_all(hole, pool),
+                             lut.count_categories(hole, itertools.combinations(pool, 5)))
+        # suited hole cards, every flush and straight flush draw
+        hole = [8, 9]
+        pool = [c for c in range(52) if c not in hole]
+        self.assertEqual(analytic.count_all(hole, pool), lut.count_categories(hole, itertools.combinations(pool, 5)))
+
+    def test_known_board(self):
+        from holdem import analytic
+        # a four-flush flop with the hole cards and a made flush on the turn
+        for known in ([0, 1, 2, 3, 30], [0, 1, 2, 3, 4, 30]):
+            pool = [c for c in range(52) if c not in known]
+            k = 7 - len(known)
+            expected = [0] * 11
+            for rest in itertools.combinations(pool, k):
+                expected[lut.category(lut.evaluate_codes(known + list(rest)))] += 1
+            self.assertEqual(analytic.count_draws(known, pool, k), expected)
+        with self.assertRaises(ValueError):
+            analytic.count_draws([0, 1], [2, 3, 4], 3)
+
+
+class TestStreets(unittest.TestCase):
+    def test_matches_enumeration(self):
+        from holdem.card import card_from_code
+        from holdem.equity import equity
+        from holdem.streets import street_histograms
+        hero = (TexasCard.from_str('Ah'), TexasCard.from_str('Kh'))
+        villain = (TexasCard.from_str('9c'), TexasCard.from_str('9d'))
+        dead = [card_from_code(code) for code in range(0, 52, 2)
+                if card_from_code(code) not in hero + villain]
+        pool = Deck().pop(*hero, *villain, *dead).codes
+        results = street_histograms(hero, [villain], dead=dead, chunk=1000)
+        self.assertEqual([r.street for r in results], ['flop', 'turn', 'river'])
+        for result, size in zip(results, (3, 4, 5)):
+            counts = [0] * 11
+            for board in itertools.combinations(pool, size):
+                counts[lut.category(lut.evaluate_codes([c.code for c in hero] + list(board)))] += 1
+            self.assertEqual(result.histogram, category_histogram(counts, sum(counts)), result.street)
+        river = equity([hero, villain], dead=dead)
+        self.assertTrue(river.exact)
+        for expected, got in zip(river.hands, results[-1].equity.hands):
+            self.assertAlmostEqual(expected.equity, got.equity)
+
+    def test_known_board(self):
+        from holdem.streets import street_histograms
+        from holdem.strength import hand_strength
+        hero = (TexasCard.from_str('8h'), TexasCard.from_str('9h'))
+        board = [TexasCard.from_str(s) for s in ('Th', '2c', '3h')]
+        turn, river = street_histograms(hero, board=board)
+        self.assertEqual((turn.street, turn.boards, river.boards), ('turn', 47, 1081))
+        # against a random holding: the turn equity is the mean hand strength over the turn cards
+        pool = Deck().pop(*hero, *board).pool
+        hs = [hand_strength(hero, board + [card]).hs for card in pool]
+        self.assertAlmostEqual(turn.equity.hands[0].equity, sum(hs) / len(hs))
+        self.assertAlmostEqual(turn.equity.hands[0].equity + turn.equity.hands[1].equity, 1)
+        self.assertTrue(turn.equity.exact and river.equity.exact)
+        self.assertEqual(river.histogram, histogram(hero, Deck().pop(*hero, *board).pool, board=board))
+
+
+class TestStrength(unittest.TestCase):
+    def reference(self, hole_cards, board, dead):
+        pool = Deck().pop(*hole_cards, *board, *dead).codes
+        hole, board = [c.code for c in hole_cards], [c.code for c in board]
+        hero = lut.evaluate_codes(hole + board)
+        now, moves = [0, 0, 0], [[0] * 3 for _ in range(3)]
+        for opponent in itertools.combinations(pool, 2):
+            strength = lut.evaluate_codes(list(opponent) + board)
+            before = 0 if hero > strength else 1 if hero == strength else 2
+            now[before] += 1
+            rest = [c for c in pool if c not in opponent]
+            for completion in itertools.combinations(rest, 5 - len(board)):
+                mine = lut.evaluate_codes(hole + board + list(completion))
+                theirs = lut.evaluate_codes(list(opponent) + board + list(completion))
+                moves[before][0 if mine > theirs else 1 if mine == theirs else 2] += 1
+        totals = [sum(row) for row in moves]
+        ppot = (moves[2][0] + moves[2][1] / 2 + moves[1][0] / 2) / (totals[2] + totals[1] / 2)
+        npot = (moves[0][2] + moves[1][2] / 2 + moves[0][1] / 2) / (totals[0] + totals[1] / 2)
+        return (now[0] + now[1] / 2) / sum(now), ppot, npot
+
+    def test_matches_reference(self):
+        from holdem.card import card_from_code
+        from holdem.strength import hand_strength
+        hole_cards = (TexasCard.from_str('Ah'), TexasCard.from_str('Kh'))
+        board = [TexasCard.from_str(s) for s in ('Qh', '7h', '2c', '5d', 'Td')]
+        dead = [card_from_code(c) for c in range(0, 52, 2) if card_from_code(c) not in hole_cards + tuple(board)]
+        for n in (3, 4):
+            result = hand_strength(hole_cards, board[:n], dead)
+            hs, ppot, npot = self.reference(hole_cards, board[:n], dead)
+            self.assertAlmostEqual(result.hs, hs)
+            self.assertAlmostEqual(result.ppot, ppot)
+            self.assertAlmostEqual(result.npot, npot)
+            self.assertAlmostEqual(result.ehs, hs * (1 - npot) + (1 - hs) * ppot)
+        river = hand_strength(hole_cards, board, dead, opponents=2)
+        self.assertEqual((river.ppot, river.npot, river.boards), (0., 0., 1))
+        self.assertAlmostEqual(river.ehs, river.hs ** 2)
+        with self.assertRaises(ValueError):
+            hand_strength(hole_cards, board[:2])
+
+
+class TestStore(unittest.TestCase):
+    def test_query_key(self):
+        from holdem.store import query_key
+        cards = [TexasCard.from_str(s) for s in ('As', 'Ks', '9s', '8c', '2h', '3d')]
+        swapped = [TexasCard.from_str(s) for s in ('Ah', 'Kh', '9h', '8d', '2s', '3c')]
+        self.assertEqual(query_key(cards[:2], cards[2:5], cards[5:]), query_key(swapped[:2], swapped[2:5], swapped[5:]))
+        self.assertNotEqual(query_key(cards[:2], cards[2:5], cards[5:]), query_key(cards[:2], cards[2:4], cards[4:]))
+
+    def test_histogram(self):
+        import os
+        import tempfile
+        from holdem import metrics, store
+        from holdem.card import card_from_code
+        hole_cards = (TexasCard.from_str('Qc'), TexasCard.from_str('Jc'))
+        pool = Deck().pop(*hole_cards).pool[::2]
+        board = [c for c in pool if c.code % 13 == 10][:2] + [TexasCard.from_str('2d')]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.db')
+            first = store.ResultStore(path)
+            expected = [histogram(hole_cards, pool, use_table=False, store=False),
+                        histogram(hole_cards, pool, board=board, store=False)]
+            self.assertEqual([histogram(hole_cards, pool, use_table=False, store=first),
+                              histogram(hole_cards, pool, board=board, store=first)], expected)
+            self.assertEqual(len(first), 2)
+            # another connection, as from another process, and the same query with the suits permuted
+            second = store.ResultStore(path)
+            swap = [1, 0, 3, 2]
+
+            def permuted(cards):
+                return [card_from_code(swap[c.code // 13] * 13 + c.code % 13) for c in cards]
+
+            with metrics.collect() as stats:
+                self.assertEqual(histogram(permuted(hole_cards), permuted(pool), use_table=False, store=second),
+                                 expected[0])
+                self.assertEqual(histogram(permuted(hole_cards), permuted(pool), board=permuted(board), store=second),
+                                 expected[1])
+            self.assertEqual(stats.counters['store_hits'], 2)
+            # entries of another engine version are dropped
+            store.ENGINE_VERSION += 1
+            try:
+                self.assertEqual(len(store.ResultStore(path)), 0)
+            finally:
+                store.ENGINE_VERSION -= 1
+
+    def test_eviction(self):
+        import os
+        import tempfile
+        from holdem import store
+        with tempfile.TemporaryDirectory() as tmp:
+            results = store.ResultStore(os.path.join(tmp, 'results.db'), max_bytes=64 << 10)
+            for i in range(2000):
+                results.put(f'{i:x}', [i] * 11)
+            self.assertLess(len(results), 2000)
+            self.assertLessEqual(results.size(), 64 << 10)
+            self.assertEqual(results.get('7cf'), [1999] * 11)
+            self.assertIsNone(results.get('0'))
+
+
+class TestHistory(unittest.TestCase):
+    HANDS = [
+        # board, shown hands
+        ('Td Qh Js 6d 5c', {'alice': '9d 7h', 'bob': '4h 6h', 'carol': 'Ks Ac'}),
+        # split pot, the board plays
+        ('As Ks Qs Js Ts', {'alice': '2c 3d', 'bob': '4h 5h'}),
+        # no showdown: one hand shown
+        ('2c 3c 4c 5c 7d', {'alice': 'Ah Kh'}),
+        # no river
+        ('2c 3c 4c', {'alice': 'Ah Kh', 'bob': 'Qd Qs'}),
+        # corrupt: a card dealt twice
+        ('2c 3c 4c 5c 7d', {'alice': 'Ah Kh', 'bob': 'Ah Qs'}),
+        # corrupt: a card twice in one hole, twice on the board
+        ('2c 3c 4c 5c 7d', {'alice': 'Ah Ah', 'bob': 'Kd Qs'}),
+        ('Qs Qs 9h 5c 3s', {'alice': 'Ah Kh', 'bob': 'Kd Qd'}),
+        ('8c 8d 2h 9s 3s', {'bob': '8h 8s', 'carol': 'Ac Ad', 'alice': 'Jc Td'}),
+    ]
+
+    def write(self, f):
+        for number, (board, shows) in enumerate(self.HANDS, 1):
+            f.write(f"PokerStars Hand #{number}: Hold'em No Limit ($0.01/$0.02 USD) - 2020/01/01 12:00:00 ET\n"
+                    "Table 'Alpha' 6-max Seat #1 is the button\n*** SHOW DOWN ***\n")
+            for name, cards in shows.items():
+                f.write(f'{name}: shows [{cards}] (a hand)\n')
+            f.write(f'*** SUMMARY ***\nTotal pot $4 | Rake $0\nBoard [{board}]\n\n\n')
+
+    def reference(self):
+        from holdem.history import parse_codes
+        results = []
+        for number, (board, shows) in enumerate(self.HANDS, 1):
+            codes = parse_codes(board.encode()).tolist()
+            holes = {name: parse_codes(cards.encode()).tolist() for name, cards in shows.items()}
+            if len(codes) != 5 or len(shows) < 2 or len({c for h in holes.values() for c in h} | set(codes)) < \
+                    5 + 2 * len(shows):
+                continue
+            strengths = {name: lut.evaluate_codes(codes + hole) for name, hole in holes.items()}
+            best = max(strengths.values())
+            winners = sum(s == best for s in strengths.values())
+            results.append((str(number), {name: (lut.showdown_class(s).__name__, (s == best) / winners)
+                                          for name, s in strengths.items()}))
+        return results
+
+    def test_parse_codes(self):
+        from holdem.history import parse_codes
+        self.assertEqual(parse_codes(b'2d As tc Xx').tolist(),
+                         [TexasCard.from_str(s).code for s in ('2d', 'As', 'Tc')] + [-1])
+        self.assertEqual(len(parse_codes(b'')), 0)
+
+    def test_run_history(self):
+        import io
+        import os
+        import tempfile
+        from holdem.history import run_history
+        expected = self.reference()
+        self.assertEqual([number for number, _ in expected], ['1', '2', '8'])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'history.txt')
+            with open(path, 'w') as f:
+                self.write(f)
+            with open(path, 'rb') as f:
+                stream = io.BytesIO(f.read())
+            # chunks smaller than a hand: every hand in its own chunk
+            for source, chunk_bytes in ((path, 1 << 20), (path, 64), (stream, 64)):
+                hands = list(run_history(source, chunk_bytes=chunk_bytes))
+                self.assertEqual([(h['hand'], {p['player']: (p['category'], p['share']) for p in h['players']})
+                                  for h in hands], expected)
+            players = {p['player']: p for p in run_history(path, per='player', chunk_bytes=64, workers=2, window=2)}
+            self.assertEqual(players['alice']['showdowns'], 3)
+            self.assertAlmostEqual(players['alice']['won'], .5)
+            self.assertEqual(players['carol']['categories'], {'Straight': 1, 'TwoPair': 1})
+            with self.assertRaises(ValueError):
+                list(run_history(path, per='table'))
+
+
+class TestSimulate(unittest.TestCase):
+    def test_deal(self):
+        import numpy as np
+        from holdem.card import card_from_code
+        from holdem.preflop import hand_class
+        from holdem.simulate import deal, hand_classes
+        pool = np.array(Deck().codes)
+        cards = deal(np.random.default_rng(1), pool, 2000, 23)
+        self.assertTrue((np.sort(cards, axis=1)[:, 1:] != np.sort(cards, axis=1)[:, :-1]).all())
+        # every card about equally often in every position
+        self.assertGreater(np.bincount(cards[:, 0], minlength=52).min(), 15)
+        holes = cards[:, :2]
+        self.assertEqual(hand_classes(holes).tolist(),
+                         [hand_class([card_from_code(a), card_from_code(b)]) for a, b in holes.tolist()])
+
+    def test_matches_reference(self):
+        import numpy as np
+        from holdem.simulate import deal, hand_classes, simulate_batch
+        result = simulate_batch(np.random.default_rng(7), 4, 500)
+        # the same deal again, evaluated hand by hand
+        cards = deal(np.random.default_rng(7), np.array(Deck().codes), 500, 13)
+        won, splits = np.zeros(169), 0
+        for row in cards.tolist():
+            strengths = [lut.evaluate_codes(row[2 * i:2 * i + 2] + row[8:]) for i in range(4)]
+            winners = [s == max(strengths) for s in strengths]
+            splits += sum(winners) > 1
+            for i in range(4):
+                won[hand_classes(np.array(row[2 * i:2 * i + 2]))] += winners[i] / sum(winners)
+        self.assertTrue(np.allclose(result.won, won))
+        self.assertEqual(result.split_pots, splits)
+        self.assertEqual(result.categories.sum(), 2000)
+        self.assertAlmostEqual(result.won.sum(), 500)
+
+    def test_simulate(self):
+        from holdem.simulate import simulate
+        first = simulate(3, 3000, seed=5, workers=2, batch_size=1000)
+        second = simulate(3, 3000, seed=5, workers=2, batch_size=1000)
+        self.assertEqual(first.dealt.tolist(), second.dealt.tolist())
+        self.assertEqual((first.hands, first.dealt.sum()), (3000, 9000))
+        self.assertAlmostEqual(sum(first.category_frequencies().values()), 1)
+        with self.assertRaises(ValueError):
+            simulate(10, 100)